@@ -0,0 +1,178 @@
+import math
+import os
+import posixpath
+import zlib
+
+from dataclasses import dataclass
+from functools import cache
+from container import Container, Member, build_index, write_index
+
+Chunk = tuple[str, int, int]
+
+@dataclass
+class ArchivePlan:
+    """División de varios archivos en partes para comprimirlos en un solo archivo con directorio de miembros.
+    Las partes de todos los archivos se numeran de forma consecutiva, por lo que se pueden repartir como las de un único archivo.
+
+    Attributes:
+        chunks (list[tuple[str, int, int]]): Ruta del archivo, posición y tamaño de cada parte, en orden.
+        members (list[Member]): Nombre de cada archivo dentro del archivo comprimido y sus partes.
+    """
+    chunks: list[Chunk]
+    members: list[Member]
+
+def collect_files(paths: list[str]) -> list[tuple[str, str]]:
+    """Lista los archivos a comprimir a partir de archivos y directorios. Los directorios se recorren recursivamente en orden alfabético.
+    Cada archivo se guarda con su nombre, y los de un directorio con su ruta relativa al directorio que lo contiene, incluyendo el nombre del directorio.
+
+    Args:
+        paths (list[str]): Archivos y directorios.
+
+    Returns:
+        list[tuple[str, str]]: Ruta y nombre dentro del archivo comprimido de cada archivo, en orden.
+
+    Raises:
+        ValueError: Si dos archivos tienen el mismo nombre dentro del archivo comprimido.
+    """
+    files = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            base = os.path.dirname(os.path.abspath(path))
+
+            for directory, subdirectories, filenames in os.walk(path):
+                subdirectories.sort()
+
+                for filename in sorted(filenames):
+                    file = os.path.join(directory, filename)
+                    files.append((file, os.path.relpath(os.path.abspath(file), base).replace(os.sep, "/")))
+        else:
+            files.append((path, os.path.basename(path)))
+
+    names = [name for _, name in files]
+
+    if len(set(names)) != len(names):
+        raise ValueError("Hay varios archivos con el mismo nombre dentro del archivo comprimido")
+
+    return files
+
+@cache
+def plan_archive(paths: tuple[str, ...], chunk_size: int) -> ArchivePlan:
+    """Divide en partes los archivos a comprimir. Cada proceso calcula el plan una sola vez, así solo se envían las rutas y no la lista de partes.
+
+    Args:
+        paths (tuple[str, ...]): Archivos y directorios a comprimir.
+        chunk_size (int): Tamaño máximo de cada parte. Las partes no cruzan de un archivo a otro.
+    """
+    chunks = []
+    members = []
+
+    for file, name in collect_files(list(paths)):
+        size = os.stat(file).st_size
+        members.append(Member(name, len(chunks), math.ceil(size / chunk_size)))
+        chunks.extend((file, start, min(chunk_size, size - start)) for start in range(0, size, chunk_size))
+
+    return ArchivePlan(chunks, members)
+
+def write_archive_index(plan: ArchivePlan, outfile: str, sizes: list[tuple[int, int]]) -> None:
+    """Escribe el índice de bloques, con el CRC32 de cada uno, y el directorio de miembros al final del archivo comprimido.
+    El tamaño sin comprimir y el CRC32 de cada bloque se toman del plan y de los archivos de entrada.
+
+    Args:
+        plan (ArchivePlan): El plan con el que se comprimieron los archivos.
+        outfile (str): El nombre del archivo comprimido.
+        sizes (list[tuple[int, int]]): El tamaño comprimido de cada parte, en orden. El tamaño sin comprimir se ignora.
+    """
+    checksums = []
+
+    for file, start, size in plan.chunks:
+        with open(file, "rb") as input_file:
+            input_file.seek(start)
+            checksums.append(zlib.crc32(input_file.read(size)))
+
+    blocks = build_index([(compressed_size, size) for (compressed_size, _), (_, _, size) in zip(sizes, plan.chunks)], checksums)
+
+    with open(outfile, "ab") as out:
+        write_index(out, blocks, plan.members)
+
+def find_member(container: Container, name: str) -> Member:
+    """Busca un miembro por su nombre.
+
+    Args:
+        container (Container): Encabezado, índice y directorio de miembros del archivo comprimido.
+        name (str): Nombre del miembro.
+
+    Raises:
+        KeyError: Si el archivo comprimido no tiene un miembro con ese nombre.
+    """
+    for member in container.members:
+        if member.name == name:
+            return member
+
+    raise KeyError(name)
+
+def member_range(container: Container, member: Member) -> tuple[int, int]:
+    """Calcula la posición y el tamaño de un miembro dentro del contenido descomprimido de todos los miembros.
+
+    Args:
+        container (Container): Encabezado, índice y directorio de miembros del archivo comprimido.
+        member (Member): El miembro.
+
+    Returns:
+        tuple[int, int]: Posición del primer byte y número de bytes del miembro.
+    """
+    blocks = container.blocks[member.first_block:member.first_block + member.block_count]
+
+    if not blocks:
+        return 0, 0
+
+    return blocks[0].uncompressed_offset, sum(block.uncompressed_size for block in blocks)
+
+def member_path(directory: str, name: str) -> str:
+    """Calcula la ruta de salida de un miembro. Rechaza nombres que saldrían del directorio de salida.
+
+    Args:
+        directory (str): Directorio de salida.
+        name (str): Nombre del miembro.
+
+    Raises:
+        ValueError: Si el nombre es absoluto o sube de directorio.
+    """
+    normalized = posixpath.normpath(name)
+
+    if normalized.startswith("/") or normalized == ".." or normalized.startswith("../"):
+        raise ValueError(f"Nombre de miembro no permitido: {name}")
+
+    return os.path.join(directory, *normalized.split("/"))
+
+def select_members(container: Container, names: list[str] | tuple[str, ...] | None = None) -> list[Member]:
+    """Selecciona los miembros a extraer de un archivo comprimido.
+
+    Args:
+        container (Container): Encabezado, índice y directorio de miembros del archivo comprimido.
+        names (list[str] | tuple[str, ...] | None): Nombres de los miembros. Por defecto se seleccionan todos.
+
+    Raises:
+        KeyError: Si el archivo comprimido no tiene alguno de los miembros.
+    """
+    return [find_member(container, name) for name in names] if names else container.members
+
+def create_member_file(container: Container, member: Member, directory: str) -> str:
+    """Crea el archivo de salida de un miembro, y los directorios que lo contienen, con su tamaño final.
+    Así sus bloques se pueden escribir en paralelo en su posición.
+
+    Args:
+        container (Container): Encabezado, índice y directorio de miembros del archivo comprimido.
+        member (Member): El miembro.
+        directory (str): Directorio de salida.
+
+    Returns:
+        str: La ruta del archivo creado.
+    """
+    path = member_path(directory, member.name)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    with open(path, "wb") as file:
+        file.truncate(member_range(container, member)[1])
+
+    return path
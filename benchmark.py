@@ -0,0 +1,376 @@
+import json
+import os
+import platform
+import random
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from dataclasses import asdict, dataclass
+from typing import Callable
+from constants import CHUNK_SIZE
+from reference import CODECS
+from verificador import verify
+
+WORDS = (
+    "the of and to in is that for it as was with be by on not he this are or his from at which but have an they you were her she "
+    "there been one all we their has would when if so no more out up what about into them some could time only new its over may "
+    "other than then these two first like any most after also made did many before must through back years where much your way "
+    "well down should because each just those people how too little state good very make world still own see men work long get "
+    "here between both life being under never day same another know while last might us great old year off come since against "
+    "go came right used take three states himself few house use during without again place american around however home small"
+).split()
+IDENTIFIERS = "buffer chunk offset length window output position result size index value count total start end data item node key".split()
+KEYWORDS = ["if", "while", "for", "return", "else:", "elif", "try:", "except ValueError:", "with", "yield"]
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+@dataclass
+class Result:
+    """Medición de una combinación de corpus, entorno de ejecución, número de procesos y tamaño de las partes."""
+    corpus: str
+    backend: str
+    workers: int
+    chunk_size: int
+    codec: str
+    level: int | None
+    input_size: int
+    compressed_size: int
+    ratio: float
+    compress_seconds: float
+    decompress_seconds: float
+    compress_mbps: float
+    decompress_mbps: float
+    compress_peak_rss_kb: int
+    decompress_peak_rss_kb: int
+    roundtrip: bool
+
+def english_text(rng: random.Random, size: int) -> bytes:
+    """Genera texto en inglés con palabras frecuentes distribuidas según la ley de Zipf, en oraciones y párrafos.
+
+    Args:
+        rng (Random): Generador de números aleatorios con semilla fija.
+        size (int): Número de bytes a generar.
+    """
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    parts = []
+    total = 0
+
+    while total < size:
+        sentence = " ".join(rng.choices(WORDS, weights, k=rng.randint(5, 20)))
+        sentence = sentence[0].upper() + sentence[1:] + rng.choice([".", ".", ".", "?", "!", ";"]) + ("\n\n" if rng.random() < 0.15 else " ")
+        parts.append(sentence)
+        total += len(sentence)
+
+    return "".join(parts).encode()[:size]
+
+def source_code(rng: random.Random, size: int) -> bytes:
+    """Genera código fuente parecido a Python: funciones con sentencias anidadas, comentarios y literales numéricos.
+
+    Args:
+        rng (Random): Generador de números aleatorios con semilla fija.
+        size (int): Número de bytes a generar.
+    """
+    lines = []
+    total = 0
+
+    while total < size:
+        name = "_".join(rng.sample(IDENTIFIERS, 2))
+        arguments = ", ".join(rng.sample(IDENTIFIERS, rng.randint(1, 3)))
+        function = [f"def {name}({arguments}):", f'    """{" ".join(rng.choices(WORDS, k=8)).capitalize()}."""']
+
+        for _ in range(rng.randint(3, 12)):
+            depth = rng.randint(1, 3)
+            keyword = rng.choice(KEYWORDS)
+            identifier, other = rng.sample(IDENTIFIERS, 2)
+
+            if rng.random() < 0.2:
+                function.append("    " * depth + f"# {' '.join(rng.choices(WORDS, k=rng.randint(3, 9)))}")
+            elif keyword.endswith(":"):
+                function.append("    " * depth + keyword)
+            else:
+                function.append("    " * depth + f"{keyword} {identifier} {rng.choice(['<', '==', '+=', '-', '>='])} {other}[{rng.randint(0, 255)}]:")
+
+        function.append("")
+        lines.extend(function)
+        total += sum(len(line) + 1 for line in function)
+
+    return "\n".join(lines).encode()[:size]
+
+def repetitive(rng: random.Random, size: int) -> bytes:
+    """Genera un registro de eventos muy repetitivo: pocas plantillas con contadores que cambian poco.
+
+    Args:
+        rng (Random): Generador de números aleatorios con semilla fija.
+        size (int): Número de bytes a generar.
+    """
+    templates = [
+        "INFO worker {} processed chunk {} in {} ms\n",
+        "DEBUG root assigned chunk {} to worker {} ({} pending)\n",
+        "INFO heartbeat ok node={} seq={} load={}\n"
+    ]
+    parts = []
+    total = 0
+    sequence = 0
+
+    while total < size:
+        line = rng.choice(templates).format(rng.randint(1, 4), sequence, rng.randint(10, 12))
+        parts.append(line)
+        total += len(line)
+        sequence += 1
+
+    return "".join(parts).encode()[:size]
+
+def random_bytes(rng: random.Random, size: int) -> bytes:
+    """Genera bytes aleatorios, que no se pueden comprimir.
+
+    Args:
+        rng (Random): Generador de números aleatorios con semilla fija.
+        size (int): Número de bytes a generar.
+    """
+    return rng.randbytes(size)
+
+def mixed_binary(rng: random.Random, size: int) -> bytes:
+    """Genera datos binarios mixtos: registros de tamaño fijo con enteros y flotantes, etiquetas de texto y bloques aleatorios.
+
+    Args:
+        rng (Random): Generador de números aleatorios con semilla fija.
+        size (int): Número de bytes a generar.
+    """
+    record = struct.Struct("<IIdH8s")
+    output = bytearray()
+    identifier = 0
+
+    while len(output) < size:
+        if rng.random() < 0.05:
+            output += rng.randbytes(rng.randint(64, 512))
+        else:
+            identifier += rng.randint(1, 3)
+            output += record.pack(identifier, rng.randint(0, 1000), rng.random() * 100, rng.randint(0, 7), rng.choice(IDENTIFIERS).encode())
+
+    return bytes(output[:size])
+
+CORPORA: dict[str, Callable[[random.Random, int], bytes]] = {
+    "text": english_text,
+    "source": source_code,
+    "repetitive": repetitive,
+    "random": random_bytes,
+    "mixed": mixed_binary
+}
+
+def generate_corpus(name: str, size: int, seed: int) -> bytes:
+    """Genera un corpus de forma determinista: la misma semilla y el mismo tamaño producen siempre los mismos bytes.
+
+    Args:
+        name (str): Nombre del corpus.
+        size (int): Número de bytes a generar.
+        seed (int): Semilla del generador de números aleatorios.
+    """
+    return CORPORA[name](random.Random(f"{seed}-{name}"), size)
+
+def run_command(command: list[str]) -> tuple[float, int]:
+    """Ejecuta un comando en otro proceso y mide el tiempo que reporta y su memoria máxima.
+
+    Args:
+        command (list[str]): El comando.
+
+    Returns:
+        tuple[float, int]: El tiempo en segundos que imprime el comando, o el tiempo total si no imprime ninguno,
+        y la memoria residente máxima en KB del proceso y sus descendientes.
+
+    Raises:
+        RuntimeError: Si el comando termina con error.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=SCRIPT_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = process.stdout.read().decode(errors="replace")
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    process.stdout.close()
+
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} terminó con código {process.returncode}:\n{output}")
+
+    for line in reversed(output.splitlines()):
+        try:
+            return float(line), usage.ru_maxrss
+        except ValueError:
+            continue
+
+    return elapsed, usage.ru_maxrss
+
+def commands(backend: str, workers: int, chunk_size: int, infile: str, zipfile: str, outfile: str, options: list[str]) -> tuple[list[str], list[str]]:
+    """Construye los comandos de compresión y descompresión de una combinación.
+
+    Args:
+        backend (str): Entorno de ejecución: "serial", "local" o "mpi".
+        workers (int): Número de procesos que comprimen. Con MPI se lanza además el proceso raíz.
+        chunk_size (int): Tamaño de las partes.
+        infile (str): Archivo de entrada.
+        zipfile (str): Archivo comprimido.
+        outfile (str): Archivo descomprimido.
+        options (list[str]): Opciones adicionales del compresor.
+    """
+    python = sys.executable
+
+    if backend == "serial":
+        return [python, "compresor.py", infile, "-o", zipfile, *options], [python, "descompresor.py", zipfile, "-o", outfile]
+
+    parallel = ["-c", str(chunk_size)]
+
+    if backend == "local":
+        prefix = [python]
+        parallel += ["-b", "local", "-w", str(workers)]
+    else:
+        prefix = ["mpiexec", "--oversubscribe", "-n", str(workers + 1), python]
+
+        if os.geteuid() == 0:
+            prefix.insert(1, "--allow-run-as-root")
+
+    return [*prefix, "compresorp.py", infile, "-o", zipfile, *parallel, *options], [*prefix, "descompresorp.py", zipfile, "-o", outfile, *parallel]
+
+def run_benchmark(corpora: list[str], size: int, seed: int, backends: list[str], workers: list[int], chunk_sizes: list[int], codec: str, level: int | None) -> list[Result]:
+    """Mide la compresión y descompresión de cada corpus con cada combinación de entorno, número de procesos y tamaño de las partes.
+
+    Args:
+        corpora (list[str]): Nombres de los corpus.
+        size (int): Tamaño de cada corpus.
+        seed (int): Semilla de los corpus.
+        backends (list[str]): Entornos de ejecución a medir.
+        workers (list[int]): Números de procesos a medir en los entornos paralelos.
+        chunk_sizes (list[int]): Tamaños de las partes a medir en los entornos paralelos.
+        codec (str): Codificador de las referencias.
+        level (int | None): Nivel de compresión, o None para el análisis por defecto.
+    """
+    options = ["--codec", codec] + ([] if level is None else ["--level", str(level)])
+    results = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in corpora:
+            infile = os.path.join(directory, name)
+            zipfile = infile + ".lz77"
+            outfile = infile + ".out"
+
+            with open(infile, "wb") as file:
+                file.write(generate_corpus(name, size, seed))
+
+            for backend in backends:
+                combinations = [(1, CHUNK_SIZE)] if backend == "serial" else [(count, chunk_size) for count in workers for chunk_size in chunk_sizes]
+
+                for count, chunk_size in combinations:
+                    compress_command, decompress_command = commands(backend, count, chunk_size, infile, zipfile, outfile, options)
+                    compress_seconds, compress_rss = run_command(compress_command)
+                    decompress_seconds, decompress_rss = run_command(decompress_command)
+                    compressed_size = os.path.getsize(zipfile)
+                    megabytes = size / 2**20
+                    result = Result(
+                        name, backend, count, chunk_size, codec, level, size, compressed_size,
+                        round(size / compressed_size, 4) if compressed_size else 0.0,
+                        round(compress_seconds, 6), round(decompress_seconds, 6),
+                        round(megabytes / compress_seconds, 4) if compress_seconds else 0.0,
+                        round(megabytes / decompress_seconds, 4) if decompress_seconds else 0.0,
+                        compress_rss, decompress_rss, verify(infile, outfile)
+                    )
+                    results.append(result)
+                    print(f"{name:<10} {backend:<6} w={count:<3} c={chunk_size:<8} ratio={result.ratio:<8} "
+                          f"comp={result.compress_mbps:.3f} MB/s desc={result.decompress_mbps:.3f} MB/s ok={result.roundtrip}", file=sys.stderr)
+
+    return results
+
+def result_key(result: dict) -> tuple:
+    """Identifica una medición para compararla con la misma medición de otra ejecución.
+
+    Args:
+        result (dict): La medición.
+    """
+    return result["corpus"], result["backend"], result["workers"], result["chunk_size"], result["codec"], result["level"]
+
+def compare(baseline: dict, current: dict, speed_tolerance: float, ratio_tolerance: float) -> list[str]:
+    """Compara dos ejecuciones del benchmark y describe las regresiones de la segunda respecto a la primera.
+
+    Args:
+        baseline (dict): Resultados guardados de referencia.
+        current (dict): Resultados nuevos.
+        speed_tolerance (float): Fracción de velocidad que se puede perder sin considerarlo una regresión.
+        ratio_tolerance (float): Fracción de la razón de compresión que se puede perder sin considerarlo una regresión.
+
+    Returns:
+        list[str]: Una descripción por cada regresión encontrada.
+    """
+    previous = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+
+    for result in current["results"]:
+        key = result_key(result)
+        label = " ".join(str(part) for part in key)
+
+        if not result["roundtrip"]:
+            regressions.append(f"{label}: el archivo descomprimido no coincide con el original")
+
+        if key not in previous:
+            continue
+
+        old = previous[key]
+
+        for metric, tolerance in (("compress_mbps", speed_tolerance), ("decompress_mbps", speed_tolerance), ("ratio", ratio_tolerance)):
+            if result[metric] < old[metric] * (1 - tolerance):
+                regressions.append(f"{label}: {metric} bajó de {old[metric]} a {result[metric]}")
+
+    return regressions
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="Benchmark LZ77",
+        description="Mide la velocidad, la razón de compresión y la memoria de los compresores y descompresores LZ77 sobre corpus deterministas"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Ejecuta el benchmark y escribe los resultados en JSON")
+    run_parser.add_argument("-o", "--outfile", help="Archivo JSON de resultados. Por defecto se escriben a la salida estándar")
+    run_parser.add_argument("--corpora", help="Corpus a medir", nargs="+", choices=CORPORA.keys(), default=list(CORPORA.keys()))
+    run_parser.add_argument("-s", "--size", help="Tamaño de cada corpus en bytes", type=int, default=2**18)
+    run_parser.add_argument("--seed", help="Semilla de los corpus", type=int, default=0)
+    run_parser.add_argument("-b", "--backends", help="Entornos de ejecución a medir. MPI solo se mide si mpiexec está disponible", nargs="+", choices=["serial", "local", "mpi"], default=["serial", "local"])
+    run_parser.add_argument("-w", "--workers", help="Números de procesos a medir en los entornos paralelos", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    run_parser.add_argument("-c", "--chunk-sizes", help="Tamaños de las partes a medir en los entornos paralelos", type=int, nargs="+", default=[CHUNK_SIZE])
+    run_parser.add_argument("--codec", help="Codificador de las referencias", choices=CODECS, default=CODECS[0])
+    run_parser.add_argument("-l", "--level", help="Nivel de compresión", type=int, choices=range(1, 10))
+
+    compare_parser = subparsers.add_parser("compare", help="Compara resultados con una ejecución de referencia y reporta las regresiones")
+    compare_parser.add_argument("baseline", help="Archivo JSON de referencia")
+    compare_parser.add_argument("current", help="Archivo JSON con los resultados nuevos")
+    compare_parser.add_argument("--speed-tolerance", help="Fracción de velocidad que se puede perder", type=float, default=0.1)
+    compare_parser.add_argument("--ratio-tolerance", help="Fracción de la razón de compresión que se puede perder", type=float, default=0.0)
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        backends = [backend for backend in args.backends if backend != "mpi" or shutil.which("mpiexec")]
+        results = run_benchmark(args.corpora, args.size, args.seed, backends, args.workers, args.chunk_sizes, args.codec, args.level)
+        report = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "size": args.size,
+            "seed": args.seed,
+            "results": [asdict(result) for result in results]
+        }
+
+        if args.outfile:
+            with open(args.outfile, "w") as file:
+                json.dump(report, file, indent=2)
+        else:
+            json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.baseline) as file1, open(args.current) as file2:
+            regressions = compare(json.load(file1), json.load(file2), args.speed_tolerance, args.ratio_tolerance)
+
+        for regression in regressions:
+            print(regression)
+
+        print(f"{len(regressions)} regresiones")
+        sys.exit(1 if regressions else 0)
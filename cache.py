@@ -0,0 +1,169 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+
+from dataclasses import dataclass
+from typing import Any, Callable
+from container import VERSION
+from reference import TokenFormat
+from stats import STATS
+
+CACHE_SIZE = 2**30
+TRIM_FRACTION = 16
+LOCK_NAME = ".lock"
+TEMPORARY_PREFIX = ".tmp-"
+WRITTEN: dict[str, int] = {}
+
+def cache_parameters(matcher: Callable, raw: bool, token_format: TokenFormat) -> bytes:
+    """Serializa los parámetros que, junto con los datos, determinan la salida comprimida de una parte.
+    Las fábricas de motores de búsqueda son clases o partial de clases, así que su repr es el mismo en todos los procesos y ejecuciones.
+
+    Args:
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        raw (bool): Si la parte usa el formato original sin encabezado.
+        token_format (TokenFormat): Geometría y codificador de las referencias.
+    """
+    return f"{VERSION}|{raw}|{token_format!r}|{matcher!r}".encode()
+
+def cache_report(snapshots: list[dict[str, Any]]) -> str:
+    """Resume los aciertos y fallos del caché de todos los procesos.
+
+    Args:
+        snapshots (list[dict[str, Any]]): Estadísticas de cada proceso.
+    """
+    hits = sum(snapshot["counters"].get("cache_hits", 0) for snapshot in snapshots)
+    misses = sum(snapshot["counters"].get("cache_misses", 0) for snapshot in snapshots)
+
+    return f"caché: {hits} aciertos, {misses} fallos"
+
+@dataclass
+class ChunkCache:
+    """Caché en disco de partes comprimidas, indexada por un hash de los parámetros, la ventana que precede a la parte y la parte.
+    Cada entrada es un archivo que se escribe en un archivo temporal y se renombra, así que varios procesos de MPI o del pool local
+    pueden leer y escribir a la vez sin bloquearse. Las entradas usadas se marcan con la fecha de modificación y, cada vez que un proceso escribe
+    max_size / TRIM_FRACTION bytes, se borran las usadas hace más tiempo hasta que el caché ocupe a lo sumo max_size bytes. Solo un proceso a la vez hace ese recorte.
+
+    Attributes:
+        directory (str): Directorio del caché.
+        max_size (int): Tamaño máximo del caché en bytes.
+    """
+    directory: str
+    max_size: int = CACHE_SIZE
+
+    def key(self, parameters: bytes, prefix: bytes | memoryview, chunk: bytes | memoryview) -> str:
+        """Calcula la clave de una parte.
+
+        Args:
+            parameters (bytes): Los parámetros de compresión, serializados con cache_parameters.
+            prefix (bytes | memoryview): La ventana que precede a la parte, o el diccionario si los bloques son independientes.
+            chunk (bytes | memoryview): La parte sin comprimir.
+        """
+        digest = hashlib.blake2b(digest_size=20)
+
+        for data in (parameters, len(prefix).to_bytes(8, "big"), prefix, chunk):
+            digest.update(data)
+
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        """Ruta de la entrada de una clave. Las entradas se reparten en subdirectorios según los dos primeros caracteres de la clave.
+
+        Args:
+            key (str): La clave.
+        """
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key: str) -> bytes | None:
+        """Busca una parte comprimida y la marca como usada.
+
+        Args:
+            key (str): La clave de la parte.
+
+        Returns:
+            bytes | None: La parte comprimida, o None si no está en el caché.
+        """
+        path = self.path(key)
+
+        try:
+            with open(path, "rb") as file:
+                output = file.read()
+
+            os.utime(path)
+        except FileNotFoundError:
+            STATS.count("cache_misses")
+            return None
+
+        STATS.count("cache_hits")
+
+        return output
+
+    def put(self, key: str, output: bytes) -> None:
+        """Guarda una parte comprimida. Si otro proceso guarda la misma parte a la vez, se queda una de las dos copias, que son iguales.
+        Los bytes escritos desde el último recorte se cuentan en WRITTEN, que es del proceso y no del caché, porque el pool local
+        envía una copia del caché con cada parte y un contador en el objeto volvería a 0 en cada una.
+
+        Args:
+            key (str): La clave de la parte.
+            output (bytes): La parte comprimida.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(prefix=TEMPORARY_PREFIX, dir=os.path.dirname(path))
+
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(output)
+
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+        WRITTEN[self.directory] = WRITTEN.get(self.directory, 0) + len(output)
+
+        if WRITTEN[self.directory] >= self.max_size // TRIM_FRACTION:
+            self.trim()
+
+    def trim(self) -> None:
+        """Borra las entradas usadas hace más tiempo hasta que el caché ocupe a lo sumo max_size bytes.
+        Si otro proceso ya está recortando el caché, no hace nada.
+        """
+        WRITTEN[self.directory] = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+        with open(os.path.join(self.directory, LOCK_NAME), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            entries = []
+
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir():
+                    continue
+
+                for entry in os.scandir(shard.path):
+                    if entry.name.startswith(TEMPORARY_PREFIX):
+                        continue
+
+                    try:
+                        status = entry.stat()
+                    except FileNotFoundError:
+                        continue
+
+                    entries.append((status.st_mtime_ns, status.st_size, entry.path))
+
+            total = sum(size for _, size, _ in entries)
+
+            for _, size, path in sorted(entries):
+                if total <= self.max_size:
+                    break
+
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+                total -= size
@@ -1,84 +1,269 @@
+import mmap
+import os
+import sys
+import zlib
+import huffman
+
+from collections import Counter
 from timeit import Timer
 from argparse import ArgumentParser
-from constants import LENGTH_THRESHOLD, WINDOW_SIZE, CHUNK_SIZE, MAX_REF_LENGTH
-from reference import Reference
+from typing import Callable
+from constants import CHUNK_SIZE, LENGTH_BITS, MAX_CHAIN_DEPTH, OFFSET_BITS
+from container import build_index, write_header, write_index
+from dictionary import dictionary_id, load_dictionary
+from matcher import MATCHERS, MIN_MATCH, HashChainMatcher, build_matcher
+from parsing import build_level
+from reference import CODECS, DEFAULT_FORMAT, HUFFMAN, VARINT, TokenFormat, varint_accepts, write_varint
+from stats import STATS, write_stats
+
+Sequence = tuple[int, int, int, int]
 
-def window_match(lookahead: bytes, window: bytes) -> Reference:
-    """Realiza una búsqueda en la ventana de referencia para encontrar una sequencia que coincida con la sequencia iniciada con el byte actual que se está leyendo.
+def find_sequences(chunk: bytes | memoryview, offset: int, engine, end: int, accepts: Callable[[int, int], bool]) -> list[Sequence]:
+    """Divide una parte del archivo en secuencias de literales seguidas de una coincidencia.
+    Es el análisis que comparten los codificadores VARINT y HUFFMAN. Solo se usan las coincidencias de al menos MIN_MATCH bytes que el codificador acepta.
 
     Args:
-        lookahead (bytes): Buffer de bytes que contiene el byte actual y todos los que están despues de este.
-        window (bytes): Ventana de referencia para buscar ocurrencias anteriores de la sequencia actual.
+        chunk (bytes | memoryview): Buffer que contiene la parte del archivo que se va a comprimir y la ventana que la precede.
+        offset (int): Posición a partir de la cual iniciar a comprimir.
+        engine (HashChainMatcher | LinearMatcher): Motor de búsqueda de coincidencias sobre el buffer.
+        end (int): Posición en la que se deja de comprimir.
+        accepts ((int, int) -> bool): Función que recibe la longitud y la distancia de una coincidencia e indica si vale la pena usarla.
 
     Returns:
-        Reference: Se retorna una referencia a una ocurrencia pasada de la secuencia actual. En caso contrario se retorna una referencia de longitud 0.
+        list[tuple[int, int, int, int]]: Las secuencias como tuplas (inicio de los literales, inicio de la coincidencia, longitud, distancia).
+        La última secuencia puede no tener coincidencia, en cuyo caso su longitud es 0 y sus literales llegan hasta end.
     """
-    current = lookahead[0]
-    window_length = len(window)
-    lookahead_length = len(lookahead)
-    longest = Reference(0, 0, current)
-    found = window.find(current)
-
-    while found > -1:
-        offset = window_length - found
-        max_length = min(offset, lookahead_length - 1)
-        
-        if max_length > longest.length:
-            for i in range(1, max_length):
-                if window[found + i] != lookahead[i]:
-                    if i > longest.length:
-                        longest = Reference(offset, i, lookahead[i])
-
-                    break
-            else:
-                longest = Reference(offset, max_length, lookahead[max_length])
-        
-        if longest.length > LENGTH_THRESHOLD:
-            return longest
-        
-        found = window.find(current, found + 1)
-
-    return longest
-
-def process_chunk(chunk: bytes, offset: int) -> bytearray:
+    sequences = []
+    match = engine.match
+    literal_start = offset
+    i = offset
+
+    while i < end:
+        distance, length = match(i)
+
+        if length >= MIN_MATCH and accepts(length, distance):
+            sequences.append((literal_start, i, length, distance))
+            i += length
+            literal_start = i
+        else:
+            i += 1
+
+    if literal_start < end:
+        sequences.append((literal_start, end, 0, 0))
+
+    return sequences
+
+def encode_sequences(chunk: bytes | memoryview, sequences: list[Sequence]) -> bytearray:
+    """Serializa las secuencias de una parte del archivo con el codificador VARINT.
+    Cada secuencia se escribe como un byte de control, los literales tal cual y la distancia de la coincidencia.
+    Los 4 bits altos del byte de control son el número de literales y los 4 bajos la longitud de la coincidencia menos MIN_MATCH.
+    Si alguno vale 15 el resto del valor se escribe con write_varint, igual que la distancia. Como solo se aceptan coincidencias
+    que ocupan menos bytes que los literales que reemplazan, los datos incompresibles quedan como una única secuencia de literales.
+
+    Args:
+        chunk (bytes | memoryview): Buffer sobre el que se calcularon las secuencias.
+        sequences (list[tuple[int, int, int, int]]): Las secuencias calculadas con find_sequences.
+
+    Returns:
+        bytearray: La parte comprimida en bytes.
+    """
+    output = bytearray()
+    append = output.append
+
+    for literal_start, match_start, length, distance in sequences:
+        literals = match_start - literal_start
+        match_code = length - MIN_MATCH if length else 0
+        append((min(literals, 15) << 4) | min(match_code, 15))
+
+        if literals >= 15:
+            write_varint(output, literals - 15)
+
+        output += chunk[literal_start:match_start]
+
+        if length:
+            if match_code >= 15:
+                write_varint(output, match_code - 15)
+
+            write_varint(output, distance)
+
+    return output
+
+def record_matches(engine, size: int, literals: int, lengths: Counter, distances: Counter) -> None:
+    """Registra en STATS los candidatos revisados, los literales y los histogramas de longitud y distancia de las coincidencias de una parte.
+
+    Args:
+        engine (HashChainMatcher | LinearMatcher | LazyMatcher | OptimalMatcher): Motor de búsqueda usado. Solo algunos cuentan los candidatos revisados.
+        size (int): Número de bytes comprimidos.
+        literals (int): Número de bytes que quedaron como literales.
+        lengths (Counter): Número de coincidencias de cada longitud.
+        distances (Counter): Número de coincidencias por cantidad de bits de la distancia.
+    """
+    probes = getattr(engine, "probes", None)
+
+    if probes is not None:
+        STATS.count("probes", probes)
+        STATS.count("probed_bytes", size)
+
+    STATS.count("input_bytes", size)
+    STATS.count("literal_bytes", literals)
+    STATS.count("matches", sum(lengths.values()))
+    STATS.observe("match_length", lengths)
+    STATS.observe("distance_bits", distances)
+
+def record_sequences(engine, size: int, sequences: list[Sequence]) -> None:
+    """Registra en STATS las estadísticas de las secuencias de una parte comprimida con VARINT o HUFFMAN.
+
+    Args:
+        engine (HashChainMatcher | LinearMatcher | LazyMatcher | OptimalMatcher): Motor de búsqueda usado.
+        size (int): Número de bytes comprimidos.
+        sequences (list[tuple[int, int, int, int]]): Las secuencias calculadas con find_sequences.
+    """
+    lengths = Counter(length for _, _, length, _ in sequences if length)
+    distances = Counter(distance.bit_length() for _, _, length, distance in sequences if length)
+    literals = sum(match_start - literal_start for literal_start, match_start, _, _ in sequences)
+    record_matches(engine, size, literals, lengths, distances)
+
+def record_tokens(engine, size: int, output: bytearray, token_format: TokenFormat) -> None:
+    """Registra en STATS las estadísticas de las referencias de una parte comprimida con FIXED. Cada referencia lleva un literal.
+
+    Args:
+        engine (HashChainMatcher | LinearMatcher | LazyMatcher | OptimalMatcher): Motor de búsqueda usado.
+        size (int): Número de bytes comprimidos.
+        output (bytearray): La parte comprimida.
+        token_format (TokenFormat): Geometría de las referencias.
+    """
+    from descompresor import decode_tokens
+
+    offsets, lengths, literals = decode_tokens(bytes(output), token_format)
+    matched = lengths > 0
+    distances = Counter(int(offset).bit_length() for offset in offsets[matched].tolist())
+    record_matches(engine, size, len(literals), Counter(lengths[matched].tolist()), distances)
+
+def process_chunk(chunk: bytes | memoryview, offset: int, matcher: Callable = HashChainMatcher, end: int | None = None, token_format: TokenFormat = DEFAULT_FORMAT) -> bytearray:
     """Comprime una parte del archivo, a partir de una determinada posición.
+    Trabaja con posiciones absolutas sobre el buffer, por lo que no se copia la ventana ni el lookahead en cada posición.
 
     Args:
-        chunk (str): La parte del archivo que se va a comprimir.
+        chunk (bytes | memoryview): Buffer que contiene la parte del archivo que se va a comprimir y la ventana que la precede.
         offset (int): Posición a partir de la cual iniciar a comprimir.
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        end (int | None): Posición en la que se deja de comprimir. Por defecto es el final del buffer.
+        token_format (TokenFormat): Geometría y codificador de las referencias.
 
     Returns:
         bytearray: La parte comprimida en bytes.
     """
+    end = len(chunk) if end is None else end
+    engine = matcher(chunk, offset, end, token_format=token_format)
+
+    if token_format.codec == VARINT:
+        sequences = find_sequences(chunk, offset, engine, end, varint_accepts)
+
+        if STATS.detailed:
+            record_sequences(engine, end - offset, sequences)
+
+        return encode_sequences(chunk, sequences)
+
+    if token_format.codec == HUFFMAN:
+        sequences = find_sequences(chunk, offset, engine, end, huffman.accepts)
+
+        if STATS.detailed:
+            record_sequences(engine, end - offset, sequences)
+
+        coded = huffman.encode(chunk, sequences)
+        stored = encode_sequences(chunk, sequences)
+
+        if len(stored) < len(coded):
+            return bytearray([huffman.SEQUENCE_BLOCK]) + stored
+
+        return bytearray([huffman.CODED_BLOCK]) + coded
+
     output = bytearray()
-    iterator = iter(range(offset, len(chunk)))
+    append = output.append
+    match = engine.match
+    offset_bits = token_format.offset_bits
+    pointer_bytes = token_format.pointer_bytes
+    i = offset
 
-    for i in iterator:
-        window = chunk[max(i - WINDOW_SIZE, 0): i]
-        lookahead = chunk[i:i + MAX_REF_LENGTH]
-        matched = window_match(lookahead, window)
-        output.extend(matched.to_bytes())
+    while i < end:
+        distance, length = match(i)
+        packed = (length << offset_bits) | distance
+
+        if pointer_bytes == 2:
+            append(packed >> 8)
+            append(packed & 0xFF)
+        else:
+            output += packed.to_bytes(pointer_bytes, "big")
+
+        append(chunk[i + length])
+        i += length + 1
+
+    if STATS.detailed:
+        record_tokens(engine, end - offset, output, token_format)
 
-        for _ in range(matched.length):
-            next(iterator)
-    
     return output
 
-def compress(filename: str, outfile: str):
+def compress_block(block: bytes | memoryview, matcher: Callable = HashChainMatcher, token_format: TokenFormat = DEFAULT_FORMAT, dictionary: bytes = b"") -> bytearray:
+    """Comprime un bloque independiente. Si se especifica un diccionario, sus últimos bytes se usan como ventana inicial del bloque.
+
+    Args:
+        block (bytes | memoryview): El bloque.
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        token_format (TokenFormat): Geometría y codificador de las referencias.
+        dictionary (bytes): Diccionario entrenado con dictionary.train_dictionary, o bytes vacíos para empezar con la ventana vacía.
+
+    Returns:
+        bytearray: El bloque comprimido en bytes.
+    """
+    if not dictionary:
+        return process_chunk(block, 0, matcher, token_format=token_format)
+
+    preset = dictionary[-token_format.window_size:]
+
+    return process_chunk(preset + block, len(preset), matcher, token_format=token_format)
+
+def compress(filename: str, outfile: str, matcher: Callable = HashChainMatcher, raw: bool = False, token_format: TokenFormat = DEFAULT_FORMAT, dictionary: bytes = b""):
     """Comprime un archivo utilizando el algoritmo LZ77.
+    El archivo se mapea en memoria y se comprime por bloques independientes de CHUNK_SIZE bytes, que se registran en el índice del contenedor junto con su CRC32.
 
     Args:
         filename (str): El archivo a comprimir.
         outfile (str): El archivo comprimido de salida.
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        raw (bool): Si es verdadero se escribe el formato original sin encabezado, en el que cada parte usa como ventana el final de la anterior.
+        token_format (TokenFormat): Geometría de las referencias. Se guarda en el encabezado, por lo que el formato original solo admite la geometría y el codificador por defecto.
+        dictionary (bytes): Diccionario usado como ventana inicial de cada bloque. Su identificador se guarda en el encabezado.
+
+    Raises:
+        ValueError: Si se pide el formato original con una geometría, un codificador o un diccionario distintos a los de por defecto.
     """
+    if raw and (token_format != DEFAULT_FORMAT or dictionary):
+        raise ValueError("El formato original sin encabezado solo admite la geometría y el codificador por defecto, sin diccionario")
+
     with open(filename, "rb") as file, open(outfile, "wb") as out:
-        buffer = b""
-        
-        while chunk := file.read(CHUNK_SIZE):
-            window = buffer[-WINDOW_SIZE:]
-            buffer = window + chunk
-            output = process_chunk(buffer, len(window))
-            out.write(output)
+        size = os.fstat(file.fileno()).st_size
+        sizes = []
+        checksums = []
+
+        if not raw:
+            write_header(out, CHUNK_SIZE, token_format, dictionary_id(dictionary) if dictionary else 0)
+
+        if size > 0:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                for start in range(0, size, CHUNK_SIZE):
+                    end = min(start + CHUNK_SIZE, size)
+
+                    with STATS.measure("chunk_compute"):
+                        output = process_chunk(view, start, matcher, end) if raw else compress_block(view[start:end], matcher, token_format, dictionary)
+
+                    with STATS.measure("chunk_write"):
+                        out.write(output)
+
+                    sizes.append((len(output), end - start))
+                    checksums.append(zlib.crc32(view[start:end]))
+
+        if not raw:
+            write_index(out, build_index(sizes, checksums))
 
 if __name__ == "__main__":
     parser = ArgumentParser(
@@ -86,11 +271,47 @@ if __name__ == "__main__":
         description="Comprime un archivo usando el algoritmo LZ77"
     )
 
-    parser.add_argument("filename", help="Archivo a comprimir")
-    parser.add_argument("-o", "--outfile", help="Nombre del archivo comprimido", default="comprimido.elmejorprofesor")
+    parser.add_argument("filename", help="Archivo a comprimir, o - para leer de la entrada estándar")
+    parser.add_argument("-o", "--outfile", help="Nombre del archivo comprimido, o - para escribir en la salida estándar", default="comprimido.elmejorprofesor")
+    parser.add_argument("-m", "--matcher", help="Motor de búsqueda de coincidencias", choices=MATCHERS.keys(), default="hash")
+    parser.add_argument("--max-chain", help=f"Número máximo de candidatos a revisar por posición. Por defecto lo determina el nivel, o es {MAX_CHAIN_DEPTH} si no se especifica un nivel", type=int)
+    parser.add_argument("-l", "--level", help="Nivel de compresión: de 1 a 3 análisis voraz, de 4 a 6 perezoso y de 7 a 9 óptimo. Por defecto se usa un análisis voraz", type=int, choices=range(1, 10))
+    parser.add_argument("--raw", help="Escribe el formato original sin encabezado ni índice de bloques", action="store_true")
+    parser.add_argument("--window-bits", help="Número de bits de la distancia de cada referencia. La ventana tiene 2**bits - 1 bytes", type=int, default=OFFSET_BITS)
+    parser.add_argument("--length-bits", help="Número de bits de la longitud de cada referencia", type=int, default=LENGTH_BITS)
+    parser.add_argument("--codec", help="Codificación de las referencias: de tamaño fijo como en el formato original, secuencias de literales y coincidencias con números de longitud variable, o esas mismas secuencias con códigos de Huffman", choices=CODECS, default=CODECS[0])
+    parser.add_argument("--stats", help="Registra contadores y tiempos de la compresión y los escribe en JSON en el archivo especificado", metavar="ARCHIVO")
+    parser.add_argument("-D", "--dictionary", help="Diccionario entrenado con dictionary.py que se usa como ventana inicial de cada bloque")
 
     args = parser.parse_args()
     filename, outfile = args.filename, args.outfile
-    timer = Timer(lambda: compress(filename, outfile))
+    matcher = build_matcher(args.matcher, MAX_CHAIN_DEPTH if args.max_chain is None else args.max_chain) if args.level is None else build_level(args.level, args.matcher, args.max_chain)
+
+    try:
+        token_format = TokenFormat(args.window_bits, args.length_bits, args.codec)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.raw and token_format != DEFAULT_FORMAT:
+        parser.error("--raw solo admite la geometría y el codificador por defecto")
+
+    if args.raw and args.dictionary:
+        parser.error("--raw no admite diccionarios")
+
+    dictionary = load_dictionary(args.dictionary) if args.dictionary else b""
+
+    if args.stats:
+        STATS.enable()
+
+    if "-" in (filename, outfile):
+        from stream import compress_stream
+
+        source = sys.stdin.buffer if filename == "-" else open(filename, "rb")
+        timer = Timer(lambda: compress_stream(source, sys.stdout.buffer if outfile == "-" else outfile, matcher, args.raw, token_format, dictionary))
+    else:
+        timer = Timer(lambda: compress(filename, outfile, matcher, args.raw, token_format, dictionary))
+
+    print(timer.timeit(1), file=sys.stderr if outfile == "-" else sys.stdout)
 
-    print(timer.timeit(1))
\ No newline at end of file
+    if args.stats:
+        write_stats(args.stats, [STATS.snapshot()])
\ No newline at end of file
@@ -1,40 +1,136 @@
+import mmap
+import os
+import zlib
+
 from argparse import ArgumentParser
+from functools import partial
 from timeit import Timer
 from typing import Callable
-from constants import CHUNK_SIZE, WINDOW_SIZE
-from mpi_globals import RANK
-from process import Root, Worker
-from compresor import process_chunk
+from archive import plan_archive, write_archive_index
+from cache import CACHE_SIZE, ChunkCache, cache_parameters, cache_report
+from constants import CHUNK_SIZE, LENGTH_BITS, MAX_BUFFER_SIZE, MAX_CHAIN_DEPTH, OFFSET_BITS, QUEUE_DEPTH
+from compresor import compress_block, process_chunk
+from container import build_index, pack_header, write_header, write_index
+from dictionary import dictionary_id, load_dictionary
+from matcher import MATCHERS, HashChainMatcher, build_matcher
+from parsing import build_level
+from pool import LocalPool
+from reference import CODECS, DEFAULT_FORMAT, TokenFormat
+from stats import STATS, write_stats
+
+def compress_chunk(chunk_size: int, matcher: Callable, raw: bool, token_format: TokenFormat, dictionary: bytes, cache: ChunkCache | None, filename: str, chunk_number: int, start: int | None = None, size: int | None = None) -> bytes:
+    """
+    Lee una parte de un archivo de texto y la comprime. Si la parte ya está en el caché, con la misma ventana y los mismos parámetros, no se vuelve a comprimir.
 
-def chunk_processor(chunk_size: int) -> Callable[[str, int], bytes]:
+    Args:
+        chunk_size (int): El tamaño de cada parte del archivo.
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        raw (bool): Si es verdadero la parte usa como ventana el final de la anterior, como en el formato original.
+        token_format (TokenFormat): Geometría de las referencias.
+        dictionary (bytes): Diccionario usado como ventana inicial de la parte, o bytes vacíos. No aplica al formato original.
+        cache (ChunkCache | None): Caché de partes comprimidas, o None para comprimir siempre.
+        filename (str): El nombre del archivo de texto.
+        chunk_number (int): El número de la parte a comprimir.
+        start (int | None): Posición de la parte en el archivo. Por defecto se calcula a partir de chunk_number y chunk_size.
+        size (int | None): Tamaño de la parte. Por defecto es chunk_size.
+    """
+    chunk_start = chunk_number * chunk_size if start is None else start
+
+    with open(filename, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+        chunk_end = min(chunk_start + (chunk_size if size is None else size), len(view))
+
+        if cache:
+            key = cache.key(
+                cache_parameters(matcher, raw, token_format),
+                view[max(chunk_start - token_format.window_size, 0):chunk_start] if raw else dictionary[-token_format.window_size:],
+                view[chunk_start:chunk_end]
+            )
+
+            if (output := cache.get(key)) is not None:
+                return output
+
+        output = process_chunk(view, chunk_start, matcher, chunk_end) if raw else compress_block(view[chunk_start:chunk_end], matcher, token_format, dictionary)
+
+        if cache:
+            cache.put(key, output)
+
+        return output
+
+def chunk_processor(chunk_size: int, matcher: Callable = HashChainMatcher, raw: bool = False, token_format: TokenFormat = DEFAULT_FORMAT, dictionary: bytes = b"", cache: ChunkCache | None = None) -> Callable[[str, int], bytes]:
     """
     Retorna una función que permite comprimir una parte del tamaño especificado de un archivo de texto.
+    La función puede serializarse, por lo que también sirve para el pool de procesos locales.
 
     Args:
         chunk_size (int): El tamaño de cada parte del archivo.
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        raw (bool): Si es verdadero cada parte usa como ventana el final de la anterior, como en el formato original.
+        En caso contrario cada parte es un bloque independiente del contenedor.
+        token_format (TokenFormat): Geometría de las referencias.
+        dictionary (bytes): Diccionario usado como ventana inicial de cada bloque, o bytes vacíos.
+        cache (ChunkCache | None): Caché de partes comprimidas, o None para comprimir siempre.
     """
-    def compress_chunk(filename: str, chunk_number: int) -> bytes:
-        """
-        Lee una parte de un archivo de texto y la comprime.
-
-        Args:
-            filename (str): El nombre del archivo de texto.
-            chunk_number (int): El número de la parte a comprimir.
-        """
-        chunk_start = chunk_number * chunk_size
-        
-        with open(filename, "rb") as file:
-            windows_start = max(chunk_start - WINDOW_SIZE, 0)
-            file.seek(windows_start)
-            window = b"" if chunk_number == 0 else file.read(WINDOW_SIZE)
-            window_size = len(window)
-            chunk = file.read(chunk_size)
-            output = process_chunk(window + chunk, window_size)
-            
-            return output
-    
-    return compress_chunk
+    return partial(compress_chunk, chunk_size, matcher, raw, token_format, dictionary, cache)
 
+def compress_member_chunk(chunk_size: int, matcher: Callable, token_format: TokenFormat, dictionary: bytes, cache: ChunkCache | None, paths: tuple[str, ...], filename: str, chunk_number: int) -> bytes:
+    """
+    Comprime una parte de uno de los archivos de un archivo comprimido con varios archivos.
+    La parte se ubica con el plan de plan_archive, por lo que se ignora el nombre de archivo que reciben todas las funciones de procesamiento.
+
+    Args:
+        chunk_size (int): El tamaño máximo de cada parte.
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        token_format (TokenFormat): Geometría de las referencias.
+        dictionary (bytes): Diccionario usado como ventana inicial de cada bloque, o bytes vacíos.
+        cache (ChunkCache | None): Caché de partes comprimidas, o None para comprimir siempre.
+        paths (tuple[str, ...]): Archivos y directorios a comprimir.
+        filename (str): No se usa.
+        chunk_number (int): El número de la parte a comprimir, contando las partes de todos los archivos.
+    """
+    file, start, size = plan_archive(paths, chunk_size).chunks[chunk_number]
+
+    return compress_chunk(chunk_size, matcher, False, token_format, dictionary, cache, file, chunk_number, start, size)
+
+def archive_processor(paths: list[str], chunk_size: int, matcher: Callable = HashChainMatcher, token_format: TokenFormat = DEFAULT_FORMAT, dictionary: bytes = b"", cache: ChunkCache | None = None) -> Callable[[str, int], bytes]:
+    """
+    Retorna una función que permite comprimir una parte de cualquiera de los archivos de un archivo comprimido con varios archivos.
+    Solo lleva las rutas de entrada, por lo que serializarla no depende del número de archivos.
+
+    Args:
+        paths (list[str]): Archivos y directorios a comprimir.
+        chunk_size (int): El tamaño máximo de cada parte.
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        token_format (TokenFormat): Geometría de las referencias.
+        dictionary (bytes): Diccionario usado como ventana inicial de cada bloque, o bytes vacíos.
+        cache (ChunkCache | None): Caché de partes comprimidas, o None para comprimir siempre.
+    """
+    return partial(compress_member_chunk, chunk_size, matcher, token_format, dictionary, cache, tuple(paths))
+
+def block_checksums(filename: str, sizes: list[tuple[int, int]]) -> list[int]:
+    """
+    Calcula el CRC32 de cada parte del archivo de entrada. Las partes se leen en orden con el tamaño con el que fueron comprimidas,
+    por lo que también sirve cuando el tamaño de las partes es adaptativo.
+
+    Args:
+        filename (str): El nombre del archivo de texto.
+        sizes (list[tuple[int, int]]): El tamaño comprimido y sin comprimir de cada parte, en orden.
+    """
+    with open(filename, "rb") as file:
+        return [zlib.crc32(file.read(size)) for _, size in sizes]
+
+def write_block_index(filename: str, outfile: str, sizes: list[tuple[int, int]]) -> None:
+    """
+    Escribe el índice de bloques, con el CRC32 de cada uno, al final del archivo comprimido una vez se han escrito todas las partes.
+
+    Args:
+        filename (str): El nombre del archivo de texto.
+        outfile (str): El nombre del archivo comprimido.
+        sizes (list[tuple[int, int]]): El tamaño comprimido y sin comprimir de cada parte, en orden.
+    """
+    checksums = block_checksums(filename, sizes)
+
+    with open(outfile, "ab") as out:
+        write_index(out, build_index(sizes, checksums))
 
 if __name__ == "__main__":
     parser = ArgumentParser(
@@ -42,17 +138,116 @@ if __name__ == "__main__":
         description="Comprime un archivo usando el algoritmo LZ77 en paralelo"
     )
 
-    parser.add_argument("filename", help="Archivo a comprimir")
+    parser.add_argument("filenames", help="Archivo a comprimir. Con varios archivos o directorios se crea un único archivo comprimido con un directorio de miembros", nargs="+")
     parser.add_argument("-o", "--outfile", help="Nombre del archivo comprimido", default="comprimidop.elmejorprofesor")
     parser.add_argument("-c", "--chunk-size", help="Tamaño de las partes en las cuales se dividirá el archivo de entrada", type=int, default=CHUNK_SIZE)
+    parser.add_argument("-m", "--matcher", help="Motor de búsqueda de coincidencias", choices=MATCHERS.keys(), default="hash")
+    parser.add_argument("--max-chain", help=f"Número máximo de candidatos a revisar por posición. Por defecto lo determina el nivel, o es {MAX_CHAIN_DEPTH} si no se especifica un nivel", type=int)
+    parser.add_argument("-l", "--level", help="Nivel de compresión: de 1 a 3 análisis voraz, de 4 a 6 perezoso y de 7 a 9 óptimo. Por defecto se usa un análisis voraz", type=int, choices=range(1, 10))
+    parser.add_argument("--raw", help="Escribe el formato original sin encabezado ni índice de bloques", action="store_true")
+    parser.add_argument("--window-bits", help="Número de bits de la distancia de cada referencia. La ventana tiene 2**bits - 1 bytes", type=int, default=OFFSET_BITS)
+    parser.add_argument("--length-bits", help="Número de bits de la longitud de cada referencia", type=int, default=LENGTH_BITS)
+    parser.add_argument("--codec", help="Codificación de las referencias: de tamaño fijo como en el formato original, secuencias de literales y coincidencias con números de longitud variable, o esas mismas secuencias con códigos de Huffman", choices=CODECS, default=CODECS[0])
+    parser.add_argument("-b", "--backend", help="Entorno de paralelismo: MPI o un pool de procesos locales", choices=["mpi", "local"], default="mpi")
+    parser.add_argument("-w", "--workers", help="Número de procesos del pool local. Por defecto es el número de núcleos", type=int)
+    parser.add_argument("-d", "--depth", help="Número máximo de partes asignadas a la vez a cada Worker de MPI", type=int, default=QUEUE_DEPTH)
+    parser.add_argument("--max-buffer", help="Número máximo de bytes que el proceso raíz guarda a la espera de ser escritos", type=int, default=MAX_BUFFER_SIZE)
+    parser.add_argument("-a", "--adaptive", help="Ajusta el tamaño de las partes según el tiempo medido de las anteriores. Solo aplica a un archivo con MPI y el escritor root", action="store_true")
+    parser.add_argument("--writer", help="Forma de escribir la salida con MPI: en orden desde el proceso raíz o en paralelo desde todos los procesos con MPI-IO", choices=["root", "mpiio"], default="root")
+    parser.add_argument("--stats", help="Registra contadores y tiempos de todos los procesos y escribe su total en JSON en el archivo especificado", metavar="ARCHIVO")
+    parser.add_argument("-D", "--dictionary", help="Diccionario entrenado con dictionary.py que se usa como ventana inicial de cada bloque")
+    parser.add_argument("--cache", help="Directorio del caché de partes comprimidas. Las partes que no cambiaron desde una ejecución anterior no se vuelven a comprimir", metavar="DIRECTORIO")
+    parser.add_argument("--cache-size", help="Tamaño máximo del caché en bytes. Se borran las partes usadas hace más tiempo", type=int, default=CACHE_SIZE)
 
     args = parser.parse_args()
-    filename, outfile, chunk_size = args.filename, args.outfile, args.chunk_size
+    filename, outfile, chunk_size = args.filenames[0], args.outfile, args.chunk_size
+    archive = len(args.filenames) > 1 or os.path.isdir(filename)
+    matcher = build_matcher(args.matcher, MAX_CHAIN_DEPTH if args.max_chain is None else args.max_chain) if args.level is None else build_level(args.level, args.matcher, args.max_chain)
+
+    try:
+        token_format = TokenFormat(args.window_bits, args.length_bits, args.codec)
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.raw and token_format != DEFAULT_FORMAT:
+        parser.error("--raw solo admite la geometría y el codificador por defecto")
+
+    if archive and args.raw:
+        parser.error("--raw solo admite un archivo")
+
+    if args.raw and args.dictionary:
+        parser.error("--raw no admite diccionarios")
+
+    if args.adaptive and (archive or args.backend != "mpi" or args.writer != "root"):
+        parser.error("--adaptive solo aplica a un archivo con MPI y el escritor root")
+
+    dictionary = load_dictionary(args.dictionary) if args.dictionary else b""
+    header_id = dictionary_id(dictionary) if dictionary else 0
+    cache = ChunkCache(args.cache, args.cache_size) if args.cache else None
+
+    if archive:
+        try:
+            plan = plan_archive(tuple(args.filenames), chunk_size)
+        except ValueError as error:
+            parser.error(str(error))
+
+        processor = archive_processor(args.filenames, chunk_size, matcher, token_format, dictionary, cache)
+        total_chunks = len(plan.chunks)
+        chunk_sizes = [size for _, _, size in plan.chunks]
+        index_writer = partial(write_archive_index, plan)
+    else:
+        processor = chunk_processor(chunk_size, matcher, args.raw, token_format, dictionary, cache)
+        total_chunks = None
+        chunk_sizes = None
+        index_writer = partial(write_block_index, filename)
+
+    if args.stats or cache:
+        STATS.enable(detailed=bool(args.stats))
+
+    if args.backend == "mpi":
+        from mpi_globals import RANK
+        from process import CollectiveWorker, Root, Worker
+
+    if args.backend == "mpi" and args.writer == "mpiio":
+        collective = CollectiveWorker(filename, outfile, chunk_size, processor, total_chunks, b"" if args.raw else pack_header(chunk_size, token_format, header_id), chunk_sizes)
+
+        if not args.raw:
+            collective.when_finished(index_writer)
+
+        timer = Timer(lambda: collective.run())
+        elapsed = timer.timeit(1)
+
+        if RANK == 0:
+            print(elapsed)
+
+            if cache:
+                cache.trim()
+                print(cache_report(collective.rank_stats))
+
+            if args.stats:
+                write_stats(args.stats, collective.rank_stats)
+    elif args.backend == "mpi" and RANK != 0:
+        worker = Worker(filename, processor)
+        worker.run()
+    else:
+        if args.backend == "mpi":
+            root_process = Root(filename, outfile, chunk_size, total_chunks, args.depth, args.max_buffer, args.adaptive, chunk_sizes=chunk_sizes)
+        else:
+            root_process = LocalPool(filename, outfile, chunk_size, processor, args.workers, total_chunks, chunk_sizes)
+
+        if not args.raw:
+            with open(outfile, "ab") as out:
+                write_header(out, chunk_size, token_format, header_id)
+
+            root_process.when_finished(index_writer)
 
-    if RANK == 0:
-        root_process = Root(filename, outfile, chunk_size)
         timer = Timer(lambda: root_process.run())
         print(timer.timeit(1))
-    else:
-        worker = Worker(filename, outfile, chunk_processor(chunk_size))
-        worker.run()
\ No newline at end of file
+        rank_stats = root_process.rank_stats if args.backend == "mpi" else [STATS.snapshot()]
+
+        if cache:
+            cache.trim()
+            print(cache_report(rank_stats))
+
+        if args.stats:
+            write_stats(args.stats, rank_stats)
\ No newline at end of file
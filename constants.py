@@ -6,4 +6,15 @@ LENGTH_THRESHOLD = 2
 MAX_REF_LENGTH = 2**LENGTH_BITS - 1
 CHUNK_SIZE = 65536
 OFFSET_MASK = WINDOW_SIZE
-LENGTH_MASK = MAX_REF_LENGTH << OFFSET_BITS
\ No newline at end of file
+LENGTH_MASK = MAX_REF_LENGTH << OFFSET_BITS
+HASH_BITS = 15
+MAX_CHAIN_DEPTH = 64
+QUEUE_DEPTH = 2
+MAX_BUFFER_SIZE = 2**28
+TARGET_CHUNK_TIME = 0.2
+MIN_CHUNK_SIZE = 2**12
+MAX_CHUNK_SIZE = 2**22
+MIN_WINDOW_BITS = 8
+MAX_WINDOW_BITS = 20
+MIN_LENGTH_BITS = 2
+MAX_POINTER_BITS = 32
\ No newline at end of file
@@ -0,0 +1,199 @@
+import struct
+
+from dataclasses import dataclass, field
+from typing import BinaryIO
+from reference import CODECS, DEFAULT_FORMAT, TokenFormat
+
+MAGIC = b"LZ7C"
+VERSION = 6
+HEADER = struct.Struct(">4sBIBBBI")
+INDEX_ENTRY = struct.Struct(">QIQII")
+MEMBER_ENTRY = struct.Struct(">IIH")
+TRAILER = struct.Struct(">QI4s")
+
+@dataclass
+class Block:
+    """Bloque independiente dentro de un archivo comprimido. Se puede descomprimir sin conocer los bloques anteriores.
+    El índice guarda el CRC32 del bloque descomprimido.
+    """
+    compressed_offset: int
+    compressed_size: int
+    uncompressed_offset: int
+    uncompressed_size: int
+    checksum: int
+
+@dataclass
+class Member:
+    """Archivo original dentro de un archivo comprimido con varios archivos. Sus bloques son consecutivos en el índice."""
+    name: str
+    first_block: int
+    block_count: int
+
+@dataclass
+class Container:
+    """Contenido del encabezado y del índice de un archivo comprimido por bloques.
+    El encabezado guarda la geometría y el codificador de las referencias y el identificador del diccionario con el que se comprimieron los bloques,
+    o 0 si no se usó ninguno. El índice puede ir seguido del directorio de miembros. Si el archivo comprimido contiene un solo archivo, members está vacía.
+    """
+    version: int
+    block_size: int
+    blocks: list[Block]
+    token_format: TokenFormat = DEFAULT_FORMAT
+    members: list[Member] = field(default_factory=list)
+    dictionary_id: int = 0
+
+def pack_header(block_size: int, token_format: TokenFormat = DEFAULT_FORMAT, dictionary_id: int = 0) -> bytes:
+    """Serializa el encabezado del contenedor.
+
+    Args:
+        block_size (int): Tamaño sin comprimir de cada bloque.
+        token_format (TokenFormat): Geometría de las referencias de todos los bloques.
+        dictionary_id (int): Identificador del diccionario usado como ventana inicial de cada bloque, o 0 si no se usa ninguno.
+
+    Returns:
+        bytes: El encabezado en bytes.
+    """
+    return HEADER.pack(MAGIC, VERSION, block_size, token_format.offset_bits, token_format.length_bits, CODECS.index(token_format.codec), dictionary_id)
+
+def write_header(file: BinaryIO, block_size: int, token_format: TokenFormat = DEFAULT_FORMAT, dictionary_id: int = 0) -> None:
+    """Escribe el encabezado del contenedor al inicio del archivo comprimido.
+
+    Args:
+        file (BinaryIO): Archivo comprimido de salida.
+        block_size (int): Tamaño sin comprimir de cada bloque.
+        token_format (TokenFormat): Geometría de las referencias de todos los bloques.
+        dictionary_id (int): Identificador del diccionario usado como ventana inicial de cada bloque, o 0 si no se usa ninguno.
+    """
+    file.write(pack_header(block_size, token_format, dictionary_id))
+
+def build_index(sizes: list[tuple[int, int]], checksums: list[int]) -> list[Block]:
+    """Calcula la posición de cada bloque a partir de sus tamaños. Los bloques se ubican uno tras otro a continuación del encabezado.
+
+    Args:
+        sizes (list[tuple[int, int]]): Tamaño comprimido y sin comprimir de cada bloque, en orden.
+        checksums (list[int]): CRC32 de cada bloque sin comprimir, en orden.
+
+    Returns:
+        list[Block]: El índice de bloques.
+    """
+    blocks = []
+    compressed_offset = HEADER.size
+    uncompressed_offset = 0
+
+    for (compressed_size, uncompressed_size), checksum in zip(sizes, checksums):
+        blocks.append(Block(compressed_offset, compressed_size, uncompressed_offset, uncompressed_size, checksum))
+        compressed_offset += compressed_size
+        uncompressed_offset += uncompressed_size
+
+    return blocks
+
+def write_index(file: BinaryIO, blocks: list[Block], members: list[Member] | None = None) -> None:
+    """Escribe el índice de bloques, el directorio de miembros y el pie del contenedor al final del archivo comprimido.
+    La posición del índice se calcula a partir del último bloque, por lo que la salida no necesita admitir tell y puede ser una tubería.
+
+    Args:
+        file (BinaryIO): Archivo comprimido de salida, posicionado al final de los datos.
+        blocks (list[Block]): El índice de bloques.
+        members (list[Member] | None): El directorio de miembros. Se omite si el archivo comprimido contiene un solo archivo.
+    """
+    index_offset = blocks[-1].compressed_offset + blocks[-1].compressed_size if blocks else HEADER.size
+
+    for block in blocks:
+        file.write(INDEX_ENTRY.pack(block.compressed_offset, block.compressed_size, block.uncompressed_offset, block.uncompressed_size, block.checksum))
+
+    for member in members or []:
+        name = member.name.encode()
+        file.write(MEMBER_ENTRY.pack(member.first_block, member.block_count, len(name)))
+        file.write(name)
+
+    file.write(TRAILER.pack(index_offset, len(blocks), MAGIC))
+
+def read_container(file: BinaryIO) -> Container | None:
+    """Lee el encabezado y el índice de un archivo comprimido.
+
+    Args:
+        file (BinaryIO): Archivo comprimido.
+
+    Returns:
+        Container | None: El encabezado y el índice, o None si el archivo está en el formato original sin encabezado.
+
+    Raises:
+        ValueError: Si el archivo tiene encabezado pero su versión no es soportada o su índice está dañado.
+    """
+    file.seek(0)
+    header = file.read(HEADER.size)
+
+    if len(header) <= len(MAGIC) or header[:len(MAGIC)] != MAGIC:
+        file.seek(0)
+        return None
+
+    version = header[len(MAGIC)]
+
+    if version != VERSION:
+        raise ValueError(f"Versión de contenedor no soportada: {version}")
+
+    if len(header) < HEADER.size:
+        raise ValueError("El encabezado del archivo comprimido está dañado")
+
+    _, _, block_size, offset_bits, length_bits, codec, dictionary_id = HEADER.unpack(header)
+
+    if codec >= len(CODECS):
+        raise ValueError(f"Codificador no soportado: {codec}")
+
+    token_format = TokenFormat(offset_bits, length_bits, CODECS[codec])
+    file_size = file.seek(0, 2)
+
+    if file_size < HEADER.size + TRAILER.size:
+        raise ValueError("El archivo comprimido está dañado: termina antes del índice")
+
+    trailer_offset = file_size - TRAILER.size
+    file.seek(trailer_offset)
+    index_offset, block_count, magic = TRAILER.unpack(file.read(TRAILER.size))
+
+    if magic != MAGIC:
+        raise ValueError("El índice del archivo comprimido está dañado")
+
+    if index_offset < HEADER.size or index_offset + block_count * INDEX_ENTRY.size > trailer_offset:
+        raise ValueError("El índice del archivo comprimido está dañado")
+
+    file.seek(index_offset)
+    index = file.read(block_count * INDEX_ENTRY.size)
+    blocks = [Block(*fields) for fields in INDEX_ENTRY.iter_unpack(index)]
+
+    if any(block.compressed_offset < HEADER.size or block.compressed_offset + block.compressed_size > index_offset for block in blocks):
+        raise ValueError("El índice del archivo comprimido está dañado")
+
+    members = read_members(file.read(trailer_offset - index_offset - len(index)))
+
+    return Container(version, block_size, blocks, token_format, members, dictionary_id)
+
+def read_members(directory: bytes) -> list[Member]:
+    """Lee el directorio de miembros que sigue al índice de bloques.
+
+    Args:
+        directory (bytes): Los bytes entre el final del índice y el pie del contenedor.
+
+    Returns:
+        list[Member]: Los miembros, en orden.
+
+    Raises:
+        ValueError: Si el directorio está dañado.
+    """
+    members = []
+    position = 0
+
+    while position < len(directory):
+        if position + MEMBER_ENTRY.size > len(directory):
+            raise ValueError("El directorio de miembros del archivo comprimido está dañado")
+
+        first_block, block_count, name_length = MEMBER_ENTRY.unpack_from(directory, position)
+        position += MEMBER_ENTRY.size
+        name = directory[position:position + name_length]
+
+        if len(name) != name_length:
+            raise ValueError("El directorio de miembros del archivo comprimido está dañado")
+
+        members.append(Member(name.decode(), first_block, block_count))
+        position += name_length
+
+    return members
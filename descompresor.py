@@ -1,44 +1,435 @@
+import shutil
+import sys
+import zlib
+import huffman
+import numpy as np
+
+from archive import create_member_file, find_member, member_range, select_members
+from bisect import bisect_right
 from argparse import ArgumentParser
 from timeit import Timer
-from constants import CHUNK_SIZE, REF_BYTE_LENGTH, WINDOW_SIZE
-from reference import Reference
+from functools import partial
+from typing import BinaryIO, Iterable, Iterator
+from constants import CHUNK_SIZE, WINDOW_SIZE
+from container import Block, read_container
+from dictionary import check_dictionary, resolve_dictionary
+from matcher import MIN_MATCH
+from reference import DEFAULT_FORMAT, HUFFMAN, VARINT, TokenFormat
+from stats import STATS, write_stats
+
+def decode_tokens(chunk: bytes, token_format: TokenFormat = DEFAULT_FORMAT) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Decodifica de una sola vez todas las referencias contenidas en una parte del archivo comprimido.
+
+    Args:
+        chunk (bytes): La parte del archivo con las referencias serializadas.
+        token_format (TokenFormat): Geometría de las referencias.
+
+    Returns:
+        tuple[ndarray, ndarray, ndarray]: Arreglos con la distancia, la longitud y el siguiente byte de cada referencia.
+    """
+    ref_byte_length = token_format.ref_byte_length
+    tokens = np.frombuffer(chunk, dtype=np.uint8, count=len(chunk) - len(chunk) % ref_byte_length).reshape(-1, ref_byte_length)
+    packed = tokens[:, 0].astype(np.uint32)
+
+    for column in range(1, token_format.pointer_bytes):
+        packed = (packed << 8) | tokens[:, column]
+
+    return packed & token_format.offset_mask, packed >> token_format.offset_bits, tokens[:, -1]
+
+def read_varint(chunk: bytes, position: int) -> tuple[int, int]:
+    """Lee un entero escrito con la codificación de longitud variable de reference.write_varint.
 
-def process_chunk(chunk: bytes, window: bytearray) -> bytearray:
+    Args:
+        chunk (bytes): Buffer que contiene el número.
+        position (int): Posición del primer byte del número.
+
+    Returns:
+        tuple[int, int]: El número y la posición del byte siguiente.
+    """
+    value = 0
+    shift = 0
+
+    while True:
+        byte = chunk[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+
+        if byte < 0x80:
+            return value, position
+
+        shift += 7
+
+def decode_sequences(chunk: bytes, window: bytearray) -> bytearray:
+    """Descomprime una parte del archivo escrita con el codificador VARINT.
+    Cada secuencia de literales se copia de una sola vez y cada coincidencia con una sola copia dentro del buffer de salida.
+
+    Args:
+        chunk (bytes): La parte del archivo que se va a descomprimir.
+        window (bytearray): Buffer con los últimos bytes descomprimidos anteriormente.
+
+    Returns:
+        bytearray: La parte descomprimida en bytes.
+    """
+    output = window
+    data = memoryview(chunk)
+    size = len(chunk)
+    position = 0
+
+    while position < size:
+        control = chunk[position]
+        count = control >> 4
+        position += 1
+
+        if count == 15:
+            extra, position = read_varint(chunk, position)
+            count += extra
+
+        output += data[position: position + count]
+        position += count
+
+        if position >= size:
+            break
+
+        length = control & 15
+
+        if length == 15:
+            extra, position = read_varint(chunk, position)
+            length += extra
+
+        distance = chunk[position]
+        position += 1
+
+        if distance >= 0x80:
+            distance, position = read_varint(chunk, position - 1)
+
+        match_start = len(output) - distance
+        output += output[match_start: match_start + length + MIN_MATCH]
+
+    return output
+
+def process_chunk(chunk: bytes, window: bytearray, token_format: TokenFormat = DEFAULT_FORMAT) -> bytearray:
     """Descomprime una parte del archivo.
+    Las referencias se decodifican en bloque y las secuencias de literales (referencias de longitud 0) se copian de una sola vez.
+    Solo las referencias a secuencias anteriores se resuelven una por una.
 
     Args:
         chunk (bytes): La parte del archivo que se va a descomprimir.
-        window (bytes): Buffer con los últimos 1024 bytes descomprimidos anteriormente.
+        window (bytes): Buffer con los últimos bytes descomprimidos anteriormente, tantos como el tamaño de la ventana.
         Se necesitan para encontrar referencias a secuencias anteriores de bytes.
+        token_format (TokenFormat): Geometría y codificador de las referencias.
 
     Returns:
         bytearray: La parte descomprimida en bytes.
     """
+    if token_format.codec == VARINT:
+        return decode_sequences(chunk, window)
+
+    if token_format.codec == HUFFMAN:
+        if chunk[0] == huffman.SEQUENCE_BLOCK:
+            return decode_sequences(memoryview(chunk)[1:], window)
+
+        return huffman.decode(memoryview(chunk)[1:], window)
+
     output = window
-    
-    for i in range(0, len(chunk), REF_BYTE_LENGTH):
-        ref = Reference.from_bytes(chunk[i: i + REF_BYTE_LENGTH])
-        match_start = len(output) - ref.offset
-        output.extend(output[match_start: match_start + ref.length])
-        output.append(ref.next_byte)
+    offsets, lengths, next_bytes = decode_tokens(chunk, token_format)
+    matches = np.flatnonzero(lengths)
+    literals = memoryview(next_bytes.tobytes())
+    previous = 0
+
+    for i, offset, length in zip(matches.tolist(), offsets[matches].tolist(), lengths[matches].tolist()):
+        if i > previous:
+            output += literals[previous:i]
+
+        match_start = len(output) - offset
+        output += output[match_start: match_start + length]
+        output.append(literals[i])
+        previous = i + 1
+
+    output += literals[previous:]
 
     return output
 
-def decompress(filename: str, outfile: str):
+def process_detached_chunk(chunk: bytes, token_format: TokenFormat = DEFAULT_FORMAT) -> tuple[bytearray, list[tuple[int, int, int]]]:
+    """Descomprime una parte del archivo sin conocer los bytes descomprimidos anteriormente.
+    Las referencias que apuntan antes del inicio de la parte se copian desde una ventana provisional y se registran para resolverlas después.
+    También se registran las referencias cuyo origen se solapa con bytes copiados por una referencia pendiente.
+
+    Args:
+        chunk (bytes): La parte del archivo que se va a descomprimir.
+        token_format (TokenFormat): Geometría de las referencias.
+
+    Returns:
+        tuple[bytearray, list[tuple[int, int, int]]]: La parte descomprimida, precedida por una ventana provisional del tamaño de la ventana de referencia,
+        y la lista de referencias que no pudieron ser resueltas como tuplas (destino, origen, longitud).
+    """
+    window_size = token_format.window_size
+    output = bytearray(window_size)
+    offsets, lengths, next_bytes = decode_tokens(chunk, token_format)
+    matches = np.flatnonzero(lengths)
+    literals = memoryview(next_bytes.tobytes())
+    unresolved = []
+    pending_starts = [0]
+    pending_ends = [window_size]
+    frontier = window_size
+    previous = 0
+
+    for i, offset, length in zip(matches.tolist(), offsets[matches].tolist(), lengths[matches].tolist()):
+        if i > previous:
+            output += literals[previous:i]
+
+        match_start = len(output) - offset
+
+        if match_start < frontier:
+            overlap = bisect_right(pending_ends, match_start)
+
+            if overlap < len(pending_ends) and pending_starts[overlap] < match_start + length:
+                unresolved.append((len(output), match_start, length))
+                pending_starts.append(len(output))
+                pending_ends.append(len(output) + length)
+                frontier = len(output) + length
+
+        output += output[match_start: match_start + length]
+        output.append(literals[i])
+        previous = i + 1
+
+    output += literals[previous:]
+
+    return output, unresolved
+
+def resolve_chunk(output: bytearray, unresolved: list[tuple[int, int, int]], window: bytes, token_format: TokenFormat = DEFAULT_FORMAT) -> bytearray:
+    """Resuelve las referencias pendientes de una parte descomprimida con process_detached_chunk una vez se conoce la parte anterior.
+
+    Args:
+        output (bytearray): La parte descomprimida, precedida por la ventana provisional.
+        unresolved (list[tuple[int, int, int]]): Referencias que no pudieron ser resueltas como tuplas (destino, origen, longitud).
+        window (bytes): Los últimos bytes descomprimidos de la parte anterior.
+        token_format (TokenFormat): Geometría de las referencias.
+
+    Returns:
+        bytearray: La parte descomprimida sin la ventana provisional.
+    """
+    window_size = token_format.window_size
+
+    if unresolved:
+        window = window[-window_size:]
+        output[window_size - len(window): window_size] = window
+
+        for destination, source, length in unresolved:
+            output[destination: destination + length] = output[source: source + length]
+
+    return output[window_size:]
+
+def decode_block(chunk: bytes, token_format: TokenFormat = DEFAULT_FORMAT, dictionary: bytes = b"") -> bytearray:
+    """Descomprime un bloque independiente de un archivo con encabezado. Si se comprimió con un diccionario, sus últimos bytes son la ventana inicial.
+
+    Args:
+        chunk (bytes): El bloque comprimido.
+        token_format (TokenFormat): Geometría y codificador de las referencias.
+        dictionary (bytes): El diccionario con el que se comprimió, o bytes vacíos si no se usó ninguno.
+
+    Returns:
+        bytearray: El bloque descomprimido, sin el diccionario.
+    """
+    if not dictionary:
+        return process_chunk(chunk, bytearray(), token_format)
+
+    preset = dictionary[-token_format.window_size:]
+
+    return process_chunk(chunk, bytearray(preset), token_format)[len(preset):]
+
+def check_block(output: bytearray, block: Block, block_number: int) -> None:
+    """Comprueba que un bloque descomprimido tenga el tamaño y el CRC32 registrados en el índice.
+
+    Args:
+        output (bytearray): El bloque descomprimido.
+        block (Block): La entrada del bloque en el índice.
+        block_number (int): El número del bloque, para el mensaje de error.
+
+    Raises:
+        ValueError: Si el tamaño o el CRC32 no coinciden.
+    """
+    if len(output) != block.uncompressed_size:
+        raise ValueError(f"El bloque {block_number} está dañado: tiene {len(output)} bytes en lugar de {block.uncompressed_size}")
+
+    if zlib.crc32(output) != block.checksum:
+        raise ValueError(f"El bloque {block_number} está dañado: su CRC32 no coincide")
+
+def clip(output: bytearray, output_start: int, start: int, end: int | None) -> bytearray:
+    """Recorta una parte descomprimida para que solo contenga los bytes del rango solicitado.
+
+    Args:
+        output (bytearray): La parte descomprimida.
+        output_start (int): Posición de la parte dentro del archivo descomprimido.
+        start (int): Inicio del rango solicitado.
+        end (int | None): Fin del rango solicitado, o None si el rango llega hasta el final del archivo.
+
+    Returns:
+        bytearray: Los bytes de la parte que están dentro del rango.
+    """
+    output_end = output_start + len(output)
+
+    if start <= output_start and (end is None or end >= output_end):
+        return output
+
+    return output[max(start - output_start, 0): (output_end if end is None else min(end, output_end)) - output_start]
+
+def decompress_blocks(file: BinaryIO, start: int = 0, end: int | None = None, dictionary: bytes = b"") -> Iterator[bytearray]:
+    """Descomprime las partes de un archivo comprimido que cubren un rango del archivo descomprimido.
+    Si el archivo tiene encabezado solo se leen los bloques del índice que se solapan con el rango, y cada uno se descomprime de forma independiente
+    y se comprueba con check_block.
+    En caso contrario se lee el formato original desde el inicio, en el que cada parte depende de la anterior, hasta llegar al final del rango.
+
+    Args:
+        file (BinaryIO): Archivo comprimido.
+        start (int): Inicio del rango en el archivo descomprimido.
+        end (int | None): Fin del rango en el archivo descomprimido, o None para llegar hasta el final del archivo.
+        dictionary (bytes): El diccionario con el que se comprimió el archivo, o bytes vacíos si no se usó ninguno.
+
+    Returns:
+        Iterator[bytearray]: Los bytes del rango, por partes y en orden.
+
+    Raises:
+        ValueError: Si algún bloque está dañado o si el diccionario no es el que requiere el archivo.
+    """
+    container = read_container(file)
+
+    if container:
+        check_dictionary(container.dictionary_id, dictionary)
+        blocks = container.blocks
+        first = max(bisect_right([block.uncompressed_offset for block in blocks], start) - 1, 0)
+
+        for block_number, block in enumerate(blocks[first:], first):
+            if end is not None and block.uncompressed_offset >= end:
+                break
+
+            file.seek(block.compressed_offset)
+
+            with STATS.measure("chunk_compute"):
+                output = decode_block(file.read(block.compressed_size), container.token_format, dictionary)
+
+            check_block(output, block, block_number)
+            STATS.count("compressed_bytes", block.compressed_size)
+            STATS.count("output_bytes", len(output))
+            yield clip(output, block.uncompressed_offset, start, end)
+
+        return
+
+    if dictionary:
+        raise ValueError("El formato original sin encabezado no admite diccionarios")
+
+    position = 0
+
+    for decompressed in decode_stream(iter(partial(file.read, CHUNK_SIZE - 1), b"")):
+        if position + len(decompressed) > start:
+            yield clip(decompressed, position, start, end)
+
+        position += len(decompressed)
+
+        if end is not None and position >= end:
+            break
+
+def decode_stream(chunks: Iterable[bytes]) -> Iterator[bytearray]:
+    """Descomprime en orden las partes del formato original sin encabezado, en el que cada parte depende de la anterior.
+    La ventana es un único buffer que se recorta en su lugar a los últimos WINDOW_SIZE bytes después de cada parte,
+    por lo que la memoria usada no depende del tamaño del archivo y no se copia la ventana en cada parte.
+
+    Args:
+        chunks (Iterable[bytes]): Las partes comprimidas, en orden. Cada una debe contener un número entero de referencias.
+
+    Returns:
+        Iterator[bytearray]: Cada parte descomprimida, en orden.
+    """
+    window = bytearray()
+
+    for chunk in chunks:
+        window_length = len(window)
+
+        with STATS.measure("chunk_compute"):
+            window = process_chunk(chunk, window)
+
+        decompressed = window[window_length:]
+        del window[:-WINDOW_SIZE]
+        STATS.count("compressed_bytes", len(chunk))
+        STATS.count("output_bytes", len(decompressed))
+
+        yield decompressed
+
+def decompress(filename: str, outfile: str, dictionary: bytes = b""):
     """Descomprime un archivo comprimido usando el algoritmo LZ77.
 
     Args:
         filename (str): Nombre del archivo comprimido.
         outfile (str): Nombre del archivo descomprimido de salida.
+        dictionary (bytes): El diccionario con el que se comprimió el archivo, o bytes vacíos si no se usó ninguno.
     """
     with open(filename, "rb") as file, open(outfile, "wb") as out:
-        output = bytearray()
+        for output in decompress_blocks(file, dictionary=dictionary):
+            with STATS.measure("chunk_write"):
+                out.write(output)
+
+def decompress_range(zipfile: str, start: int, length: int, dictionary: bytes = b"") -> bytes:
+    """Descomprime únicamente un rango del archivo original. Solo se descomprimen los bloques que cubren el rango.
+
+    Args:
+        zipfile (str): Nombre del archivo comprimido.
+        start (int): Posición del primer byte del rango en el archivo descomprimido.
+        length (int): Número de bytes del rango.
+        dictionary (bytes): El diccionario con el que se comprimió el archivo, o bytes vacíos si no se usó ninguno.
+
+    Returns:
+        bytes: Los bytes del rango. Pueden ser menos de los solicitados si el rango pasa del final del archivo.
+
+    Raises:
+        ValueError: Si el inicio o la longitud son negativos.
+    """
+    if start < 0 or length < 0:
+        raise ValueError(f"El rango debe tener un inicio y una longitud no negativos: {start}, {length}")
+
+    with open(zipfile, "rb") as file:
+        return b"".join(decompress_blocks(file, start, start + length, dictionary))
+
+def decompress_member(zipfile: str, name: str, dictionary: bytes = b"") -> bytes:
+    """Descomprime únicamente uno de los archivos de un archivo comprimido con varios archivos. Solo se descomprimen sus bloques.
+
+    Args:
+        zipfile (str): Nombre del archivo comprimido.
+        name (str): Nombre del miembro.
+        dictionary (bytes): El diccionario con el que se comprimió el archivo, o bytes vacíos si no se usó ninguno.
+
+    Returns:
+        bytes: El contenido del miembro.
+
+    Raises:
+        KeyError: Si el archivo comprimido no tiene un miembro con ese nombre.
+    """
+    with open(zipfile, "rb") as file:
+        container = read_container(file)
+
+    start, length = member_range(container, find_member(container, name))
+
+    return decompress_range(zipfile, start, length, dictionary)
+
+def extract_members(zipfile: str, directory: str, names: list[str] | None = None, dictionary: bytes = b"") -> None:
+    """Extrae los archivos de un archivo comprimido con varios archivos en un directorio, uno tras otro.
 
-        while chunk := file.read(CHUNK_SIZE - 1):
-            window = output[-WINDOW_SIZE:]
-            window_length = len(window)
-            output = process_chunk(chunk, window)
-            out.write(output[window_length:])
+    Args:
+        zipfile (str): Nombre del archivo comprimido.
+        directory (str): Directorio de salida.
+        names (list[str] | None): Nombres de los miembros a extraer. Por defecto se extraen todos.
+        dictionary (bytes): El diccionario con el que se comprimió el archivo, o bytes vacíos si no se usó ninguno.
+
+    Raises:
+        KeyError: Si el archivo comprimido no tiene alguno de los miembros.
+    """
+    with open(zipfile, "rb") as file:
+        container = read_container(file)
+
+        for member in select_members(container, names):
+            start, length = member_range(container, member)
+
+            with open(create_member_file(container, member, directory), "r+b") as out:
+                for output in decompress_blocks(file, start, start + length, dictionary):
+                    out.write(output)
 
 if __name__ == "__main__":
     parser = ArgumentParser(
@@ -46,11 +437,72 @@ if __name__ == "__main__":
         description="Descomprime un archivo comprimido con el algoritmo LZ77"
     )
 
-    parser.add_argument("zipfile", help="Nombre del archivo a descomprimir")
-    parser.add_argument("-o", "--outfile", help="Nombre del archivo descomprimido", default="descomprimido-elmejorprofesor.txt")
+    parser.add_argument("zipfile", help="Nombre del archivo a descomprimir, o - para leer de la entrada estándar")
+    parser.add_argument("-o", "--outfile", help="Nombre del archivo descomprimido, - para escribir en la salida estándar, o el directorio de salida si el archivo comprimido tiene varios archivos. Por defecto es descomprimido-elmejorprofesor.txt o el directorio actual")
+    parser.add_argument("-m", "--member", help="Extrae solo el archivo especificado de un archivo comprimido con varios archivos. Se puede repetir", action="append")
+    parser.add_argument("-r", "--range", help="Descomprime solo el rango especificado del archivo original y lo escribe a la salida estándar", type=int, nargs=2, metavar=("INICIO", "LONGITUD"))
+    parser.add_argument("--stats", help="Registra contadores y tiempos de la descompresión y los escribe en JSON en el archivo especificado", metavar="ARCHIVO")
+    parser.add_argument("-D", "--dictionary", help="Diccionario, o directorio de diccionarios, entre los que se busca el que requiere el archivo comprimido. Se puede repetir", action="append")
 
     args = parser.parse_args()
     filename, outfile = args.zipfile, args.outfile
-    timer = Timer(lambda: decompress(filename, outfile))
 
-    print(timer.timeit(1))
\ No newline at end of file
+    if args.range and min(args.range) < 0:
+        parser.error("--range requiere un inicio y una longitud no negativos")
+
+    reader = None
+
+    if filename == "-" or outfile == "-":
+        from stream import LZ77Reader
+
+    try:
+        if filename == "-":
+            reader = LZ77Reader(sys.stdin.buffer, dictionaries=args.dictionary)
+            container = reader.container
+        else:
+            with open(filename, "rb") as file:
+                container = read_container(file)
+
+        dictionary = resolve_dictionary(args.dictionary, container.dictionary_id) if container else b""
+    except ValueError as error:
+        parser.error(str(error))
+
+    archive = container is not None and bool(container.members)
+
+    if args.member and not archive:
+        parser.error("--member solo aplica a archivos comprimidos con varios archivos")
+
+    if filename == "-" and (archive or args.range):
+        parser.error("los archivos comprimidos con varios archivos y --range requieren el nombre del archivo comprimido")
+
+    if args.stats:
+        STATS.enable()
+
+    if archive and not args.range:
+        try:
+            timer = Timer(lambda: extract_members(filename, outfile or ".", args.member, dictionary))
+            print(timer.timeit(1))
+        except KeyError as error:
+            parser.error(f"el archivo comprimido no contiene {error}")
+    elif reader or outfile == "-":
+        reader = reader or LZ77Reader(filename, dictionary)
+        destination = sys.stdout.buffer if outfile == "-" else open(outfile or "descomprimido-elmejorprofesor.txt", "wb")
+
+        with reader, destination:
+            timer = Timer(lambda: shutil.copyfileobj(reader, destination, CHUNK_SIZE))
+            elapsed = timer.timeit(1)
+
+        print(elapsed, file=sys.stderr if outfile == "-" else sys.stdout)
+    elif args.range:
+        start, length = args.range
+
+        with open(filename, "rb") as file:
+            for output in decompress_blocks(file, start, start + length, dictionary):
+                sys.stdout.buffer.write(output)
+    else:
+        timer = Timer(lambda: decompress(filename, outfile or "descomprimido-elmejorprofesor.txt", dictionary))
+
+        print(timer.timeit(1))
+
+    if args.stats:
+        write_stats(args.stats, [STATS.snapshot()])
\ No newline at end of file
@@ -1,16 +1,70 @@
 import os
 
 from argparse import ArgumentParser
+from functools import cache, partial
 from timeit import Timer
 from typing import Callable
-from constants import REF_BYTE_LENGTH, WINDOW_SIZE, CHUNK_SIZE
-from mpi_globals import RANK
-from process import Root, Worker
-from descompresor import process_chunk
-from mpi4py import MPI
-from mpi_globals import CHANNEL
-
-def chunk_processor(chunk_size: int, shared_memory: MPI.memory) -> Callable[[str, int], bytearray | bytes]:
+from archive import create_member_file, member_path, member_range, select_members
+from constants import MAX_BUFFER_SIZE, QUEUE_DEPTH, REF_BYTE_LENGTH, WINDOW_SIZE, CHUNK_SIZE
+from descompresor import check_block, decode_block, process_detached_chunk, resolve_chunk
+from container import Container, Member, read_container
+from dictionary import check_dictionary, resolve_dictionary
+from pool import LocalPool
+from stats import STATS, write_stats
+
+DetachedChunk = tuple[bytearray, list[tuple[int, int, int]]]
+
+def decompress_chunk(chunk_size: int, filename: str, chunk_number: int, start: int | None = None, size: int | None = None) -> DetachedChunk:
+    """Lee y descomprime parcialmente una parte de un archivo comprimido con el algoritmo LZ77.
+    No espera a que la parte anterior sea descomprimida.
+        
+    Args:
+        chunk_size (int): Tamaño de cada parte del archivo.
+        filename (str): Nombre del archivo comprimido.
+        chunk_number (int): El número de la parte a descomprimir.
+        start (int | None): Posición de la parte en el archivo. Por defecto se calcula a partir de chunk_number y chunk_size.
+        size (int | None): Tamaño de la parte, múltiplo de REF_BYTE_LENGTH. Por defecto es chunk_size.
+    """
+    chunk_start = chunk_number * chunk_size if start is None else start
+
+    with open(filename, "rb") as file:
+        file.seek(chunk_start)
+        chunk = file.read(chunk_size if size is None else size)
+        STATS.count("compressed_bytes", len(chunk))
+
+        return process_detached_chunk(chunk)
+
+def resolve_references(outfile: str, chunk_number: int, detached: DetachedChunk) -> bytearray:
+    """Resuelve las referencias pendientes de una parte leyendo los últimos bytes ya escritos en el archivo de salida.
+    Se ejecuta cuando todas las partes anteriores ya han sido escritas.
+
+    Args:
+        outfile (str): Nombre del archivo descomprimido de salida.
+        chunk_number (int): El número de la parte descomprimida.
+        detached (tuple[bytearray, list[tuple[int, int, int]]]): La parte parcialmente descomprimida y sus referencias pendientes.
+    """
+    output, unresolved = detached
+    window = b""
+
+    if unresolved:
+        with open(outfile, "rb") as out:
+            out.seek(max(os.fstat(out.fileno()).st_size - WINDOW_SIZE, 0))
+            window = out.read()
+
+    return resolve_chunk(output, unresolved, window)
+
+def resolve_with_window(detached: DetachedChunk, window: bytes) -> bytearray:
+    """Resuelve las referencias pendientes de una parte a partir de los últimos bytes de la parte anterior, recibidos de otro proceso.
+
+    Args:
+        detached (tuple[bytearray, list[tuple[int, int, int]]]): La parte parcialmente descomprimida y sus referencias pendientes.
+        window (bytes): Los últimos bytes descomprimidos de la parte anterior.
+    """
+    output, unresolved = detached
+
+    return resolve_chunk(output, unresolved, window)
+
+def chunk_processor(chunk_size: int) -> tuple[Callable[[str, int], DetachedChunk], Callable[[str, int, DetachedChunk], bytearray]]:
     """Funciones que permiten descomprimir un archivo comprimido con el algoritmo LZ77.
     La primera descomprime parcialmente una parte del archivo. Retorna a la parte descomprimida como un buffer de bytes y la lista de referencias que no pudieron ser resueltas.
     La segunda se ejecuta justo antes de escribir al archivo de salida y lee la anterior parte descomprimida para resolver referencias.
@@ -18,32 +72,101 @@ def chunk_processor(chunk_size: int, shared_memory: MPI.memory) -> Callable[[str
     Args:
         chunk_size (int): Tamaño de cada parte del archivo.
     """
-    def decompress_chunk(filename: str, chunk_number: int) -> bytearray | bytes:
-        """Lee y descomprime parcialmente una parte de un archivo comprimido con el algoritmo LZ77.
-            
-        Args:
-            filename (str): Nombre del archivo comprimido.
-            chunk_number (int): El número de la parte a descomprimir.
-        """
-        chunk_start = chunk_number * chunk_size
+    return partial(decompress_chunk, chunk_size), resolve_references
+
+@cache
+def load_container(filename: str) -> Container:
+    """Lee el encabezado y el índice de bloques de un archivo comprimido una sola vez por proceso.
+
+    Args:
+        filename (str): Nombre del archivo comprimido.
+    """
+    with open(filename, "rb") as file:
+        return read_container(file)
+
+def decompress_block(filename: str, block_number: int, dictionary: bytes = b"") -> bytearray:
+    """Lee y descomprime un bloque de un archivo comprimido con encabezado. No depende de ningún otro bloque.
+
+    Args:
+        filename (str): Nombre del archivo comprimido.
+        block_number (int): El número del bloque a descomprimir.
+        dictionary (bytes): El diccionario con el que se comprimió el archivo, o bytes vacíos si no se usó ninguno.
+
+    Raises:
+        ValueError: Si el diccionario no es el que requiere el archivo o si el bloque descomprimido no tiene el tamaño o el CRC32 registrados en el índice.
+    """
+    container = load_container(filename)
+    check_dictionary(container.dictionary_id, dictionary)
+    block = container.blocks[block_number]
 
-        with open(filename, "rb") as file:
-            file.seek(chunk_start)
-            chunk = file.read(chunk_size)
-            window = bytearray()
+    with open(filename, "rb") as file:
+        file.seek(block.compressed_offset)
+        STATS.count("compressed_bytes", block.compressed_size)
+        output = decode_block(file.read(block.compressed_size), container.token_format, dictionary)
+        check_block(output, block, block_number)
 
-            if chunk_number > 0:
-                Worker.wait(chunk_number)
-                window = bytearray(shared_memory)
+        return output
 
-            window_length = len(window)
-            output = process_chunk(chunk, window)
-            shared_memory[:] = output[-WINDOW_SIZE:]
-            Worker.notify_holder(chunk_number + 1)
+@cache
+def archive_blocks(filename: str, names: tuple[str, ...] | None = None) -> list[tuple[int, Member, int]]:
+    """Lista, una sola vez por proceso, los bloques de los miembros a extraer de un archivo comprimido con varios archivos.
+
+    Args:
+        filename (str): Nombre del archivo comprimido.
+        names (tuple[str, ...] | None): Nombres de los miembros a extraer. Por defecto se extraen todos.
+
+    Returns:
+        list[tuple[int, Member, int]]: Número del bloque, miembro al que pertenece y posición del bloque dentro del miembro.
+    """
+    container = load_container(filename)
+    blocks = []
 
-            return output[window_length:]
+    for member in select_members(container, names):
+        start, _ = member_range(container, member)
+        blocks.extend(
+            (block_number, member, container.blocks[block_number].uncompressed_offset - start)
+            for block_number in range(member.first_block, member.first_block + member.block_count)
+        )
 
-    return decompress_chunk
+    return blocks
+
+def extract_block(directory: str, names: tuple[str, ...] | None, filename: str, chunk_number: int, dictionary: bytes = b"") -> bytes:
+    """Descomprime un bloque de un miembro y lo escribe directamente en su posición dentro del archivo del miembro, que ya debe existir.
+    Los bloques no dependen de ningún otro, por lo que se pueden escribir en cualquier orden desde cualquier proceso.
+
+    Args:
+        directory (str): Directorio de salida.
+        names (tuple[str, ...] | None): Nombres de los miembros a extraer. Por defecto se extraen todos.
+        filename (str): Nombre del archivo comprimido.
+        chunk_number (int): Posición del bloque en la lista de archive_blocks.
+        dictionary (bytes): El diccionario con el que se comprimió el archivo, o bytes vacíos si no se usó ninguno.
+
+    Returns:
+        bytes: Nada, para que el proceso raíz no escriba nada en su archivo de salida.
+    """
+    block_number, member, offset = archive_blocks(filename, names)[chunk_number]
+    output = decompress_block(filename, block_number, dictionary)
+    descriptor = os.open(member_path(directory, member.name), os.O_WRONLY)
+
+    try:
+        os.pwrite(descriptor, output, offset)
+    finally:
+        os.close(descriptor)
+
+    return b""
+
+def create_member_files(filename: str, names: tuple[str, ...] | None, directory: str) -> None:
+    """Crea los archivos de los miembros a extraer con su tamaño final, antes de repartir sus bloques.
+
+    Args:
+        filename (str): Nombre del archivo comprimido.
+        names (tuple[str, ...] | None): Nombres de los miembros a extraer. Por defecto se extraen todos.
+        directory (str): Directorio de salida.
+    """
+    container = load_container(filename)
+
+    for member in select_members(container, names):
+        create_member_file(container, member, directory)
 
 if __name__ == "__main__":
     parser = ArgumentParser(
@@ -52,22 +175,91 @@ if __name__ == "__main__":
     )
     
     parser.add_argument("zipfile", help="Nombre del archivo a descomprimir")
-    parser.add_argument("-o", "--outfile", help="Nombre del archivo descomprimido", default="descomprimidop-elmejorprofesor.txt")
+    parser.add_argument("-o", "--outfile", help="Nombre del archivo descomprimido, o el directorio de salida si el archivo comprimido tiene varios archivos. Por defecto es descomprimidop-elmejorprofesor.txt o el directorio actual")
+    parser.add_argument("-m", "--member", help="Extrae solo el archivo especificado de un archivo comprimido con varios archivos. Se puede repetir", action="append")
     parser.add_argument("-c", "--chunk-size", help="Tamaño de las partes en las cuales se dividirá el archivo de entrada", type=int, default=CHUNK_SIZE) 
+    parser.add_argument("-b", "--backend", help="Entorno de paralelismo: MPI o un pool de procesos locales", choices=["mpi", "local"], default="mpi")
+    parser.add_argument("-w", "--workers", help="Número de procesos del pool local. Por defecto es el número de núcleos", type=int)
+    parser.add_argument("-d", "--depth", help="Número máximo de partes asignadas a la vez a cada Worker de MPI", type=int, default=QUEUE_DEPTH)
+    parser.add_argument("--max-buffer", help="Número máximo de bytes que el proceso raíz guarda a la espera de ser escritos", type=int, default=MAX_BUFFER_SIZE)
+    parser.add_argument("-a", "--adaptive", help="Ajusta el tamaño de las partes según el tiempo medido de las anteriores. Solo aplica al formato original sin índice de bloques con MPI y el escritor root", action="store_true")
+    parser.add_argument("--writer", help="Forma de escribir la salida con MPI: en orden desde el proceso raíz o en paralelo desde todos los procesos con MPI-IO", choices=["root", "mpiio"], default="root")
+    parser.add_argument("--stats", help="Registra contadores y tiempos de todos los procesos y escribe su total en JSON en el archivo especificado", metavar="ARCHIVO")
+    parser.add_argument("-D", "--dictionary", help="Diccionario, o directorio de diccionarios, entre los que se busca el que requiere el archivo comprimido. Se puede repetir", action="append")
 
     args = parser.parse_args()
     zipfile, outfile, chunk_size = args.zipfile, args.outfile, args.chunk_size
     chunk_size = chunk_size + REF_BYTE_LENGTH - chunk_size % REF_BYTE_LENGTH
 
-    window = MPI.Win.Allocate_shared(WINDOW_SIZE, 1, comm=CHANNEL) 
-    memory, itemsize = window.Shared_query(0) 
-    assert itemsize == 1 
+    try:
+        with open(zipfile, "rb") as file:
+            container = read_container(file)
+
+        dictionary = resolve_dictionary(args.dictionary, container.dictionary_id) if container else b""
+    except ValueError as error:
+        parser.error(str(error))
+
+    if args.adaptive and (container or args.backend != "mpi" or args.writer != "root"):
+        parser.error("--adaptive solo aplica al formato original sin índice de bloques con MPI y el escritor root")
+
+    total_chunks = len(container.blocks) if container else None
+    processor, done_callback = (partial(decompress_block, dictionary=dictionary), None) if container else chunk_processor(chunk_size)
+    archive = container is not None and bool(container.members)
+
+    if args.member and not archive:
+        parser.error("--member solo aplica a archivos comprimidos con varios archivos")
+
+    if archive:
+        names = tuple(args.member) if args.member else None
+
+        try:
+            total_chunks = len(archive_blocks(zipfile, names))
+        except KeyError as error:
+            parser.error(f"el archivo comprimido no contiene {error}")
+
+        processor = partial(extract_block, outfile or ".", names, dictionary=dictionary)
+        outfile = os.devnull
+    else:
+        outfile = outfile or "descomprimidop-elmejorprofesor.txt"
+
+    if args.stats:
+        STATS.enable()
+
+    if args.backend == "mpi":
+        from mpi_globals import RANK
+        from process import CollectiveWorker, Root, Worker
+
+    if archive and (args.backend == "local" or RANK == 0):
+        create_member_files(zipfile, names, args.outfile or ".")
+
+    if args.backend == "mpi" and args.writer == "mpiio":
+        collective = CollectiveWorker(zipfile, outfile, chunk_size, processor, total_chunks)
+
+        if done_callback:
+            collective.when_resolving(resolve_with_window)
+
+        timer = Timer(lambda: collective.run())
+        elapsed = timer.timeit(1)
+
+        if RANK == 0:
+            print(elapsed)
+
+            if args.stats:
+                write_stats(args.stats, collective.rank_stats)
+    elif args.backend == "mpi" and RANK != 0:
+        worker = Worker(zipfile, processor)
+        worker.run()
+    else:
+        if args.backend == "mpi":
+            root_process = Root(zipfile, outfile, chunk_size, total_chunks, args.depth, args.max_buffer, args.adaptive, REF_BYTE_LENGTH)
+        else:
+            root_process = LocalPool(zipfile, outfile, chunk_size, processor, args.workers, total_chunks)
+
+        if done_callback:
+            root_process.when_done(done_callback)
 
-    if RANK == 0:
-        root_process = Root(zipfile, outfile, chunk_size)
         timer = Timer(lambda: root_process.run())
         print(timer.timeit(1))
-    else:
-        dec_chunk = chunk_processor(chunk_size, memory)
-        worker = Worker(zipfile, outfile, dec_chunk)
-        worker.run()
\ No newline at end of file
+
+        if args.stats:
+            write_stats(args.stats, root_process.rank_stats if args.backend == "mpi" else [STATS.snapshot()])
@@ -0,0 +1,166 @@
+import os
+import zlib
+
+from argparse import ArgumentParser
+from collections import Counter
+from constants import OFFSET_BITS
+from reference import TokenFormat
+
+DMER_SIZE = 8
+SEGMENT_SIZE = 64
+MIN_FREQUENCY = 2
+
+def dictionary_id(dictionary: bytes) -> int:
+    """Calcula el identificador de un diccionario, que se guarda en el encabezado de los archivos comprimidos con él.
+    Es su CRC32, salvo que ese valor sea 0, que indica que no se usó ningún diccionario.
+
+    Args:
+        dictionary (bytes): El contenido del diccionario.
+    """
+    return zlib.crc32(dictionary) or 1
+
+def train_dictionary(samples: list[bytes], size: int, segment_size: int = SEGMENT_SIZE, dmer_size: int = DMER_SIZE) -> bytes:
+    """Construye un diccionario a partir de muestras representativas de los datos a comprimir.
+    Cada secuencia de dmer_size bytes vale tanto como el número de muestras en las que aparece. Los candidatos son segmentos de segment_size bytes
+    de las muestras, repartidos en tantas épocas como segmentos caben en el diccionario, y de cada época se elige el segmento cuyas secuencias
+    aún no cubiertas valen más. Las secuencias del segmento elegido dejan de valer, de modo que el diccionario no repite contenido.
+    Los segmentos más valiosos quedan al final, a menor distancia de los datos.
+
+    Args:
+        samples (list[bytes]): Las muestras.
+        size (int): Tamaño máximo del diccionario. Normalmente es el tamaño de la ventana.
+        segment_size (int): Tamaño de cada segmento.
+        dmer_size (int): Tamaño de las secuencias con las que se evalúan los segmentos.
+
+    Returns:
+        bytes: El diccionario. Puede ser más pequeño que size si las muestras no tienen suficiente contenido repetido.
+    """
+    frequencies = Counter()
+
+    for sample in samples:
+        frequencies.update({sample[i:i + dmer_size] for i in range(len(sample) - dmer_size + 1)})
+
+    candidates = [
+        sample[start:start + segment_size]
+        for sample in samples
+        for start in range(0, max(len(sample) - segment_size, 0) + 1, segment_size // 2)
+    ]
+    epochs = max(size // segment_size, 1)
+    epoch_size = max(len(candidates) // epochs, 1)
+    selected = []
+    total = 0
+
+    for epoch in range(0, len(candidates), epoch_size):
+        best_score, best_segment = 0, b""
+
+        for segment in candidates[epoch:epoch + epoch_size]:
+            dmers = {segment[i:i + dmer_size] for i in range(len(segment) - dmer_size + 1)}
+            score = sum(frequencies[dmer] for dmer in dmers if frequencies[dmer] >= MIN_FREQUENCY)
+
+            if score > best_score:
+                best_score, best_segment = score, segment
+
+        if best_score and total + len(best_segment) <= size:
+            selected.append((best_score, best_segment))
+            total += len(best_segment)
+
+            for i in range(len(best_segment) - dmer_size + 1):
+                frequencies[best_segment[i:i + dmer_size]] = 0
+
+    selected.sort(key=lambda item: item[0])
+
+    return b"".join(segment for _, segment in selected)
+
+def load_dictionary(filename: str) -> bytes:
+    """Lee un diccionario. Cualquier archivo sirve como diccionario: su contenido se usa tal cual.
+
+    Args:
+        filename (str): El archivo del diccionario.
+    """
+    with open(filename, "rb") as file:
+        return file.read()
+
+def find_dictionary(paths: list[str], wanted_id: int) -> bytes:
+    """Busca el diccionario con el identificador especificado entre archivos y directorios de diccionarios.
+
+    Args:
+        paths (list[str]): Archivos de diccionarios y directorios que los contienen.
+        wanted_id (int): El identificador guardado en el encabezado del archivo comprimido.
+
+    Returns:
+        bytes: El diccionario.
+
+    Raises:
+        ValueError: Si ninguno de los diccionarios tiene ese identificador.
+    """
+    for path in paths:
+        filenames = [os.path.join(path, name) for name in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+
+        for filename in filenames:
+            if os.path.isfile(filename) and dictionary_id(dictionary := load_dictionary(filename)) == wanted_id:
+                return dictionary
+
+    raise ValueError(f"El archivo comprimido requiere el diccionario {wanted_id:08x}, que no se encontró")
+
+def check_dictionary(wanted_id: int, dictionary: bytes) -> None:
+    """Comprueba que un diccionario sea el que necesita un archivo comprimido.
+
+    Args:
+        wanted_id (int): El identificador guardado en el encabezado del archivo comprimido, o 0 si no usa diccionario.
+        dictionary (bytes): El diccionario, o bytes vacíos si no se especificó ninguno.
+
+    Raises:
+        ValueError: Si el diccionario no corresponde al identificador.
+    """
+    if wanted_id != (dictionary_id(dictionary) if dictionary else 0):
+        raise ValueError(f"El archivo comprimido requiere el diccionario {wanted_id:08x}" if wanted_id else "El archivo comprimido no usa diccionario")
+
+def resolve_dictionary(paths: list[str] | None, wanted_id: int) -> bytes:
+    """Obtiene el diccionario que necesita un archivo comprimido.
+
+    Args:
+        paths (list[str] | None): Archivos de diccionarios y directorios que los contienen.
+        wanted_id (int): El identificador guardado en el encabezado del archivo comprimido, o 0 si no usa diccionario.
+
+    Returns:
+        bytes: El diccionario, o bytes vacíos si el archivo comprimido no usa diccionario.
+
+    Raises:
+        ValueError: Si el archivo comprimido usa un diccionario que no se encontró.
+    """
+    if not wanted_id:
+        return b""
+
+    return find_dictionary(paths or [], wanted_id)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="Entrenador de diccionarios LZ77",
+        description="Construye un diccionario a partir de archivos de muestra. Se usa como ventana inicial para comprimir mejor datos pequeños"
+    )
+
+    parser.add_argument("samples", help="Archivos de muestra, o directorios que los contienen", nargs="+")
+    parser.add_argument("-o", "--outfile", help="Nombre del archivo del diccionario", default="diccionario.lz77")
+    parser.add_argument("--window-bits", help="Número de bits de la distancia de las referencias con las que se va a usar. El diccionario tiene a lo sumo el tamaño de la ventana", type=int, default=OFFSET_BITS)
+    parser.add_argument("-s", "--size", help="Tamaño máximo del diccionario. Por defecto es el tamaño de la ventana", type=int)
+
+    args = parser.parse_args()
+
+    try:
+        window_size = TokenFormat(args.window_bits).window_size
+    except ValueError as error:
+        parser.error(str(error))
+
+    samples = []
+
+    for path in args.samples:
+        for filename in (sorted(os.path.join(directory, name) for directory, _, names in os.walk(path) for name in names) if os.path.isdir(path) else [path]):
+            with open(filename, "rb") as file:
+                samples.append(file.read())
+
+    dictionary = train_dictionary(samples, min(args.size or window_size, window_size))
+
+    with open(args.outfile, "wb") as file:
+        file.write(dictionary)
+
+    print(f"{dictionary_id(dictionary):08x} {len(dictionary)}")
@@ -0,0 +1,387 @@
+import heapq
+import struct
+
+from matcher import MIN_MATCH
+
+MAX_CODE_LENGTH = 12
+TABLE_SIZE = 2**MAX_CODE_LENGTH
+TABLE_MASK = TABLE_SIZE - 1
+END_OF_BLOCK = 256
+LENGTH_SYMBOLS = 257
+BUCKETS = 64
+TOO_FAR = 4096
+CODED_BLOCK = 0
+SEQUENCE_BLOCK = 1
+TABLE_HEADER = struct.Struct(">HB")
+BASES = [code if code < 4 else (2 | (code & 1)) << ((code >> 1) - 1) for code in range(BUCKETS)]
+EXTRA_BITS = [0 if code < 4 else (code >> 1) - 1 for code in range(BUCKETS)]
+
+def bucket(value: int) -> int:
+    """Calcula el código de un número no negativo. Los números se agrupan en dos códigos por cada potencia de dos,
+    y el resto del valor se escribe con EXTRA_BITS[código] bits adicionales a partir de BASES[código].
+
+    Args:
+        value (int): El número.
+
+    Returns:
+        int: El código del número.
+    """
+    if value < 4:
+        return value
+
+    bits = value.bit_length() - 1
+
+    return 2 * bits + ((value >> (bits - 1)) & 1)
+
+def accepts(length: int, distance: int) -> bool:
+    """Indica si vale la pena usar una coincidencia con el codificador HUFFMAN.
+    Como en zlib, las coincidencias de MIN_MATCH bytes solo se usan si están a menos de TOO_FAR bytes, porque su distancia ocuparía más que los literales.
+
+    Args:
+        length (int): Longitud de la coincidencia.
+        distance (int): Distancia de la coincidencia.
+
+    Returns:
+        bool: Verdadero si vale la pena usar la coincidencia.
+    """
+    return length > MIN_MATCH or distance <= TOO_FAR
+
+def code_lengths(frequencies: list[int]) -> list[int]:
+    """Calcula la longitud del código de Huffman de cada símbolo, limitada a MAX_CODE_LENGTH bits.
+    Si algún código queda más largo se acorta y se alargan los códigos más cortos hasta que las longitudes vuelven a formar un código completo.
+
+    Args:
+        frequencies (list[int]): Número de apariciones de cada símbolo.
+
+    Returns:
+        list[int]: La longitud del código de cada símbolo, o 0 si el símbolo no aparece.
+    """
+    lengths = [0] * len(frequencies)
+    symbols = [symbol for symbol, frequency in enumerate(frequencies) if frequency]
+
+    if len(symbols) == 1:
+        lengths[symbols[0]] = 1
+
+    if len(symbols) <= 1:
+        return lengths
+
+    heap = [(frequencies[symbol], symbol, [symbol]) for symbol in symbols]
+    heapq.heapify(heap)
+    tiebreak = len(frequencies)
+
+    while len(heap) > 1:
+        first_frequency, _, first = heapq.heappop(heap)
+        second_frequency, _, second = heapq.heappop(heap)
+
+        for symbol in first + second:
+            lengths[symbol] += 1
+
+        heapq.heappush(heap, (first_frequency + second_frequency, tiebreak, first + second))
+        tiebreak += 1
+
+    counts = [0] * (max(lengths) + 1)
+
+    for symbol in symbols:
+        counts[lengths[symbol]] += 1
+
+    if len(counts) > MAX_CODE_LENGTH + 1:
+        counts[MAX_CODE_LENGTH] += sum(counts[MAX_CODE_LENGTH + 1:])
+        del counts[MAX_CODE_LENGTH + 1:]
+        total = sum(count << (MAX_CODE_LENGTH - length) for length, count in enumerate(counts))
+
+        while total > TABLE_SIZE:
+            counts[MAX_CODE_LENGTH] -= 1
+
+            for length in range(MAX_CODE_LENGTH - 1, 0, -1):
+                if counts[length]:
+                    counts[length] -= 1
+                    counts[length + 1] += 2
+                    break
+
+            total -= 1
+
+    symbols.sort(key=lambda symbol: (-frequencies[symbol], symbol))
+    position = 0
+
+    for length, count in enumerate(counts):
+        for symbol in symbols[position:position + count]:
+            lengths[symbol] = length
+
+        position += count
+
+    return lengths
+
+def canonical_codes(lengths: list[int]) -> list[int]:
+    """Asigna los códigos de Huffman canónicos a partir de sus longitudes.
+    Los bits de cada código se invierten, porque el flujo de bits se escribe y se lee empezando por los bits menos significativos.
+
+    Args:
+        lengths (list[int]): La longitud del código de cada símbolo.
+
+    Returns:
+        list[int]: El código invertido de cada símbolo.
+    """
+    codes = [0] * len(lengths)
+    code = 0
+    previous = 0
+
+    for symbol in sorted((symbol for symbol, length in enumerate(lengths) if length), key=lambda symbol: (lengths[symbol], symbol)):
+        length = lengths[symbol]
+        code <<= length - previous
+        previous = length
+        codes[symbol] = int(f"{code:0{length}b}"[::-1], 2)
+        code += 1
+
+    return codes
+
+def pack_lengths(literal_lengths: list[int], distance_lengths: list[int]) -> bytes:
+    """Serializa las tablas de un bloque: el número de longitudes de cada tabla seguido de las longitudes, dos por byte.
+    Se omiten los ceros al final de cada tabla.
+
+    Args:
+        literal_lengths (list[int]): Longitudes de los códigos de literales, fin de bloque y longitudes de coincidencia.
+        distance_lengths (list[int]): Longitudes de los códigos de distancias.
+
+    Returns:
+        bytes: Las tablas en bytes.
+    """
+    literal_count = max(symbol for symbol, length in enumerate(literal_lengths) if length) + 1
+    distance_count = max((symbol for symbol, length in enumerate(distance_lengths) if length), default=-1) + 1
+    lengths = literal_lengths[:literal_count] + distance_lengths[:distance_count]
+    lengths.append(0)
+
+    return TABLE_HEADER.pack(literal_count, distance_count) + bytes((lengths[i] << 4) | lengths[i + 1] for i in range(0, len(lengths) - 1, 2))
+
+def unpack_lengths(chunk: bytes) -> tuple[list[int], list[int], int]:
+    """Lee las tablas de un bloque escritas con pack_lengths.
+
+    Args:
+        chunk (bytes): El bloque comprimido.
+
+    Returns:
+        tuple[list[int], list[int], int]: Las longitudes de los códigos de literales y de distancias, y la posición donde empieza el flujo de bits.
+    """
+    literal_count, distance_count = TABLE_HEADER.unpack_from(chunk)
+    total = literal_count + distance_count
+    end = TABLE_HEADER.size + (total + 1) // 2
+    lengths = []
+
+    for byte in chunk[TABLE_HEADER.size:end]:
+        lengths.append(byte >> 4)
+        lengths.append(byte & 0x0F)
+
+    return lengths[:literal_count], lengths[literal_count:total], end
+
+def count_symbols(chunk: bytes | memoryview, sequences: list[tuple[int, int, int, int]]) -> tuple[list[int], list[int]]:
+    """Cuenta las apariciones de cada símbolo de los dos alfabetos en las secuencias de una parte del archivo.
+
+    Args:
+        chunk (bytes | memoryview): Buffer sobre el que se calcularon las secuencias.
+        sequences (list[tuple[int, int, int, int]]): Las secuencias calculadas con compresor.find_sequences.
+
+    Returns:
+        tuple[list[int], list[int]]: Las frecuencias de los símbolos del alfabeto de literales y del alfabeto de distancias.
+    """
+    import numpy as np
+
+    literals = bytearray()
+    literal_frequencies = [0] * (LENGTH_SYMBOLS + BUCKETS)
+    distance_frequencies = [0] * BUCKETS
+    literal_frequencies[END_OF_BLOCK] = 1
+
+    for literal_start, match_start, length, distance in sequences:
+        literals += chunk[literal_start:match_start]
+
+        if length:
+            literal_frequencies[LENGTH_SYMBOLS + bucket(length - MIN_MATCH)] += 1
+            distance_frequencies[bucket(distance - 1)] += 1
+
+    literal_frequencies[:256] = np.bincount(np.frombuffer(literals, dtype=np.uint8), minlength=256).tolist()
+
+    return literal_frequencies, distance_frequencies
+
+def encode(chunk: bytes | memoryview, sequences: list[tuple[int, int, int, int]]) -> bytearray:
+    """Comprime las secuencias de una parte del archivo con el codificador HUFFMAN.
+    Los literales, el fin de bloque y los códigos de las longitudes comparten un alfabeto, y los códigos de las distancias usan otro,
+    como en deflate. Cada bloque lleva sus propias tablas de Huffman canónicas, seguidas del flujo de bits.
+
+    Args:
+        chunk (bytes | memoryview): Buffer sobre el que se calcularon las secuencias.
+        sequences (list[tuple[int, int, int, int]]): Las secuencias calculadas con compresor.find_sequences.
+
+    Returns:
+        bytearray: La parte comprimida en bytes.
+    """
+    literal_frequencies, distance_frequencies = count_symbols(chunk, sequences)
+    literal_lengths = code_lengths(literal_frequencies)
+    distance_lengths = code_lengths(distance_frequencies)
+    literal_codes = canonical_codes(literal_lengths)
+    distance_codes = canonical_codes(distance_lengths)
+    output = bytearray(pack_lengths(literal_lengths, distance_lengths))
+    bits = 0
+    count = 0
+
+    for literal_start, match_start, length, distance in sequences:
+        for byte in chunk[literal_start:match_start]:
+            bits |= literal_codes[byte] << count
+            count += literal_lengths[byte]
+
+            if count >= 64:
+                output += (bits & 0xFFFFFFFFFFFFFFFF).to_bytes(8, "little")
+                bits >>= 64
+                count -= 64
+
+        if length:
+            value = length - MIN_MATCH
+            code = bucket(value)
+            symbol = LENGTH_SYMBOLS + code
+            bits |= (literal_codes[symbol] | (value - BASES[code]) << literal_lengths[symbol]) << count
+            count += literal_lengths[symbol] + EXTRA_BITS[code]
+            value = distance - 1
+            code = bucket(value)
+            bits |= (distance_codes[code] | (value - BASES[code]) << distance_lengths[code]) << count
+            count += distance_lengths[code] + EXTRA_BITS[code]
+
+            while count >= 64:
+                output += (bits & 0xFFFFFFFFFFFFFFFF).to_bytes(8, "little")
+                bits >>= 64
+                count -= 64
+
+    bits |= literal_codes[END_OF_BLOCK] << count
+    count += literal_lengths[END_OF_BLOCK]
+    output += bits.to_bytes((count + 7) // 8, "little")
+
+    return output
+
+def build_table(lengths: list[int]) -> list[tuple[int, int] | None]:
+    """Construye la tabla de decodificación de un código de Huffman canónico.
+    La tabla se indexa con los siguientes MAX_CODE_LENGTH bits del flujo, de modo que cada símbolo se decodifica con una sola consulta.
+
+    Args:
+        lengths (list[int]): La longitud del código de cada símbolo.
+
+    Returns:
+        list[tuple[int, int] | None]: Para cada combinación de bits, el símbolo y la longitud de su código, o None si no corresponde a ningún código.
+    """
+    table = [None] * TABLE_SIZE
+
+    for symbol, code in enumerate(canonical_codes(lengths)):
+        length = lengths[symbol]
+
+        if length:
+            table[code::1 << length] = [(symbol, length)] * (TABLE_SIZE >> length)
+
+    return table
+
+def build_literal_table(lengths: list[int]) -> list[tuple[bytes, int, int] | None]:
+    """Construye la tabla de decodificación del alfabeto de literales, que decodifica varios símbolos por consulta.
+    Cada entrada contiene todos los literales cuyos códigos caben completos en los MAX_CODE_LENGTH bits del índice,
+    seguidos opcionalmente del fin de bloque o del código de una longitud.
+
+    Args:
+        lengths (list[int]): La longitud del código de cada símbolo.
+
+    Returns:
+        list[tuple[bytes, int, int] | None]: Para cada combinación de bits, los literales decodificados, el número de bits que ocupan junto con
+        el símbolo final, y el símbolo final, o -1 si la entrada solo contiene literales. None si los bits no corresponden a ningún código.
+    """
+    single = build_table(lengths)
+    table = [None] * TABLE_SIZE
+
+    for index, entry in enumerate(single):
+        if entry is None:
+            continue
+
+        symbol, length = entry
+        literals = bytearray()
+        used = 0
+
+        while symbol < END_OF_BLOCK:
+            literals.append(symbol)
+            used += length
+            entry = single[index >> used]
+
+            if entry is None or entry[1] > MAX_CODE_LENGTH - used:
+                symbol = -1
+                break
+
+            symbol, length = entry
+        else:
+            used += length
+
+        table[index] = (bytes(literals), used, symbol)
+
+    return table
+
+def decode(chunk: bytes, window: bytearray) -> bytearray:
+    """Descomprime una parte del archivo escrita con el codificador HUFFMAN.
+    Los códigos se leen con tablas de consulta: cada consulta al alfabeto de literales puede decodificar varios literales a la vez.
+
+    Args:
+        chunk (bytes): La parte del archivo que se va a descomprimir.
+        window (bytearray): Buffer con los últimos bytes descomprimidos anteriormente.
+
+    Returns:
+        bytearray: La parte descomprimida en bytes.
+
+    Raises:
+        ValueError: Si el flujo de bits no corresponde a las tablas del bloque.
+    """
+    literal_lengths, distance_lengths, position = unpack_lengths(chunk)
+    literal_table = build_literal_table(literal_lengths)
+    distance_table = build_table(distance_lengths)
+    limit = len(chunk) + 16
+    output = window
+    bits = 0
+    count = 0
+
+    while True:
+        if count < 48:
+            if position > limit:
+                raise ValueError("El bloque comprimido con Huffman está dañado")
+
+            bits |= int.from_bytes(chunk[position:position + 16], "little") << count
+            position += 16
+            count += 128
+
+        entry = literal_table[bits & TABLE_MASK]
+
+        if entry is None:
+            raise ValueError("El bloque comprimido con Huffman está dañado")
+
+        literals, used, symbol = entry
+        bits >>= used
+        count -= used
+
+        if literals:
+            output += literals
+
+        if symbol < END_OF_BLOCK:
+            continue
+
+        if symbol == END_OF_BLOCK:
+            return output
+
+        code = symbol - LENGTH_SYMBOLS
+        extra = EXTRA_BITS[code]
+        length = MIN_MATCH + BASES[code] + (bits & ((1 << extra) - 1))
+        bits >>= extra
+        count -= extra
+
+        if count < 32:
+            bits |= int.from_bytes(chunk[position:position + 16], "little") << count
+            position += 16
+            count += 128
+
+        entry = distance_table[bits & TABLE_MASK]
+
+        if entry is None:
+            raise ValueError("El bloque comprimido con Huffman está dañado")
+
+        code, used = entry
+        extra = EXTRA_BITS[code]
+        distance = 1 + BASES[code] + ((bits >> used) & ((1 << extra) - 1))
+        bits >>= used + extra
+        count -= used + extra
+        match_start = len(output) - distance
+        output += output[match_start: match_start + length]
@@ -0,0 +1,295 @@
+import os
+import runpy
+import sys
+
+from argparse import ArgumentParser, Namespace
+from constants import CHUNK_SIZE, MAX_CHAIN_DEPTH
+from container import read_container
+from matcher import MATCHERS
+from reference import CODECS
+
+COMPRESS_THRESHOLD = 4 * CHUNK_SIZE
+DECOMPRESS_THRESHOLD = 2**22
+ZIPFILE = "comprimido.elmejorprofesor"
+OUTFILE = "descomprimido-elmejorprofesor.txt"
+MPI_VARIABLES = (
+    ("OMPI_COMM_WORLD_SIZE", "OMPI_COMM_WORLD_RANK"),
+    ("PMI_SIZE", "PMI_RANK"),
+    ("MV2_COMM_WORLD_SIZE", "MV2_COMM_WORLD_RANK")
+)
+COMPRESS_OPTIONS = (
+    ("outfile", "-o"), ("matcher", "-m"), ("max_chain", "--max-chain"), ("level", "-l"), ("raw", "--raw"), ("window_bits", "--window-bits"),
+    ("length_bits", "--length-bits"), ("codec", "--codec"), ("stats", "--stats"), ("dictionary", "-D")
+)
+DECOMPRESS_OPTIONS = (("outfile", "-o"), ("member", "-m"), ("stats", "--stats"), ("dictionary", "-D"))
+PARALLEL_OPTIONS = (("chunk_size", "-c"), ("adaptive", "-a"), ("writer", "--writer"))
+CACHE_OPTIONS = (("cache", "--cache"), ("cache_size", "--cache-size"))
+
+def mpi_environment() -> tuple[int, int]:
+    """Detecta si el programa se lanzó con mpiexec leyendo las variables de entorno que definen Open MPI, MPICH y MVAPICH, sin importar MPI.
+
+    Returns:
+        tuple[int, int]: El número de procesos lanzados y el rango de este proceso. Es (1, 0) si no se lanzó con mpiexec.
+    """
+    for size, rank in MPI_VARIABLES:
+        if size in os.environ:
+            return int(os.environ[size]), int(os.environ.get(rank, 0))
+
+    return 1, 0
+
+def available_cores() -> int:
+    """Número de núcleos que este proceso puede usar, que puede ser menor que el de la máquina si se restringió su afinidad."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+def input_size(paths: list[str]) -> int:
+    """Suma el tamaño de los archivos a comprimir, incluidos los de los directorios.
+
+    Args:
+        paths (list[str]): Archivos y directorios.
+    """
+    total = 0
+
+    for path in paths:
+        if os.path.isdir(path):
+            total += sum(os.path.getsize(os.path.join(directory, name)) for directory, _, names in os.walk(path) for name in names)
+        else:
+            total += os.path.getsize(path)
+
+    return total
+
+def choose_backend(size: int, threshold: int, cluster_size: int, cores: int, serial: bool = True, parallel: bool = True) -> str:
+    """Elige el entorno de ejecución. Los datos pequeños se procesan en serie, porque iniciar procesos cuesta más de lo que se gana.
+    Los grandes se procesan con MPI si el programa se lanzó con mpiexec en varios procesos, o con un pool de procesos locales si hay varios núcleos.
+
+    Args:
+        size (int): Número de bytes sin comprimir a procesar.
+        threshold (int): Tamaño a partir del cual se procesa en paralelo.
+        cluster_size (int): Número de procesos lanzados con mpiexec, o 1.
+        cores (int): Número de núcleos disponibles.
+        serial (bool): Si el programa serial admite la operación.
+        parallel (bool): Si los programas paralelos admiten la operación.
+
+    Returns:
+        str: "serial", "local" o "mpi".
+    """
+    if not parallel:
+        return "serial"
+
+    if cluster_size > 1 and (size >= threshold or not serial):
+        return "mpi"
+
+    if not serial or (size >= threshold and cores > 1):
+        return "local"
+
+    return "serial"
+
+def forward(args: Namespace, options: tuple[tuple[str, str], ...]) -> list[str]:
+    """Convierte las opciones especificadas en argumentos del programa al que se delega. Las que no se especificaron se omiten, de modo que se usan sus valores por defecto.
+
+    Args:
+        args (Namespace): Las opciones.
+        options (tuple[tuple[str, str], ...]): Pares con el nombre de cada opción y su bandera.
+    """
+    arguments = []
+
+    for dest, flag in options:
+        value = getattr(args, dest)
+
+        if value is None or value is False:
+            continue
+
+        if value is True:
+            arguments.append(flag)
+        elif isinstance(value, list):
+            arguments += [argument for item in value for argument in (flag, str(item))]
+        else:
+            arguments += [flag, str(value)]
+
+    return arguments
+
+def backend_arguments(backend: str, workers: int | None) -> list[str]:
+    """Argumentos de los programas paralelos que seleccionan el entorno de ejecución.
+
+    Args:
+        backend (str): "local" o "mpi".
+        workers (int | None): Número de procesos del pool local. Por defecto es el número de núcleos disponibles.
+    """
+    if backend == "mpi":
+        return ["-b", "mpi"]
+
+    return ["-b", "local", "-w", str(workers or available_cores())]
+
+def run(module: str, arguments: list[str]) -> None:
+    """Ejecuta el programa de un módulo con los argumentos especificados, en este mismo proceso.
+
+    Args:
+        module (str): El módulo, por ejemplo compresorp.
+        arguments (list[str]): Los argumentos, sin el nombre del programa.
+    """
+    sys.argv[1:] = arguments
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+
+def compress_command(parser: ArgumentParser, args: Namespace) -> tuple[str, str, list[str]]:
+    """Elige el entorno de ejecución, el programa de compresión y sus argumentos.
+
+    Args:
+        parser (ArgumentParser): El analizador de argumentos del subcomando, para reportar errores.
+        args (Namespace): Las opciones del subcomando.
+    """
+    standard = "-" in args.filenames or args.outfile == "-"
+    archive = len(args.filenames) > 1 or any(os.path.isdir(path) for path in args.filenames)
+    parallel_only = archive or any(getattr(args, dest) not in (None, False) for dest, _ in PARALLEL_OPTIONS + CACHE_OPTIONS)
+
+    if standard and parallel_only:
+        parser.error("la entrada y la salida estándar solo admiten un archivo, sin opciones de los programas paralelos")
+
+    try:
+        size = 0 if "-" in args.filenames else input_size(args.filenames)
+    except OSError as error:
+        parser.error(str(error))
+
+    backend = args.backend if args.backend != "auto" else choose_backend(size, COMPRESS_THRESHOLD, mpi_environment()[0], available_cores(), not parallel_only, not standard)
+
+    if backend == "serial" and parallel_only:
+        parser.error("varios archivos, directorios, --chunk-size, --adaptive, --writer y el caché requieren un entorno paralelo")
+
+    if backend == "serial":
+        return backend, "compresor", [*args.filenames, *forward(args, COMPRESS_OPTIONS)]
+
+    if standard:
+        parser.error("los programas paralelos no usan la entrada ni la salida estándar")
+
+    return backend, "compresorp", [*args.filenames, *forward(args, COMPRESS_OPTIONS + PARALLEL_OPTIONS + CACHE_OPTIONS), *backend_arguments(backend, args.workers)]
+
+def decompress_command(parser: ArgumentParser, args: Namespace) -> tuple[str, str, list[str]]:
+    """Elige el entorno de ejecución, el programa de descompresión y sus argumentos.
+
+    Args:
+        parser (ArgumentParser): El analizador de argumentos del subcomando, para reportar errores.
+        args (Namespace): Las opciones del subcomando.
+    """
+    stdin = args.zipfile == "-"
+    serial_only = stdin or args.outfile == "-" or args.range is not None
+    parallel_only = any(getattr(args, dest) not in (None, False) for dest, _ in PARALLEL_OPTIONS)
+
+    if serial_only and parallel_only:
+        parser.error("la entrada estándar, la salida estándar y --range no admiten opciones de los programas paralelos")
+
+    container, size = None, 0
+
+    if not stdin:
+        try:
+            with open(args.zipfile, "rb") as file:
+                container = read_container(file)
+                size = sum(block.uncompressed_size for block in container.blocks) if container else os.fstat(file.fileno()).st_size
+        except (OSError, ValueError) as error:
+            parser.error(str(error))
+
+    backend = args.backend if args.backend != "auto" else choose_backend(size, DECOMPRESS_THRESHOLD, mpi_environment()[0], available_cores(), not parallel_only, not serial_only)
+
+    if backend == "serial" and parallel_only:
+        parser.error("--chunk-size, --adaptive y --writer requieren un entorno paralelo")
+
+    if backend == "serial":
+        return backend, "descompresor", [args.zipfile, *forward(args, DECOMPRESS_OPTIONS), *(["-r", *map(str, args.range)] if args.range else [])]
+
+    if serial_only:
+        parser.error("los programas paralelos no usan la entrada ni la salida estándar ni admiten --range")
+
+    if args.outfile is None and not (container and container.members):
+        args.outfile = OUTFILE
+
+    return backend, "descompresorp", [args.zipfile, *forward(args, DECOMPRESS_OPTIONS + PARALLEL_OPTIONS), *backend_arguments(backend, args.workers)]
+
+def verify_command(parser: ArgumentParser, args: Namespace) -> tuple[str, str, list[str]]:
+    """Elige el entorno de ejecución con el que se verifica un archivo comprimido. La comparación de dos archivos siempre se hace en serie.
+
+    Args:
+        parser (ArgumentParser): El analizador de argumentos del subcomando, para reportar errores.
+        args (Namespace): Las opciones del subcomando.
+    """
+    if args.file2:
+        return "serial", "verificador", [args.file1, args.file2]
+
+    try:
+        with open(args.file1, "rb") as file:
+            container = read_container(file)
+    except (OSError, ValueError) as error:
+        parser.error(str(error))
+
+    size = sum(block.uncompressed_size for block in container.blocks) if container else 0
+    backend = args.backend if args.backend != "auto" else choose_backend(size, DECOMPRESS_THRESHOLD, mpi_environment()[0], available_cores())
+    arguments = [args.file1, *forward(args, (("dictionary", "-D"),))]
+
+    if backend == "serial":
+        return backend, "verificador", [*arguments, "-b", "local", "-w", "1"]
+
+    return backend, "verificador", [*arguments, *backend_arguments(backend, args.workers)]
+
+def build_parser() -> tuple[ArgumentParser, dict[str, ArgumentParser]]:
+    """Construye el analizador de argumentos del comando lz77 y de cada uno de sus subcomandos."""
+    parser = ArgumentParser(
+        prog="lz77",
+        description="Comprime, descomprime y verifica archivos con el algoritmo LZ77. Elige entre el programa serial, un pool de procesos locales y MPI "
+        "según el tamaño de los datos, los núcleos disponibles y si se lanzó con mpiexec"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backends = ["auto", "serial", "local", "mpi"]
+
+    compress = subparsers.add_parser("compress", help="Comprime un archivo, o varios archivos y directorios en un único archivo comprimido")
+    compress.add_argument("filenames", help="Archivos o directorios a comprimir, o - para leer de la entrada estándar", nargs="+")
+    compress.add_argument("-o", "--outfile", help="Nombre del archivo comprimido, o - para escribir en la salida estándar", default=ZIPFILE)
+    compress.add_argument("-m", "--matcher", help="Motor de búsqueda de coincidencias. Por defecto es hash", choices=MATCHERS.keys())
+    compress.add_argument("--max-chain", help=f"Número máximo de candidatos a revisar por posición. Por defecto lo determina el nivel, o es {MAX_CHAIN_DEPTH} si no se especifica un nivel", type=int)
+    compress.add_argument("-l", "--level", help="Nivel de compresión: de 1 a 3 análisis voraz, de 4 a 6 perezoso y de 7 a 9 óptimo", type=int, choices=range(1, 10))
+    compress.add_argument("--raw", help="Escribe el formato original sin encabezado ni índice de bloques", action="store_true")
+    compress.add_argument("--window-bits", help="Número de bits de la distancia de cada referencia", type=int)
+    compress.add_argument("--length-bits", help="Número de bits de la longitud de cada referencia", type=int)
+    compress.add_argument("--codec", help=f"Codificación de las referencias. Por defecto es {CODECS[0]}", choices=CODECS)
+    compress.add_argument("--stats", help="Escribe contadores y tiempos en JSON en el archivo especificado", metavar="ARCHIVO")
+    compress.add_argument("-D", "--dictionary", help="Diccionario entrenado con dictionary.py que se usa como ventana inicial de cada bloque")
+    compress.add_argument("--cache", help="Directorio del caché de partes comprimidas. Requiere un entorno paralelo", metavar="DIRECTORIO")
+    compress.add_argument("--cache-size", help="Tamaño máximo del caché en bytes", type=int)
+
+    decompress = subparsers.add_parser("decompress", help="Descomprime un archivo comprimido")
+    decompress.add_argument("zipfile", help="Nombre del archivo a descomprimir, o - para leer de la entrada estándar")
+    decompress.add_argument("-o", "--outfile", help=f"Nombre del archivo descomprimido, - para escribir en la salida estándar, o el directorio de salida si el archivo comprimido tiene varios archivos. Por defecto es {OUTFILE} o el directorio actual")
+    decompress.add_argument("-m", "--member", help="Extrae solo el archivo especificado de un archivo comprimido con varios archivos. Se puede repetir", action="append")
+    decompress.add_argument("-r", "--range", help="Descomprime solo el rango especificado del archivo original y lo escribe a la salida estándar", type=int, nargs=2, metavar=("INICIO", "LONGITUD"))
+    decompress.add_argument("--stats", help="Escribe contadores y tiempos en JSON en el archivo especificado", metavar="ARCHIVO")
+    decompress.add_argument("-D", "--dictionary", help="Diccionario, o directorio de diccionarios, entre los que se busca el que requiere el archivo comprimido. Se puede repetir", action="append")
+
+    for subparser in (compress, decompress):
+        subparser.add_argument("-c", "--chunk-size", help="Tamaño de las partes de los programas paralelos", type=int)
+        subparser.add_argument("-a", "--adaptive", help="Ajusta el tamaño de las partes según el tiempo medido de las anteriores. Solo aplica con MPI y el escritor root, a un archivo al comprimir y al formato original al descomprimir", action="store_true")
+        subparser.add_argument("--writer", help="Forma de escribir la salida con MPI", choices=["root", "mpiio"])
+
+    verify = subparsers.add_parser("verify", help="Verifica un archivo comprimido con el CRC32 de cada bloque, o compara dos archivos")
+    verify.add_argument("file1", help="El archivo comprimido a verificar, o el primer archivo a comparar")
+    verify.add_argument("file2", help="Segundo archivo a comparar", nargs="?")
+    verify.add_argument("-D", "--dictionary", help="Diccionario, o directorio de diccionarios, entre los que se busca el que requiere el archivo comprimido. Se puede repetir", action="append")
+
+    for subparser in (compress, decompress, verify):
+        subparser.add_argument("-b", "--backend", help="Entorno de ejecución. Por defecto se elige según el tamaño de los datos, los núcleos disponibles y si se lanzó con mpiexec", choices=backends, default="auto")
+        subparser.add_argument("-w", "--workers", help="Número de procesos del pool local. Por defecto es el número de núcleos disponibles", type=int)
+
+    return parser, {"compress": compress, "decompress": decompress, "verify": verify}
+
+if __name__ == "__main__":
+    parser, subparsers = build_parser()
+    args = parser.parse_args()
+    commands = {"compress": compress_command, "decompress": decompress_command, "verify": verify_command}
+    backend, module, arguments = commands[args.command](subparsers[args.command], args)
+
+    if backend == "mpi":
+        from mpi_globals import CLUSTER_SIZE
+
+        if CLUSTER_SIZE < 2 and module != "verificador":
+            subparsers[args.command].error("el proceso raíz de MPI requiere lanzar el programa con mpiexec en al menos 2 procesos")
+    elif mpi_environment()[1] != 0:
+        sys.exit(0)
+
+    run(module, arguments)
@@ -0,0 +1,255 @@
+from functools import partial
+from typing import Callable
+from constants import HASH_BITS, LENGTH_THRESHOLD, MAX_CHAIN_DEPTH
+from reference import DEFAULT_FORMAT, Reference, TokenFormat
+
+MIN_MATCH = LENGTH_THRESHOLD + 1
+HASH_SIZE = 2**HASH_BITS
+HASH_MASK = HASH_SIZE - 1
+HASH_SHIFT = (HASH_BITS + MIN_MATCH - 1) // MIN_MATCH
+
+def window_match(lookahead: bytes, window: bytes) -> Reference:
+    """Realiza una búsqueda en la ventana de referencia para encontrar una sequencia que coincida con la sequencia iniciada con el byte actual que se está leyendo.
+
+    Args:
+        lookahead (bytes): Buffer de bytes que contiene el byte actual y todos los que están despues de este.
+        window (bytes): Ventana de referencia para buscar ocurrencias anteriores de la sequencia actual.
+
+    Returns:
+        Reference: Se retorna una referencia a una ocurrencia pasada de la secuencia actual. En caso contrario se retorna una referencia de longitud 0.
+    """
+    current = lookahead[0]
+    window_length = len(window)
+    lookahead_length = len(lookahead)
+    longest = Reference(0, 0, current)
+    found = window.find(current)
+
+    while found > -1:
+        offset = window_length - found
+        max_length = min(offset, lookahead_length - 1)
+
+        if max_length > longest.length:
+            for i in range(1, max_length):
+                if window[found + i] != lookahead[i]:
+                    if i > longest.length:
+                        longest = Reference(offset, i, lookahead[i])
+
+                    break
+            else:
+                longest = Reference(offset, max_length, lookahead[max_length])
+
+        if longest.length > LENGTH_THRESHOLD:
+            return longest
+
+        found = window.find(current, found + 1)
+
+    return longest
+
+class LinearMatcher:
+    """Motor de búsqueda original. Recorre linealmente la ventana de referencia en cada posición usando window_match."""
+    buffer: bytes | memoryview
+    end: int
+    token_format: TokenFormat
+
+    def __init__(self, buffer: bytes | memoryview, start: int, end: int | None = None, token_format: TokenFormat = DEFAULT_FORMAT) -> None:
+        """Motor de búsqueda que recorre linealmente la ventana de referencia en cada posición.
+
+        Args:
+            buffer (bytes | memoryview): Buffer que contiene la ventana inicial y la parte a comprimir.
+            start (int): Posición a partir de la cual se va a comprimir.
+            end (int | None): Posición en la que termina la parte a comprimir. Por defecto es el final del buffer.
+            token_format (TokenFormat): Geometría de las referencias, que determina el tamaño de la ventana y la longitud máxima.
+        """
+        self.buffer = buffer
+        self.end = len(buffer) if end is None else end
+        self.token_format = token_format
+
+    def match(self, position: int) -> tuple[int, int]:
+        """Busca la secuencia más larga de la ventana que coincida con la secuencia iniciada en la posición especificada.
+
+        Args:
+            position (int): Posición del byte actual dentro del buffer.
+
+        Returns:
+            tuple[int, int]: Distancia y longitud de una ocurrencia anterior de la secuencia actual. La longitud es 0 si no hay coincidencias.
+        """
+        window = bytes(self.buffer[max(position - self.token_format.window_size, 0): position])
+        lookahead = bytes(self.buffer[position:min(position + self.token_format.max_ref_length, self.end)])
+        matched = window_match(lookahead, window)
+
+        return matched.offset, matched.length
+
+class HashChainMatcher:
+    """Motor de búsqueda indexado. Mantiene un hash rodante de los siguientes MIN_MATCH bytes de cada posición y tablas de cabezas y cadenas
+    que se actualizan a medida que la ventana de referencia se desliza, de modo que solo se comparan posiciones que comparten el mismo hash.
+
+    Attributes:
+        buffer (bytes | memoryview): Buffer que contiene la ventana inicial y la parte a comprimir. Las posiciones son absolutas dentro de este buffer.
+        end (int): Posición en la que termina la parte a comprimir.
+        max_chain (int): Número máximo de candidatos que se revisan por posición.
+        nice_length (int): Longitud a partir de la cual se deja de buscar una coincidencia más larga.
+        window_size (int): Tamaño de la ventana de referencia.
+        max_ref_length (int): Longitud máxima de una secuencia.
+        head (list[int]): Última posición insertada para cada valor del hash.
+        chain (list[int]): Posición anterior con el mismo hash, indexada circularmente por posición.
+        ring_mask (int): Máscara del índice circular de chain. Cubre la ventana o, si es más corto, todo el rango del buffer que se indexa.
+        pairs (list[int]): Última posición insertada para cada par de bytes. Permite encontrar coincidencias cortas.
+        singles (list[int]): Última posición insertada para cada byte.
+        inserted (int): Siguiente posición que se va a insertar en las tablas.
+        probes (int): Número total de candidatos revisados en las cadenas. Se usa para las estadísticas de --stats.
+    """
+    buffer: bytes | memoryview
+    end: int
+    max_chain: int
+    nice_length: int
+    window_size: int
+    max_ref_length: int
+    head: list[int]
+    chain: list[int]
+    ring_mask: int
+    pairs: list[int]
+    singles: list[int]
+    inserted: int
+    hash: int
+    probes: int
+
+    def __init__(self, buffer: bytes | memoryview, start: int, end: int | None = None, max_chain: int = MAX_CHAIN_DEPTH, token_format: TokenFormat = DEFAULT_FORMAT, nice_length: int | None = None) -> None:
+        """Construye un motor de búsqueda indexado sobre el buffer especificado.
+
+        Args:
+            buffer (bytes | memoryview): Buffer que contiene la ventana inicial y la parte a comprimir.
+            start (int): Posición a partir de la cual se va a comprimir. Los bytes anteriores que caben en la ventana se indexan como referencia.
+            end (int | None): Posición en la que termina la parte a comprimir. Por defecto es el final del buffer.
+            max_chain (int): Número máximo de candidatos que se revisan por posición.
+            token_format (TokenFormat): Geometría de las referencias, que determina el tamaño de la ventana y la longitud máxima.
+            nice_length (int | None): Longitud a partir de la cual se deja de buscar una coincidencia más larga. Por defecto es la longitud máxima.
+        """
+        self.buffer = buffer
+        self.end = len(buffer) if end is None else end
+        self.max_chain = max_chain
+        self.nice_length = token_format.max_ref_length if nice_length is None else nice_length
+        self.window_size = token_format.window_size
+        self.max_ref_length = token_format.max_ref_length
+        self.inserted = max(start - self.window_size, 0)
+        self.ring_mask = min(self.window_size, 2**max(self.end - self.inserted - 1, 1).bit_length() - 1)
+        self.head = [-1] * HASH_SIZE
+        self.chain = [-1] * (self.ring_mask + 1)
+        self.pairs = [-1] * 65536
+        self.singles = [-1] * 256
+        self.hash = 0
+        self.probes = 0
+
+        for i in range(self.inserted, min(self.inserted + MIN_MATCH - 1, self.end)):
+            self.hash = ((self.hash << HASH_SHIFT) ^ buffer[i]) & HASH_MASK
+
+    def insert(self, position: int) -> None:
+        """Inserta en las tablas todas las posiciones pendientes anteriores a la posición especificada.
+
+        Args:
+            position (int): Primera posición que no se va a insertar.
+        """
+        buffer = self.buffer
+        head, chain, pairs, singles = self.head, self.chain, self.pairs, self.singles
+        ring_mask = self.ring_mask
+        hash_value = self.hash
+        last = self.end - MIN_MATCH
+
+        for i in range(self.inserted, position):
+            if i <= last:
+                hash_value = ((hash_value << HASH_SHIFT) ^ buffer[i + MIN_MATCH - 1]) & HASH_MASK
+                chain[i & ring_mask] = head[hash_value]
+                head[hash_value] = i
+
+            if i <= last + 1:
+                pairs[(buffer[i] << 8) | buffer[i + 1]] = i
+
+            singles[buffer[i]] = i
+
+        self.hash = hash_value
+        self.inserted = max(self.inserted, position)
+
+    def match(self, position: int) -> tuple[int, int]:
+        """Busca la secuencia más larga de la ventana que coincida con la secuencia iniciada en la posición especificada.
+        Solo se revisan hasta max_chain candidatos con el mismo hash, y la búsqueda termina al encontrar una de nice_length bytes.
+        Si no hay coincidencias de al menos MIN_MATCH bytes, se intenta una coincidencia corta con la última ocurrencia del par de bytes o del byte actual.
+
+        Args:
+            position (int): Posición del byte actual dentro del buffer.
+
+        Returns:
+            tuple[int, int]: Distancia y longitud de una ocurrencia anterior de la secuencia actual. La longitud es 0 si no hay coincidencias.
+        """
+        self.insert(position)
+        buffer = self.buffer
+        available = min(self.end - position, self.max_ref_length) - 1
+        nice_length = min(self.nice_length, available)
+        lowest = position - self.window_size
+        best_length = 0
+        best_offset = 0
+
+        if available >= MIN_MATCH:
+            hash_value = ((self.hash << HASH_SHIFT) ^ buffer[position + MIN_MATCH - 1]) & HASH_MASK
+            candidate = self.head[hash_value]
+            depth = self.max_chain
+
+            while candidate >= lowest and candidate >= 0 and depth > 0:
+                offset = position - candidate
+                limit = min(offset, available)
+
+                if limit > best_length and buffer[candidate + best_length] == buffer[position + best_length]:
+                    length = 0
+
+                    if buffer[candidate + limit - 1] == buffer[position + limit - 1] and buffer[candidate:candidate + limit] == buffer[position:position + limit]:
+                        length = limit
+
+                    while length < limit and buffer[candidate + length] == buffer[position + length]:
+                        length += 1
+
+                    if length > best_length:
+                        best_length, best_offset = length, offset
+
+                        if length >= nice_length:
+                            break
+
+                candidate = self.chain[candidate & self.ring_mask]
+                depth -= 1
+
+            self.probes += self.max_chain - depth
+
+        if best_length < MIN_MATCH and available >= 1:
+            candidate = self.pairs[(buffer[position] << 8) | buffer[position + 1]]
+
+            if candidate >= lowest and candidate >= 0:
+                offset = position - candidate
+                length = min(offset, available, 2)
+
+                if length > best_length:
+                    best_length, best_offset = length, offset
+
+        if best_length == 0 and available >= 1:
+            candidate = self.singles[buffer[position]]
+
+            if candidate >= lowest and candidate >= 0:
+                best_length, best_offset = 1, position - candidate
+
+        return best_offset, best_length
+
+MATCHERS = {
+    "hash": HashChainMatcher,
+    "linear": LinearMatcher
+}
+
+def build_matcher(name: str, max_chain: int = MAX_CHAIN_DEPTH) -> Callable:
+    """Construye la fábrica del motor de búsqueda de coincidencias con el nombre especificado.
+
+    Args:
+        name (str): Nombre del motor de búsqueda ("hash" o "linear").
+        max_chain (int): Número máximo de candidatos a revisar por posición. Solo aplica al motor "hash".
+
+    Returns:
+        Callable: Función que recibe el buffer, la posición inicial, la final y la geometría de las referencias y retorna el motor de búsqueda.
+    """
+    if name == "hash":
+        return partial(HashChainMatcher, max_chain=max_chain)
+
+    return MATCHERS[name]
@@ -1,14 +1,21 @@
 from dataclasses import dataclass
+from typing import Any
 
 @dataclass
-class WorkerDone:
-    """Mensaje que indica que un Worker ha terminado el trabajo que se le ha asignado."""
+class ChunkResult:
+    """Mensaje que indica que un Worker ha terminado el trabajo que se le ha asignado. Contiene el resultado que el proceso raíz debe escribir."""
     worker_rank: int
+    chunk_number: int
+    result: Any
+    elapsed: float
 
 @dataclass
 class ChunkAssignment:
-    """Mensaje que indica que el proceso raiz le está asignando trabajo a un Worker."""
+    """Mensaje que indica que el proceso raiz le está asignando trabajo a un Worker.
+    Si se especifican, start y size indican la posición y el tamaño de la parte dentro del archivo de entrada."""
     chunk_number: int
+    start: int | None = None
+    size: int | None = None
 
 @dataclass
 class Finalize:
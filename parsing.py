@@ -0,0 +1,300 @@
+import huffman
+
+from functools import partial
+from typing import Callable
+from matcher import MATCHERS, MIN_MATCH, HashChainMatcher
+from reference import DEFAULT_FORMAT, FIXED, HUFFMAN, TokenFormat, varint_accepts
+
+GREEDY = "greedy"
+LAZY = "lazy"
+OPTIMAL = "optimal"
+LONG_MATCH = 32
+UNSEEN_COST = huffman.MAX_CODE_LENGTH + 1
+LEVELS = {
+    1: (GREEDY, 4, 16),
+    2: (GREEDY, 8, 32),
+    3: (GREEDY, 32, None),
+    4: (LAZY, 16, 32),
+    5: (LAZY, 32, None),
+    6: (LAZY, 64, None),
+    7: (OPTIMAL, 32, None),
+    8: (OPTIMAL, 64, None),
+    9: (OPTIMAL, 256, None)
+}
+
+class LazyMatcher:
+    """Análisis perezoso. Antes de usar la coincidencia de una posición se busca la de la siguiente,
+    y si es más larga la posición actual se deja como literal.
+
+    Attributes:
+        engine (HashChainMatcher | LinearMatcher): Motor de búsqueda de coincidencias.
+        end (int): Posición en la que termina la parte a comprimir.
+        max_lazy (int): Longitud a partir de la cual una coincidencia se usa sin revisar la siguiente posición.
+        lookahead (tuple[int, int, int]): Posición, distancia y longitud de la última coincidencia buscada por adelantado.
+        probes (int): Candidatos revisados por el motor de búsqueda, si este los cuenta.
+    """
+    engine: object
+    end: int
+    max_lazy: int
+    lookahead: tuple[int, int, int]
+
+    def __init__(self, buffer: bytes | memoryview, start: int, end: int | None = None, token_format: TokenFormat = DEFAULT_FORMAT, engine: Callable = HashChainMatcher, max_lazy: int | None = None) -> None:
+        """Construye un análisis perezoso sobre el motor de búsqueda especificado.
+
+        Args:
+            buffer (bytes | memoryview): Buffer que contiene la ventana inicial y la parte a comprimir.
+            start (int): Posición a partir de la cual se va a comprimir.
+            end (int | None): Posición en la que termina la parte a comprimir. Por defecto es el final del buffer.
+            token_format (TokenFormat): Geometría de las referencias.
+            engine ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+            max_lazy (int | None): Longitud a partir de la cual una coincidencia se usa sin revisar la siguiente posición. Por defecto es la longitud máxima.
+        """
+        self.engine = engine(buffer, start, end, token_format=token_format)
+        self.end = self.engine.end
+        self.max_lazy = token_format.max_ref_length if max_lazy is None else max_lazy
+        self.lookahead = (-1, 0, 0)
+
+    def match(self, position: int) -> tuple[int, int]:
+        """Busca la coincidencia de la posición especificada y la descarta si la siguiente posición tiene una más larga.
+
+        Args:
+            position (int): Posición del byte actual dentro del buffer.
+
+        Returns:
+            tuple[int, int]: Distancia y longitud de la coincidencia a usar. La longitud es 0 si la posición se debe dejar como literal.
+        """
+        lookahead_position, distance, length = self.lookahead
+
+        if lookahead_position != position:
+            distance, length = self.engine.match(position)
+
+        if 0 < length < self.max_lazy and position + 1 < self.end:
+            next_distance, next_length = self.engine.match(position + 1)
+            self.lookahead = (position + 1, next_distance, next_length)
+
+            if next_length > length:
+                return 0, 0
+
+        return distance, length
+
+    @property
+    def probes(self) -> int:
+        return getattr(self.engine, "probes", 0)
+
+class OptimalMatcher:
+    """Análisis óptimo. Busca la coincidencia más larga de cada posición de la parte y elige con programación dinámica,
+    de atrás hacia adelante, la combinación de literales y coincidencias (o prefijos de ellas) que ocupa menos según el codificador.
+    Dentro de una coincidencia de LONG_MATCH bytes o más no se busca de nuevo: cada posición usa el resto de esa coincidencia.
+
+    Con el codificador FIXED se minimiza el número de referencias. Con VARINT se estima el tamaño en bytes de cada secuencia,
+    y con HUFFMAN se usan las longitudes de los códigos que resultan de un primer análisis voraz de la misma parte.
+
+    Attributes:
+        start (int): Posición a partir de la cual se comprime.
+        choices (list[tuple[int, int]]): Distancia y longitud elegidas para cada posición de la parte. La longitud es 0 para los literales.
+        probes (int): Candidatos revisados por el motor de búsqueda, si este los cuenta.
+    """
+    start: int
+    choices: list[tuple[int, int]]
+    probes: int
+
+    def __init__(self, buffer: bytes | memoryview, start: int, end: int | None = None, token_format: TokenFormat = DEFAULT_FORMAT, engine: Callable = HashChainMatcher) -> None:
+        """Analiza toda la parte a comprimir con el motor de búsqueda especificado.
+
+        Args:
+            buffer (bytes | memoryview): Buffer que contiene la ventana inicial y la parte a comprimir.
+            start (int): Posición a partir de la cual se va a comprimir.
+            end (int | None): Posición en la que termina la parte a comprimir. Por defecto es el final del buffer.
+            token_format (TokenFormat): Geometría y codificador de las referencias.
+            engine ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        """
+        searcher = engine(buffer, start, end, token_format=token_format)
+        matches = []
+        i = start
+
+        while i < searcher.end:
+            distance, length = searcher.match(i)
+            matches.append((distance, length))
+
+            if length >= LONG_MATCH:
+                matches.extend((distance, length - covered) for covered in range(1, length))
+                i += length
+            else:
+                i += 1
+
+        self.start = start
+        self.probes = getattr(searcher, "probes", 0)
+
+        if token_format.codec == FIXED:
+            self.choices = parse_tokens(matches)
+        else:
+            literal_costs, length_costs, distance_cost = (huffman_costs if token_format.codec == HUFFMAN else varint_costs)(buffer, start, matches, token_format)
+            accepts = huffman.accepts if token_format.codec == HUFFMAN else varint_accepts
+            self.choices = parse_sequences(buffer, start, matches, literal_costs, length_costs, distance_cost, accepts)
+
+    def match(self, position: int) -> tuple[int, int]:
+        """Retorna la coincidencia elegida para la posición especificada.
+
+        Args:
+            position (int): Posición del byte actual dentro del buffer.
+
+        Returns:
+            tuple[int, int]: Distancia y longitud de la coincidencia a usar. La longitud es 0 si la posición se debe dejar como literal.
+        """
+        return self.choices[position - self.start]
+
+def parse_tokens(matches: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Elige para cada posición la longitud que minimiza el número de referencias del codificador FIXED hasta el final de la parte.
+    Cada referencia cubre su coincidencia y el byte siguiente. Entre longitudes con el mismo costo se prefiere la más larga.
+
+    Args:
+        matches (list[tuple[int, int]]): Distancia y longitud de la coincidencia más larga de cada posición de la parte.
+
+    Returns:
+        list[tuple[int, int]]: Distancia y longitud elegidas para cada posición.
+    """
+    costs = [0] * (len(matches) + 1)
+    choices = [(0, 0)] * len(matches)
+
+    for i in range(len(matches) - 1, -1, -1):
+        distance, length = matches[i]
+        following = costs[i + 1: i + length + 2]
+        best = min(following)
+        chosen = len(following) - 1 - following[::-1].index(best)
+        costs[i] = best + 1
+
+        if chosen:
+            choices[i] = (distance, chosen)
+
+    return choices
+
+def parse_sequences(buffer: bytes | memoryview, start: int, matches: list[tuple[int, int]], literal_costs: list[int], length_costs: list[int], distance_cost: Callable[[int], int], accepts: Callable[[int, int], bool]) -> list[tuple[int, int]]:
+    """Elige para cada posición entre un literal y un prefijo de su coincidencia, minimizando el costo estimado hasta el final de la parte.
+    Las coincidencias de LONG_MATCH bytes o más se usan completas. Solo se consideran los prefijos que el codificador acepta, para que
+    el análisis sea el que se codifica, y entre opciones con el mismo costo se prefiere el literal o el prefijo más corto.
+
+    Args:
+        buffer (bytes | memoryview): Buffer que contiene la parte a comprimir.
+        start (int): Posición a partir de la cual se comprime.
+        matches (list[tuple[int, int]]): Distancia y longitud de la coincidencia más larga de cada posición de la parte.
+        literal_costs (list[int]): Costo de cada byte como literal.
+        length_costs (list[int]): Costo de cada longitud de coincidencia.
+        distance_cost ((int) -> int): Función que retorna el costo de una distancia, incluyendo lo que cuesta iniciar una coincidencia.
+        accepts ((int, int) -> bool): Función del codificador que indica si usa una coincidencia de la longitud y la distancia especificadas.
+        Si acepta una longitud, acepta todas las mayores.
+
+    Returns:
+        list[tuple[int, int]]: Distancia y longitud elegidas para cada posición.
+    """
+    costs = [0] * (len(matches) + 1)
+    choices = [(0, 0)] * len(matches)
+
+    for i in range(len(matches) - 1, -1, -1):
+        best = literal_costs[buffer[start + i]] + costs[i + 1]
+        distance, length = matches[i]
+
+        if length >= MIN_MATCH:
+            base = distance_cost(distance)
+            shortest = length if length >= LONG_MATCH else MIN_MATCH
+
+            while shortest <= length and not accepts(shortest, distance):
+                shortest += 1
+
+            for candidate in range(shortest, length + 1):
+                cost = base + length_costs[candidate] + costs[i + candidate]
+
+                if cost < best:
+                    best = cost
+                    choices[i] = (distance, candidate)
+
+        costs[i] = best
+
+    return choices
+
+def varint_costs(buffer: bytes | memoryview, start: int, matches: list[tuple[int, int]], token_format: TokenFormat) -> tuple[list[int], list[int], Callable[[int], int]]:
+    """Costos en bits del codificador VARINT. Cada coincidencia paga el byte de control de una nueva secuencia, su distancia
+    y los bytes adicionales de su longitud.
+
+    Args:
+        buffer (bytes | memoryview): Buffer que contiene la parte a comprimir.
+        start (int): Posición a partir de la cual se comprime.
+        matches (list[tuple[int, int]]): Distancia y longitud de la coincidencia más larga de cada posición de la parte.
+        token_format (TokenFormat): Geometría de las referencias.
+
+    Returns:
+        tuple[list[int], list[int], (int) -> int]: Costo de cada literal, de cada longitud y función de costo de las distancias.
+    """
+    length_costs = [0] * (token_format.max_ref_length + 1)
+
+    for length in range(MIN_MATCH + 15, len(length_costs)):
+        length_costs[length] = 8 * max(((length - MIN_MATCH - 15).bit_length() + 6) // 7, 1)
+
+    return [8] * 256, length_costs, lambda distance: 8 * (2 + (distance.bit_length() + 6) // 7)
+
+def huffman_costs(buffer: bytes | memoryview, start: int, matches: list[tuple[int, int]], token_format: TokenFormat) -> tuple[list[int], list[int], Callable[[int], int]]:
+    """Costos en bits del codificador HUFFMAN, a partir de las longitudes de los códigos que resultan de un análisis voraz de la parte.
+    Los símbolos que no aparecen en el análisis voraz cuestan UNSEEN_COST bits.
+
+    Args:
+        buffer (bytes | memoryview): Buffer que contiene la parte a comprimir.
+        start (int): Posición a partir de la cual se comprime.
+        matches (list[tuple[int, int]]): Distancia y longitud de la coincidencia más larga de cada posición de la parte.
+        token_format (TokenFormat): Geometría de las referencias.
+
+    Returns:
+        tuple[list[int], list[int], (int) -> int]: Costo de cada literal, de cada longitud y función de costo de las distancias.
+    """
+    sequences = []
+    literal_start = 0
+    i = 0
+
+    while i < len(matches):
+        distance, length = matches[i]
+
+        if length >= MIN_MATCH and huffman.accepts(length, distance):
+            sequences.append((start + literal_start, start + i, length, distance))
+            i += length
+            literal_start = i
+        else:
+            i += 1
+
+    sequences.append((start + literal_start, start + len(matches), 0, 0))
+    literal_frequencies, distance_frequencies = huffman.count_symbols(buffer, sequences)
+    literal_lengths = [length or UNSEEN_COST for length in huffman.code_lengths(literal_frequencies)]
+    distance_lengths = [length or UNSEEN_COST for length in huffman.code_lengths(distance_frequencies)]
+    length_costs = [0] * (token_format.max_ref_length + 1)
+
+    for length in range(MIN_MATCH, len(length_costs)):
+        code = huffman.bucket(length - MIN_MATCH)
+        length_costs[length] = literal_lengths[huffman.LENGTH_SYMBOLS + code] + huffman.EXTRA_BITS[code]
+
+    def distance_cost(distance: int) -> int:
+        code = huffman.bucket(distance - 1)
+
+        return distance_lengths[code] + huffman.EXTRA_BITS[code]
+
+    return literal_lengths[:256], length_costs, distance_cost
+
+def build_level(level: int, name: str = "hash", max_chain: int | None = None) -> Callable:
+    """Construye la fábrica del análisis correspondiente a un nivel de compresión.
+    Los niveles 1 a 3 usan un análisis voraz con búsquedas cortas, los niveles 4 a 6 un análisis perezoso
+    y los niveles 7 a 9 un análisis óptimo. Todos generan el mismo formato.
+
+    Args:
+        level (int): Nivel de compresión, de 1 a 9.
+        name (str): Nombre del motor de búsqueda ("hash" o "linear").
+        max_chain (int | None): Número máximo de candidatos a revisar por posición. Por defecto lo determina el nivel.
+
+    Returns:
+        Callable: Función que recibe el buffer, la posición inicial, la final y la geometría de las referencias y retorna el motor de búsqueda.
+    """
+    strategy, chain, nice_length = LEVELS[level]
+    engine = partial(HashChainMatcher, max_chain=chain if max_chain is None else max_chain, nice_length=nice_length) if name == "hash" else MATCHERS[name]
+
+    if strategy == LAZY:
+        return partial(LazyMatcher, engine=engine, max_lazy=nice_length)
+
+    if strategy == OPTIMAL:
+        return partial(OptimalMatcher, engine=engine)
+
+    return engine
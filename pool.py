@@ -0,0 +1,128 @@
+import math
+import os
+
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Callable
+from stats import STATS, collect
+
+class LocalPool:
+    """Alternativa a Root y Worker que procesa un archivo por partes con un pool de procesos locales, sin MPI.
+    Los resultados se recogen a medida que terminan, sin sondeos ni esperas fijas, y un único escritor los escribe en orden al archivo de salida.
+    Con las estadísticas habilitadas, cada proceso retorna las suyas junto con el resultado y se suman a las del proceso principal.
+    """
+    filename: str
+    outfile: str
+    chunk_size: int
+    total_size: int
+    total_chunks: int
+    chunk_sizes: list[int] | None
+    workers: int
+    chunk_processor: Callable[[str, int], Any]
+    done_callback: Callable[[str, int, Any], bytes | bytearray] | None
+    finish_callback: Callable[[str, list[tuple[int, int]]], None] | None
+
+    def __init__(self, filename: str, outfile: str, chunk_size: int, chunk_processor: Callable[[str, int], Any], workers: int | None = None, total_chunks: int | None = None, chunk_sizes: list[int] | None = None) -> None:
+        """Construye un pool de procesos locales para procesar un archivo por partes.
+
+        Args:
+            filename (str): El archivo a procesar.
+            outfile (str): El archivo donde se va a escribir el resultado de procesar el archivo de entrada.
+            chunk_size (int): Tamaño de cada parte del archivo.
+            chunk_processor ((str, int) -> Any): Función que indica como se va a procesar cada parte del archivo de entrada.
+            Se ejecuta en otro proceso, por lo que debe poder serializarse con pickle.
+            workers (int | None): Número de procesos. Por defecto es el número de núcleos disponibles.
+            total_chunks (int | None): Número de partes a procesar. Por defecto se calcula a partir del tamaño del archivo, o es el número de tamaños de chunk_sizes.
+            chunk_sizes (list[int] | None): Tamaño en la entrada de cada parte, si las partes no son de chunk_size bytes, como en un archivo comprimido con varios archivos.
+        """
+        self.filename = filename
+        self.outfile = outfile
+        self.chunk_size = chunk_size
+        self.total_size = os.stat(filename).st_size
+        self.chunk_sizes = chunk_sizes
+        self.total_chunks = total_chunks if total_chunks is not None else len(chunk_sizes) if chunk_sizes is not None else math.ceil(self.total_size / chunk_size)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_processor = chunk_processor
+        self.done_callback = None
+        self.finish_callback = None
+
+        with open(outfile, "wb") as _:
+            pass
+
+    def when_done(self, done_callback: Callable[[str, int, Any], bytes | bytearray]) -> None:
+        """Inscribe una función que se va a ejecutar justo antes de escribir cada parte al archivo de salida.
+        Cuando se ejecuta, todas las partes anteriores ya han sido escritas al archivo de salida.
+
+        Args:
+            done_callback ((str, int, T) -> bytes | bytearray): La función. Recibe el archivo de salida, el número de la parte
+            y el resultado de chunk_processor, y retorna lo que se va a escribir.
+        """
+        self.done_callback = done_callback
+
+    def when_finished(self, finish_callback: Callable[[str, list[tuple[int, int]]], None]) -> None:
+        """Inscribe una función que se va a ejecutar cuando todas las partes hayan sido escritas al archivo de salida.
+
+        Args:
+            finish_callback ((str, list[tuple[int, int]]) -> None): La función. Recibe el archivo de salida y, para cada parte en orden,
+            el tamaño escrito y el tamaño de la parte en el archivo de entrada.
+        """
+        self.finish_callback = finish_callback
+
+    def input_size(self, chunk_number: int) -> int:
+        """Tamaño de una parte en el archivo de entrada.
+
+        Args:
+            chunk_number (int): El número de la parte.
+        """
+        if self.chunk_sizes is not None:
+            return self.chunk_sizes[chunk_number]
+
+        return max(min(self.chunk_size, self.total_size - chunk_number * self.chunk_size), 0)
+
+    def run(self) -> None:
+        """Procesa todas las partes del archivo y escribe los resultados en orden.
+        Se mantienen a lo sumo dos partes por proceso entre las que están en curso y las que esperan su turno para ser escritas.
+        """
+        in_flight: dict[Future, int] = {}
+        ready: dict[int, Any] = {}
+        output_sizes = []
+        next_chunk = 0
+
+        with ProcessPoolExecutor(self.workers) as executor, open(self.outfile, "ab") as out:
+            while len(output_sizes) < self.total_chunks:
+                while next_chunk < self.total_chunks and len(in_flight) + len(ready) < 2 * self.workers:
+                    if STATS.enabled:
+                        future = executor.submit(collect, self.chunk_processor, self.filename, next_chunk, detailed=STATS.detailed)
+                    else:
+                        future = executor.submit(self.chunk_processor, self.filename, next_chunk)
+
+                    in_flight[future] = next_chunk
+                    next_chunk += 1
+
+                STATS.sample("in_flight", len(in_flight))
+
+                with STATS.measure("pool_wait"):
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if STATS.enabled:
+                        result, snapshot = future.result()
+                        STATS.merge(snapshot)
+                        ready[in_flight.pop(future)] = result
+                    else:
+                        ready[in_flight.pop(future)] = future.result()
+
+                while len(output_sizes) in ready:
+                    chunk_number = len(output_sizes)
+                    result = ready.pop(chunk_number)
+
+                    if self.done_callback:
+                        out.flush()
+                        result = self.done_callback(self.outfile, chunk_number, result)
+
+                    with STATS.measure("chunk_write"):
+                        out.write(result)
+
+                    output_sizes.append((len(result), self.input_size(chunk_number)))
+
+        if self.finish_callback:
+            self.finish_callback(self.outfile, output_sizes)
@@ -1,40 +1,32 @@
-import collections
 import math
 import sys
 import os
 import time
 
-from typing import Callable
-from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable
 from mpi4py import MPI
 from mpi_globals import CHANNEL, CLUSTER_SIZE, RANK
-from message import ChunkAssignment, Finalize, WorkerDone
-
-@dataclass
-class WorkLoad:
-    """Trabajo asignado a un Worker por parte de proceso raíz."""
-    chunk: int
-    result: bytes | bytearray
+from message import ChunkAssignment, ChunkResult, Finalize
+from constants import MAX_BUFFER_SIZE, MAX_CHUNK_SIZE, MIN_CHUNK_SIZE, QUEUE_DEPTH, TARGET_CHUNK_TIME, WINDOW_SIZE
+from stats import STATS
 
 class Process:
     """Proceso que existe junto con otros en un entorno de paralelismo."""
-    current_chunk: int
     running: bool
 
     def __init__(self) -> None:
         """Proceso que existe junto con otros en un entorno de paralelismo."""
-        self.current_chunk = 0
         self.running = False
 
-    def broadcast(message: ChunkAssignment | WorkerDone | Finalize | int, tag: int = 0) -> None:
+    def broadcast(message: ChunkAssignment | Finalize, tag: int = 0) -> None:
         """Realiza un broadcast del mensaje especificado y lo envía al resto de procesos.
 
         Args:
-            message (ChunkAssignment | WorkerDone | Finalize): El mensaje a enviar.
+            message (ChunkAssignment | Finalize): El mensaje a enviar.
         """
         for i in range(CLUSTER_SIZE):
             if i != RANK:
-                CHANNEL.isend(message, i, tag)
+                CHANNEL.send(message, i, tag)
 
     def run(self) -> None:
         """Ejecuta al proceso."""
@@ -42,132 +34,392 @@ class Process:
 
         while self.running:
             self.process_loop()
-            time.sleep(0.02)
 
     def process_loop(self) -> None:
-        """Esto se va a ejecutar continuamente mientras el proceso esté activo."""
+        """Esto se va a ejecutar continuamente mientras el proceso esté activo. Se bloquea hasta que haya algo que hacer."""
         pass
 
+    def gather_stats() -> list[dict[str, Any]] | None:
+        """Reúne en el proceso de rango 0 las estadísticas de todos los procesos. Todos los procesos deben llamarla.
+
+        Returns:
+            list[dict[str, Any]] | None: Las estadísticas de cada proceso en orden de rango, o None en los demás procesos.
+        """
+        return CHANNEL.gather(STATS.snapshot(), root=0)
+
 class Worker(Process):
-    """Proceso que existe junto con otros en un entorno de paralelismo. Se va a encargar de turnarse con otros para procesar un archivo por partes."""
-    workload: WorkLoad | None
+    """Proceso que existe junto con otros en un entorno de paralelismo. Procesa en orden las partes del archivo que le asigna el proceso raíz y le envía los resultados."""
+    filename: str
+    chunk_processor: Callable[..., Any]
+
+    def __init__(self, filename: str, chunk_processor: Callable[..., Any]) -> None:
+        """Proceso que existe junto con otros en un entorno de paralelismo. Procesa en orden las partes del archivo que le asigna el proceso raíz y le envía los resultados.
+
+        Args:
+            filename (str): El archivo a procesar.
+            chunk_processor ((str, int) -> Any): Función que le indica al worker como se va a procesar cada parte del archivo de entrada.
+            Si la asignación especifica la posición y el tamaño de la parte, también los recibe como argumentos.
+            Retorna el resultado que el proceso raíz va a escribir al archivo de salida, o un resultado parcial que el proceso raíz completa antes de escribirlo.
+        """
+        super().__init__()
+        self.filename = filename
+        self.chunk_processor = chunk_processor
+
+    def process_loop(self) -> None:
+        with STATS.measure("worker_wait"):
+            message: ChunkAssignment | Finalize = CHANNEL.recv(source=0)
+
+        started = time.perf_counter()
+
+        match message:
+            case ChunkAssignment(chunk_number, None, None):
+                result = self.chunk_processor(self.filename, chunk_number)
+            case ChunkAssignment(chunk_number, start, size):
+                result = self.chunk_processor(self.filename, chunk_number, start, size)
+            case Finalize():
+                if STATS.enabled:
+                    Process.gather_stats()
+
+                sys.exit(0)
+
+        elapsed = time.perf_counter() - started
+        STATS.add_time("chunk_compute", elapsed)
+        CHANNEL.send(ChunkResult(RANK, chunk_number, result, elapsed), 0)
+
+class Root(Process):
+    """Proceso principal en un entorno de paralelismo. Está encargado de coordinar al resto de procesos, asignarles el trabajo que deben hacer
+    y escribir sus resultados en orden al archivo de salida.
+
+    Cada Worker puede tener hasta depth partes asignadas a la vez, de modo que no se queda sin trabajo mientras espera su turno para escribir.
+    Los resultados que llegan antes de su turno se guardan en un buffer de reordenamiento, y no se asignan más partes mientras este ocupe más de max_buffer bytes.
+    Con las estadísticas habilitadas, rank_stats guarda al terminar las de todos los procesos.
+    """
     filename: str
     outfile: str
-    chunk_processor: Callable[[str, int], bytes | bytearray]
-    done_callback: Callable[[str, int, bytes | bytearray], None] | None
+    chunk_size: int
+    total_size: int
+    total_chunks: int | None
+    chunk_sizes: list[int] | None
+    depth: int
+    max_buffer: int
+    adaptive: bool
+    alignment: int
+    assigned: dict[int, int]
+    pending: dict[int, tuple[Any, int]]
+    buffered: int
+    input_sizes: dict[int, int]
+    output_sizes: list[tuple[int, int]]
+    next_chunk: int
+    next_offset: int
+    throughput: float | None
+    out: BinaryIO
+    done_callback: Callable[[str, int, Any], bytes | bytearray] | None
+    finish_callback: Callable[[str, list[tuple[int, int]]], None] | None
+    rank_stats: list[dict[str, Any]] | None
 
-    def __init__(self, filename: str, outfile: str, chunk_processor: Callable[[str, int], bytes | bytearray]) -> None:
-        """Proceso que existe junto con otros en un entorno de paralelismo. Se va a encargar de turnarse con otros para procesar un archivo por partes.
+    def __init__(self, filename: str, outfile: str, chunk_size: int, total_chunks: int | None = None, depth: int = QUEUE_DEPTH,
+                 max_buffer: int = MAX_BUFFER_SIZE, adaptive: bool = False, alignment: int = 1, chunk_sizes: list[int] | None = None) -> None:
+        """Proceso principal en un entorno de paralelismo. Está encargado de coordinar al resto de procesos y asignarles el trabajo que deben hacer.
 
         Args:
             filename (str): El archivo a procesar.
             outfile (str): El archivo donde se va a escribir el resultado de procesar el archivo de entrada.
-            chunk_processor ((str, int) -> bytes | bytearray): Función que le indica al worker como se va a procesar cada parte del archivo de entrada.
-            Retorna el resultado que se va a escribir al archivo de salida.
+            chunk_size (int): Tamaño de cada parte del archivo. Si adaptive es verdadero, es el tamaño de las primeras partes.
+            total_chunks (int | None): Número de partes a procesar. Si se especifica, las partes se identifican solo por su número.
+            En caso contrario se asigna a cada parte su posición y su tamaño dentro del archivo.
+            depth (int): Número máximo de partes asignadas a la vez a cada Worker.
+            max_buffer (int): Número máximo de bytes en el buffer de reordenamiento antes de dejar de asignar partes.
+            adaptive (bool): Si es verdadero, el tamaño de las partes se ajusta según el tiempo medido de las anteriores para que cada una tarde cerca de TARGET_CHUNK_TIME.
+            alignment (int): Las partes, salvo la última, tienen un tamaño múltiplo de este valor.
+            chunk_sizes (list[int] | None): Tamaño en la entrada de cada parte identificada solo por su número, como en un archivo comprimido con varios archivos.
+            Si se especifica, total_chunks es por defecto el número de tamaños.
         """
         super().__init__()
         self.filename = filename
         self.outfile = outfile
-        self.workload = None
-        self.chunk_processor = chunk_processor
+        self.chunk_size = chunk_size
+        self.total_size = os.stat(filename).st_size
+        self.chunk_sizes = chunk_sizes
+        self.total_chunks = len(chunk_sizes) if total_chunks is None and chunk_sizes is not None else total_chunks
+        self.depth = depth
+        self.max_buffer = max_buffer
+        self.adaptive = adaptive
+        self.alignment = alignment
+        self.assigned = {worker: 0 for worker in range(1, CLUSTER_SIZE)}
+        self.pending = {}
+        self.buffered = 0
+        self.input_sizes = {}
+        self.output_sizes = []
+        self.next_chunk = 0
+        self.next_offset = 0
+        self.throughput = None
         self.done_callback = None
+        self.finish_callback = None
+        self.rank_stats = None
+
+        with open(outfile, "wb") as _:
+            pass
 
-    def when_done(self, done_callback: Callable[[str, int, bytes | bytearray], None]) -> None:
-        """Inscribe una función que se va a ejecutar justo antes de escribir al archivo de salida.
-        Permite modificar lo que se va a escribir si esto depende de la salida del Worker anterior a este.
+    def when_done(self, done_callback: Callable[[str, int, Any], bytes | bytearray]) -> None:
+        """Inscribe una función que se va a ejecutar justo antes de escribir cada parte al archivo de salida.
+        Permite modificar lo que se va a escribir si esto depende de las partes anteriores, que en ese momento ya han sido escritas.
 
         Args:
-            write_callback ((str, int, T) -> None): La función
+            done_callback ((str, int, T) -> bytes | bytearray): La función. Recibe el archivo de salida, el número de la parte
+            y el resultado del Worker, y retorna lo que se va a escribir.
         """
         self.done_callback = done_callback
-    
+
+    def when_finished(self, finish_callback: Callable[[str, list[tuple[int, int]]], None]) -> None:
+        """Inscribe una función que se va a ejecutar cuando todas las partes hayan sido escritas al archivo de salida.
+
+        Args:
+            finish_callback ((str, list[tuple[int, int]]) -> None): La función. Recibe el archivo de salida y, para cada parte en orden,
+            el tamaño escrito y el tamaño de la parte en el archivo de entrada.
+        """
+        self.finish_callback = finish_callback
+
+    def run(self) -> None:
+        with open(self.outfile, "ab") as out:
+            self.out = out
+            super().run()
+
+        self.finalize()
+
     def process_loop(self) -> None:
+        self.dispatch()
+
+        if not any(self.assigned.values()):
+            self.running = False
+            return
+
+        if STATS.enabled:
+            STATS.sample("free_workers", sum(self.assigned[worker] < self.depth for worker in self.assigned))
+            STATS.sample("free_slots", sum(self.depth - assigned for assigned in self.assigned.values()))
+            STATS.sample("reorder_buffer", self.buffered)
+
         self.handle_messages()
+        self.write_output()
 
-        if self.workload and self.current_chunk == self.workload.chunk:
-            self.write_output()
+    def has_work(self) -> bool:
+        """Indica si quedan partes del archivo por asignar."""
+        if self.total_chunks is not None:
+            return self.next_chunk < self.total_chunks
+
+        return self.next_offset < self.total_size
+
+    def next_size(self) -> int:
+        """Calcula el tamaño de la siguiente parte a asignar. Si el tamaño es adaptativo, se usa el rendimiento medido de las partes anteriores."""
+        size = self.chunk_size
+
+        if self.adaptive and self.throughput:
+            size = min(max(int(self.throughput * TARGET_CHUNK_TIME), MIN_CHUNK_SIZE), MAX_CHUNK_SIZE)
+
+        return max(size - size % self.alignment, self.alignment)
+
+    def dispatch(self) -> None:
+        """Asigna trabajo a los Workers que tengan menos de depth partes asignadas, mientras el buffer de reordenamiento no esté lleno."""
+        for worker in sorted(self.assigned, key=self.assigned.get):
+            while self.assigned[worker] < self.depth and self.buffered < self.max_buffer and self.has_work():
+                if self.total_chunks is not None:
+                    message = ChunkAssignment(self.next_chunk)
+
+                    if self.chunk_sizes is not None:
+                        self.input_sizes[self.next_chunk] = self.chunk_sizes[self.next_chunk]
+                else:
+                    size = min(self.next_size(), self.total_size - self.next_offset)
+                    message = ChunkAssignment(self.next_chunk, self.next_offset, size)
+                    self.input_sizes[self.next_chunk] = size
+                    self.next_offset += size
+
+                CHANNEL.send(message, worker)
+                self.assigned[worker] += 1
+                self.next_chunk += 1
 
     def handle_messages(self) -> None:
-        """Recibe mensajes de otros procesos y actúa dependiendo del tipo de mensaje."""
-        while CHANNEL.iprobe():
-            message: ChunkAssignment | WorkerDone = CHANNEL.recv()
+        """Espera el resultado de algún Worker y recibe todos los que ya hayan llegado. Los resultados se guardan en el buffer de reordenamiento."""
+        with STATS.measure("root_wait"):
+            self.receive(CHANNEL.recv(source=MPI.ANY_SOURCE))
 
-            match message:
-                case ChunkAssignment(chunk_number):
-                    result = self.chunk_processor(self.filename, chunk_number)
-                    self.workload = WorkLoad(chunk_number, result)
-                    
-                    if self.done_callback:
-                        self.done_callback(self.outfile, self.workload.chunk, self.workload.result)
-                case WorkerDone(_):
-                    self.current_chunk += 1
-                case Finalize():
-                    sys.exit(0)
+        while CHANNEL.iprobe(source=MPI.ANY_SOURCE):
+            self.receive(CHANNEL.recv(source=MPI.ANY_SOURCE))
+
+    def receive(self, message: ChunkResult) -> None:
+        """Guarda el resultado de un Worker en el buffer de reordenamiento y actualiza el rendimiento medido.
+
+        Args:
+            message (ChunkResult): El resultado recibido.
+        """
+        self.assigned[message.worker_rank] -= 1
+        size = len(message.result[0] if isinstance(message.result, tuple) else message.result)
+        self.pending[message.chunk_number] = (message.result, size)
+        self.buffered += size
+        input_size = self.input_sizes.get(message.chunk_number, 0)
+
+        if input_size and message.elapsed > 0:
+            throughput = input_size / message.elapsed
+            self.throughput = throughput if self.throughput is None else (self.throughput + throughput) / 2
 
     def write_output(self) -> None:
-        """Escribe el resultado buffereado al archivo de salida."""
-        with open(self.outfile, "ab") as out:
-            out.write(self.workload.result)
-
-        self.workload = None
-        message = WorkerDone(RANK)
-        Process.broadcast(message)
-        self.current_chunk += 1
-    
-    def notify_holder(chunk_number: int) -> None:
-        for i in range(1, CLUSTER_SIZE):
-            if i != RANK:
-                CHANNEL.isend(1, i, chunk_number)
+        """Escribe al archivo de salida, en orden, todos los resultados del buffer de reordenamiento a los que ya les llegó su turno."""
+        while len(self.output_sizes) in self.pending:
+            chunk_number = len(self.output_sizes)
+            result, size = self.pending.pop(chunk_number)
+            self.buffered -= size
 
-    def wait(chunk_number: int) -> None:
-        CHANNEL.Probe(tag=chunk_number)
+            if self.done_callback:
+                self.out.flush()
+                result = self.done_callback(self.outfile, chunk_number, result)
 
-class Root(Process):
-    """Proceso principal en un entorno de paralelismo. Está encargado de coordinar al resto de procesos y asignarles el trabajo que deben hacer."""
-    free_workers: collections.deque[int]
-    total_chunks: int
+            with STATS.measure("chunk_write"):
+                self.out.write(result)
+
+            self.output_sizes.append((len(result), self.input_sizes.get(chunk_number, 0)))
+
+    def finalize(self) -> None:
+        """Ejecuta finish_callback, envía una señal de fin al resto de procesos y termina la ejecución del entorno de paralelismo."""
+        if self.finish_callback:
+            self.finish_callback(self.outfile, self.output_sizes)
+
+        Process.broadcast(Finalize())
+
+        if STATS.enabled:
+            self.rank_stats = Process.gather_stats()
+
+        MPI.Finalize()
+
+class CollectiveWorker(Process):
+    """Proceso que, junto con todos los demás incluido el de rango 0, procesa un archivo por rondas y escribe los resultados en paralelo con MPI-IO.
+    En cada ronda, el proceso de rango k procesa la parte ronda * CLUSTER_SIZE + k. La posición de cada resultado en el archivo de salida
+    se calcula con un prefijo exclusivo de los tamaños (Exscan) y todos los procesos escriben a la vez con Write_at_all, sin turnos ni un único escritor.
+    Con las estadísticas habilitadas, rank_stats guarda al terminar las de todos los procesos en el de rango 0.
+    """
+    filename: str
     outfile: str
+    chunk_size: int
+    total_size: int
+    total_chunks: int
+    chunk_sizes: list[int] | None
+    header: bytes
+    chunk_processor: Callable[[str, int], Any]
+    resolve_callback: Callable[[Any, bytes], bytes | bytearray] | None
+    finish_callback: Callable[[str, list[tuple[int, int]]], None] | None
+    rank_stats: list[dict[str, Any]] | None
 
-    def __init__(self, filename: str, outfile: str, chunk_size: int) -> None:
-        """Proceso principal en un entorno de paralelismo. Está encargado de coordinar al resto de procesos y asignarles el trabajo que deben hacer.
+    def __init__(self, filename: str, outfile: str, chunk_size: int, chunk_processor: Callable[[str, int], Any], total_chunks: int | None = None, header: bytes = b"", chunk_sizes: list[int] | None = None) -> None:
+        """Proceso que procesa un archivo por rondas junto con todos los demás y escribe los resultados en paralelo con MPI-IO.
 
         Args:
             filename (str): El archivo a procesar.
             outfile (str): El archivo donde se va a escribir el resultado de procesar el archivo de entrada.
             chunk_size (int): Tamaño de cada parte del archivo.
+            chunk_processor ((str, int) -> Any): Función que indica como se va a procesar cada parte del archivo de entrada.
+            total_chunks (int | None): Número de partes a procesar. Por defecto se calcula a partir del tamaño del archivo.
+            header (bytes): Bytes que el proceso de rango 0 escribe al inicio del archivo de salida, antes de los resultados.
+            chunk_sizes (list[int] | None): Tamaño en la entrada de cada parte, si las partes no son de chunk_size bytes, como en un archivo comprimido con varios archivos.
+            Si se especifica, total_chunks es por defecto el número de tamaños.
         """
         super().__init__()
-        self.free_workers = collections.deque(range(1, CLUSTER_SIZE))
-        total_workload = os.stat(filename).st_size
-        self.total_chunks = math.ceil(total_workload / chunk_size)
+        self.filename = filename
         self.outfile = outfile
+        self.chunk_size = chunk_size
+        self.total_size = os.stat(filename).st_size
+        self.chunk_sizes = chunk_sizes
+        self.total_chunks = total_chunks if total_chunks is not None else len(chunk_sizes) if chunk_sizes is not None else math.ceil(self.total_size / chunk_size)
+        self.header = header
+        self.chunk_processor = chunk_processor
+        self.resolve_callback = None
+        self.finish_callback = None
+        self.rank_stats = None
 
-        with open(outfile, "wb") as _:
-            pass
-    
-    def process_loop(self) -> None:
-        self.dispatch()
-        self.handle_messages()
-        self.handle_finalize()
+    def when_resolving(self, resolve_callback: Callable[[Any, bytes], bytes | bytearray]) -> None:
+        """Inscribe una función que completa el resultado de una parte a partir de los últimos WINDOW_SIZE bytes de la parte anterior.
+        Cada proceso recibe esos bytes del proceso que procesó la parte anterior, por lo que solo esta corrección se hace en cadena.
 
-    def dispatch(self) -> None:
-        """Asigna trabajo a los Workers que estén disponibles."""
-        while len(self.free_workers) > 0 and self.current_chunk < self.total_chunks:
-            worker = self.free_workers.popleft()
-            message = ChunkAssignment(self.current_chunk)
-            CHANNEL.isend(message, worker)
-            self.current_chunk += 1
+        Args:
+            resolve_callback ((T, bytes) -> bytes | bytearray): La función. Recibe el resultado de chunk_processor y los últimos bytes
+            de la parte anterior, y retorna lo que se va a escribir.
+        """
+        self.resolve_callback = resolve_callback
 
-    def handle_messages(self) -> None:
-        """Recibe mensajes de los otros procesos y actúa dependiendo del tipo de mensaje."""
-        while CHANNEL.iprobe():
-            message: WorkerDone = CHANNEL.recv()
-            self.free_workers.append(message.worker_rank)
-
-    def handle_finalize(self) -> None:
-        """Envía una señal de fin al resto de procesos y termina la ejecución del entorno de paralelismo."""
-        if len(self.free_workers) == CLUSTER_SIZE - 1 and self.current_chunk == self.total_chunks:
-            Process.broadcast(Finalize())
-            self.running = False
-            time.sleep(0.03)
-            MPI.Finalize()
\ No newline at end of file
+    def when_finished(self, finish_callback: Callable[[str, list[tuple[int, int]]], None]) -> None:
+        """Inscribe una función que el proceso de rango 0 va a ejecutar cuando todas las partes hayan sido escritas al archivo de salida.
+
+        Args:
+            finish_callback ((str, list[tuple[int, int]]) -> None): La función. Recibe el archivo de salida y, para cada parte en orden,
+            el tamaño escrito y el tamaño de la parte en el archivo de entrada.
+        """
+        self.finish_callback = finish_callback
+
+    def input_size(self, chunk_number: int) -> int:
+        """Tamaño de una parte en el archivo de entrada.
+
+        Args:
+            chunk_number (int): El número de la parte.
+        """
+        if self.chunk_sizes is not None:
+            return self.chunk_sizes[chunk_number]
+
+        return max(min(self.chunk_size, self.total_size - chunk_number * self.chunk_size), 0)
+
+    def run(self) -> None:
+        if RANK == 0:
+            with open(self.outfile, "wb") as out:
+                out.write(self.header)
+
+        CHANNEL.Barrier()
+        file = MPI.File.Open(CHANNEL, self.outfile, MPI.MODE_WRONLY)
+        rounds = math.ceil(self.total_chunks / CLUSTER_SIZE)
+        offset = len(self.header)
+        window = b""
+        request = None
+        output_sizes = []
+
+        for round_number in range(rounds):
+            chunk_number = round_number * CLUSTER_SIZE + RANK
+            has_chunk = chunk_number < self.total_chunks
+            result = b""
+
+            if has_chunk:
+                with STATS.measure("chunk_compute"):
+                    result = self.chunk_processor(self.filename, chunk_number)
+
+            if self.resolve_callback:
+                if chunk_number > 0:
+                    with STATS.measure("window_wait"):
+                        window = CHANNEL.recv(source=(RANK - 1) % CLUSTER_SIZE)
+
+                if has_chunk:
+                    result = self.resolve_callback(result, window)
+
+                window = (window + result[-WINDOW_SIZE:])[-WINDOW_SIZE:]
+
+                if request:
+                    request.wait()
+
+                if chunk_number + 1 < rounds * CLUSTER_SIZE:
+                    request = CHANNEL.isend(window, (RANK + 1) % CLUSTER_SIZE)
+
+            size = len(result)
+            position = CHANNEL.exscan(size) or 0
+
+            with STATS.measure("chunk_write"):
+                file.Write_at_all(offset + position, result)
+
+            offset += CHANNEL.allreduce(size)
+            input_size = self.input_size(chunk_number) if has_chunk else 0
+            sizes = CHANNEL.gather((size, input_size), root=0)
+
+            if RANK == 0:
+                output_sizes += sizes[:self.total_chunks - round_number * CLUSTER_SIZE]
+
+        if request:
+            request.wait()
+
+        file.Close()
+
+        if STATS.enabled:
+            self.rank_stats = Process.gather_stats()
+
+        if RANK == 0 and self.finish_callback:
+            self.finish_callback(self.outfile, output_sizes)
@@ -1,5 +1,92 @@
 from __future__ import annotations
-from constants import LENGTH_MASK, OFFSET_BITS, OFFSET_MASK, REF_BYTE_LENGTH
+
+from dataclasses import dataclass, field
+from constants import LENGTH_BITS, MAX_POINTER_BITS, MAX_WINDOW_BITS, MIN_LENGTH_BITS, MIN_WINDOW_BITS, OFFSET_BITS
+
+FIXED = "fixed"
+VARINT = "varint"
+HUFFMAN = "huffman"
+CODECS = [FIXED, VARINT, HUFFMAN]
+
+@dataclass(frozen=True)
+class TokenFormat:
+    """Geometría de las referencias serializadas: cuántos bits ocupan la distancia y la longitud, y cómo se codifican.
+    Se elige al comprimir y se guarda en el encabezado del archivo comprimido para que el descompresor la pueda leer.
+
+    Con el codificador FIXED cada posición se escribe como una referencia de ref_byte_length bytes, como en el formato original.
+    Con el codificador VARINT se escriben secuencias de literales seguidas de una coincidencia, con números de longitud variable.
+    Con el codificador HUFFMAN esas mismas secuencias se codifican con códigos de Huffman canónicos calculados para cada bloque,
+    salvo en los bloques en los que ocupan menos con el codificador VARINT. Un byte al inicio de cada bloque indica cuál de los dos se usó.
+    En todos los casos offset_bits y length_bits limitan el tamaño de la ventana y la longitud de las coincidencias.
+
+    Attributes:
+        offset_bits (int): Número de bits de la distancia. La ventana de referencia tiene 2**offset_bits - 1 bytes.
+        length_bits (int): Número de bits de la longitud. Las secuencias tienen a lo sumo 2**length_bits - 1 bytes.
+        codec (str): Codificador de las referencias, FIXED, VARINT o HUFFMAN.
+        pointer_bytes (int): Número de bytes que ocupan la distancia y la longitud juntas.
+        ref_byte_length (int): Número de bytes de cada referencia, incluyendo el siguiente byte.
+        window_size (int): Tamaño de la ventana de referencia.
+        max_ref_length (int): Longitud máxima de una secuencia.
+        offset_mask (int): Máscara que extrae la distancia de los bits empaquetados.
+    """
+    offset_bits: int = OFFSET_BITS
+    length_bits: int = LENGTH_BITS
+    codec: str = FIXED
+    pointer_bytes: int = field(init=False)
+    ref_byte_length: int = field(init=False)
+    window_size: int = field(init=False)
+    max_ref_length: int = field(init=False)
+    offset_mask: int = field(init=False)
+
+    def __post_init__(self) -> None:
+        """Valida la geometría y calcula los valores derivados.
+
+        Raises:
+            ValueError: Si el número de bits de la distancia o de la longitud está fuera de los límites soportados, o si el codificador no existe.
+        """
+        if self.codec not in CODECS:
+            raise ValueError(f"Codificador no soportado: {self.codec}")
+
+        if not MIN_WINDOW_BITS <= self.offset_bits <= MAX_WINDOW_BITS:
+            raise ValueError(f"La distancia debe ocupar entre {MIN_WINDOW_BITS} y {MAX_WINDOW_BITS} bits")
+
+        if not MIN_LENGTH_BITS <= self.length_bits or self.offset_bits + self.length_bits > MAX_POINTER_BITS:
+            raise ValueError(f"La longitud debe ocupar al menos {MIN_LENGTH_BITS} bits y junto con la distancia a lo sumo {MAX_POINTER_BITS} bits")
+
+        pointer_bytes = (self.offset_bits + self.length_bits + 7) // 8
+        object.__setattr__(self, "pointer_bytes", pointer_bytes)
+        object.__setattr__(self, "ref_byte_length", pointer_bytes + 1)
+        object.__setattr__(self, "window_size", 2**self.offset_bits - 1)
+        object.__setattr__(self, "max_ref_length", 2**self.length_bits - 1)
+        object.__setattr__(self, "offset_mask", 2**self.offset_bits - 1)
+
+DEFAULT_FORMAT = TokenFormat()
+
+def write_varint(output: bytearray, value: int) -> None:
+    """Escribe un entero no negativo con una codificación de longitud variable: 7 bits por byte, empezando por los menos significativos.
+    El bit más alto de cada byte indica si siguen más bytes.
+
+    Args:
+        output (bytearray): Buffer de salida.
+        value (int): El número a escribir.
+    """
+    while value >= 0x80:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    output.append(value)
+
+def varint_accepts(length: int, distance: int) -> bool:
+    """Indica si una coincidencia ocupa menos bytes que los literales que reemplaza con el codificador VARINT.
+
+    Args:
+        length (int): Longitud de la coincidencia.
+        distance (int): Distancia de la coincidencia.
+
+    Returns:
+        bool: Verdadero si vale la pena usar la coincidencia.
+    """
+    return length > (distance.bit_length() + 6) // 7 + 2
 
 class Reference:
     """Referencia a una sequencia de bytes encontrada anteriormente. Comprime la misma sequencia si se vuelve a encontrar. 
@@ -25,31 +112,36 @@ class Reference:
         self.next_byte = next_byte
     
     @staticmethod
-    def from_bytes(buffer: bytes) -> Reference:
+    def from_bytes(buffer: bytes, token_format: TokenFormat = DEFAULT_FORMAT) -> Reference:
         """Construye una referencia a una sequencia de bytesencontrada anteriormente a partir de su representación en bytes. 
 
         Args:
             buffer (bytes): Representación en bytes de la referencia.
+            token_format (TokenFormat): Geometría con la que se serializó la referencia.
 
         Returns:
             Reference: Una nueva instancia de clase referencia.
         """
-        next_byte = buffer[2]
-        int_value = int.from_bytes(buffer[:2], "big")
-        length = (int_value & LENGTH_MASK) >> OFFSET_BITS
-        offset = int_value & OFFSET_MASK
+        pointer_bytes = token_format.pointer_bytes
+        next_byte = buffer[pointer_bytes]
+        int_value = int.from_bytes(buffer[:pointer_bytes], "big")
+        length = int_value >> token_format.offset_bits
+        offset = int_value & token_format.offset_mask
 
         return Reference(offset, length, next_byte)
 
-    def to_bytes(self) -> bytes:
+    def to_bytes(self, token_format: TokenFormat = DEFAULT_FORMAT) -> bytes:
         """Serializa la referencia y la convierte a su representanción en bytes.
 
+        Args:
+            token_format (TokenFormat): Geometría con la que se va a serializar la referencia.
+
         Returns:
             bytes: La referencia como una secuencia de bytes.
         """
-        packed_bits = (((self.length << OFFSET_BITS) + self.offset) << 8) + self.next_byte
+        packed_bits = (((self.length << token_format.offset_bits) + self.offset) << 8) + self.next_byte
 
-        return packed_bits.to_bytes(REF_BYTE_LENGTH, "big")
+        return packed_bits.to_bytes(token_format.ref_byte_length, "big")
     
     def __str__(self) -> str:
         return f"Reference(offset={self.offset}, length={self.length}, next={self.next_byte})"
\ No newline at end of file
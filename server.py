@@ -0,0 +1,584 @@
+import asyncio
+import io
+import json
+import os
+import signal
+import socket
+import struct
+import time
+import zlib
+
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, AsyncIterator, BinaryIO, Callable
+from compresor import compress_block
+from constants import CHUNK_SIZE, LENGTH_BITS, MAX_CHAIN_DEPTH, OFFSET_BITS
+from container import Block, build_index, pack_header, read_container, write_index
+from descompresor import check_block, decode_block
+from dictionary import check_dictionary, dictionary_id, load_dictionary
+from matcher import MATCHERS, HashChainMatcher, build_matcher
+from parsing import build_level
+from reference import CODECS, DEFAULT_FORMAT, TokenFormat
+from stats import Stats, summarize
+from stream import compress_bytes, decompress_bytes
+
+COMPRESS = 1
+DECOMPRESS = 2
+METRICS = 3
+
+DATA = 0
+END = 1
+ERROR = 2
+
+REQUEST = struct.Struct(">BIQ")
+RESPONSE = struct.Struct(">BIQ")
+MAX_REQUEST_SIZE = 2**30
+MAX_PENDING = 32
+BATCH_DELAY = 0.001
+BATCH_BYTES = CHUNK_SIZE
+BATCH_COUNT = 64
+LATENCY_RESOLUTION = 10_000
+
+@dataclass
+class ServerConfig:
+    """Parámetros de compresión del servidor. Se envían una sola vez a cada proceso del pool.
+
+    Attributes:
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        token_format (TokenFormat): Geometría y codificador de las referencias.
+        dictionary (bytes): Diccionario usado como ventana inicial de cada bloque, o bytes vacíos. También se acepta al descomprimir.
+    """
+    matcher: Callable = HashChainMatcher
+    token_format: TokenFormat = DEFAULT_FORMAT
+    dictionary: bytes = b""
+
+CONFIG = ServerConfig()
+
+def configure(config: ServerConfig) -> None:
+    """Inicializa un proceso del pool con los parámetros del servidor.
+
+    Args:
+        config (ServerConfig): Los parámetros.
+    """
+    global CONFIG
+    CONFIG = config
+
+def request_dictionary(payload: bytes, config: ServerConfig) -> bytes:
+    """Elige el diccionario con el que se descomprimen unos datos: el del servidor si los datos lo usan, o ninguno.
+
+    Args:
+        payload (bytes): Los datos comprimidos.
+        config (ServerConfig): Los parámetros del servidor.
+    """
+    container = read_container(io.BytesIO(payload))
+
+    return config.dictionary if container and container.dictionary_id else b""
+
+def process_batch(operations: list[tuple[int, bytes]]) -> list[tuple[bool, bytes]]:
+    """Comprime o descomprime varias solicitudes pequeñas en un proceso del pool, para pagar una sola vez el envío entre procesos.
+
+    Args:
+        operations (list[tuple[int, bytes]]): Operación y datos de cada solicitud.
+
+    Returns:
+        list[tuple[bool, bytes]]: Para cada solicitud, si tuvo éxito y su resultado, o el mensaje de error codificado en UTF-8.
+    """
+    results = []
+
+    for operation, payload in operations:
+        try:
+            if operation == COMPRESS:
+                results.append((True, compress_bytes(payload, CONFIG.matcher, token_format=CONFIG.token_format, dictionary=CONFIG.dictionary)))
+            else:
+                results.append((True, decompress_bytes(payload, request_dictionary(payload, CONFIG))))
+        except Exception as error:
+            results.append((False, str(error).encode()))
+
+    return results
+
+def compress_task(block: bytes) -> tuple[bytes, int]:
+    """Comprime un bloque de una solicitud grande en un proceso del pool.
+
+    Args:
+        block (bytes): El bloque sin comprimir.
+
+    Returns:
+        tuple[bytes, int]: El bloque comprimido y el CRC32 del bloque sin comprimir.
+    """
+    return bytes(compress_block(block, CONFIG.matcher, CONFIG.token_format, CONFIG.dictionary)), zlib.crc32(block)
+
+def decompress_task(chunk: bytes, token_format: TokenFormat, block: Block, block_number: int, use_dictionary: bool) -> bytes:
+    """Descomprime y comprueba un bloque de una solicitud grande en un proceso del pool.
+
+    Args:
+        chunk (bytes): El bloque comprimido.
+        token_format (TokenFormat): Geometría y codificador de las referencias de los datos comprimidos.
+        block (Block): La entrada del índice del bloque.
+        block_number (int): El número del bloque.
+        use_dictionary (bool): Si los datos se comprimieron con el diccionario del servidor.
+
+    Raises:
+        ValueError: Si el bloque está dañado.
+    """
+    output = decode_block(chunk, token_format, CONFIG.dictionary if use_dictionary else b"")
+    check_block(output, block, block_number)
+
+    return bytes(output)
+
+def raw_task(payload: bytes) -> bytes:
+    """Descomprime en un proceso del pool datos en el formato original sin encabezado, cuyas partes dependen de las anteriores.
+
+    Args:
+        payload (bytes): Los datos comprimidos.
+    """
+    return decompress_bytes(payload)
+
+def percentiles(histogram: Counter, points: tuple[float, ...] = (0.5, 0.9, 0.99)) -> dict[str, float]:
+    """Calcula percentiles de latencia a partir de un histograma en unidades de 1 / LATENCY_RESOLUTION segundos.
+
+    Args:
+        histogram (Counter): Número de solicitudes por latencia.
+        points (tuple[float, ...]): Los percentiles, entre 0 y 1.
+
+    Returns:
+        dict[str, float]: Latencia de cada percentil en milisegundos.
+    """
+    total = sum(histogram.values())
+    values = sorted(histogram.items())
+    result = {}
+
+    for point in points:
+        seen = 0
+
+        for latency, count in values:
+            seen += count
+
+            if seen >= point * total:
+                result[f"p{round(point * 100)}"] = latency * 1000 / LATENCY_RESOLUTION
+                break
+
+    return result
+
+class CompressionServer:
+    """Servicio de compresión de larga duración sobre un socket Unix o TCP.
+    Cada solicitud es un encabezado REQUEST (operación, identificador y longitud) seguido de los datos, y cada respuesta es una serie de marcos RESPONSE
+    (tipo, identificador y longitud) con los datos: marcos DATA seguidos de un marco END, o de un marco ERROR con el mensaje.
+    Un cliente puede enviar varias solicitudes sin esperar las respuestas, que se distinguen por su identificador.
+
+    Las solicitudes pequeñas se agrupan durante BATCH_DELAY segundos, o hasta BATCH_BYTES bytes, y cada grupo se procesa en una sola tarea del pool.
+    Las grandes se dividen en bloques que se procesan en paralelo y se envían en orden a medida que terminan.
+    El servidor deja de leer de una conexión con MAX_PENDING solicitudes sin responder y espera a que el cliente lea antes de enviar más datos,
+    y nunca tiene más de 2 bloques por proceso del pool a la vez.
+
+    Attributes:
+        config (ServerConfig): Parámetros de compresión.
+        workers (int): Número de procesos del pool.
+        executor (ProcessPoolExecutor): El pool de procesos.
+        slots (asyncio.Semaphore): Bloques de solicitudes grandes que aún se pueden enviar al pool.
+        metrics (Stats): Contadores, tiempos e histograma de latencias de las solicitudes.
+        started (float): Momento en el que se inició el servidor.
+    """
+
+    def __init__(self, config: ServerConfig, workers: int | None = None) -> None:
+        """Crea el pool de procesos.
+
+        Args:
+            config (ServerConfig): Parámetros de compresión.
+            workers (int | None): Número de procesos del pool. Por defecto es el número de núcleos disponibles.
+        """
+        self.config = config
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.workers, initializer=configure, initargs=(config,))
+        self.slots = asyncio.Semaphore(2 * self.workers)
+        self.batch: list[tuple[int, bytes, asyncio.Future]] = []
+        self.batch_size = 0
+        self.batch_timer: asyncio.TimerHandle | None = None
+        self.metrics = Stats(enabled=True)
+        self.started = time.perf_counter()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Atiende una conexión: lee solicitudes mientras haya menos de MAX_PENDING sin responder y responde cada una en su propia tarea.
+
+        Args:
+            reader (asyncio.StreamReader): Lectura de la conexión.
+            writer (asyncio.StreamWriter): Escritura de la conexión.
+        """
+        pending = asyncio.Semaphore(MAX_PENDING)
+        lock = asyncio.Lock()
+        tasks = set()
+        self.metrics.count("connections")
+
+        try:
+            while True:
+                await pending.acquire()
+
+                try:
+                    operation, request_id, length = REQUEST.unpack(await reader.readexactly(REQUEST.size))
+
+                    if length > MAX_REQUEST_SIZE:
+                        await self.send(writer, lock, ERROR, request_id, f"La solicitud pasa de {MAX_REQUEST_SIZE} bytes".encode())
+                        break
+
+                    payload = await reader.readexactly(length)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+
+                task = asyncio.create_task(self.respond(operation, request_id, payload, writer, lock, pending))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+            await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def send(self, writer: asyncio.StreamWriter, lock: asyncio.Lock, kind: int, request_id: int, data: bytes) -> None:
+        """Envía un marco de respuesta y espera a que el cliente lo lea si hay demasiados datos sin enviar.
+
+        Args:
+            writer (asyncio.StreamWriter): Escritura de la conexión.
+            lock (asyncio.Lock): Evita que se mezclen los marcos de distintas respuestas.
+            kind (int): DATA, END o ERROR.
+            request_id (int): Identificador de la solicitud.
+            data (bytes): Contenido del marco.
+        """
+        async with lock:
+            writer.write(RESPONSE.pack(kind, request_id, len(data)))
+            writer.write(data)
+            await writer.drain()
+
+        self.metrics.count("bytes_out", len(data))
+
+    async def respond(self, operation: int, request_id: int, payload: bytes, writer: asyncio.StreamWriter, lock: asyncio.Lock, pending: asyncio.Semaphore) -> None:
+        """Procesa una solicitud, envía su respuesta y registra su latencia.
+
+        Args:
+            operation (int): COMPRESS, DECOMPRESS o METRICS.
+            request_id (int): Identificador de la solicitud.
+            payload (bytes): Los datos de la solicitud.
+            writer (asyncio.StreamWriter): Escritura de la conexión.
+            lock (asyncio.Lock): Evita que se mezclen los marcos de distintas respuestas.
+            pending (asyncio.Semaphore): Solicitudes sin responder de la conexión. Se libera al terminar.
+        """
+        started = time.perf_counter()
+        self.metrics.count("requests")
+        self.metrics.count("bytes_in", len(payload))
+        send = partial(self.send, writer, lock)
+
+        try:
+            if operation == METRICS:
+                await send(DATA, request_id, json.dumps(self.report()).encode())
+            elif operation not in (COMPRESS, DECOMPRESS):
+                raise ValueError(f"Operación no soportada: {operation}")
+            elif len(payload) <= BATCH_BYTES:
+                await send(DATA, request_id, await self.submit_small(operation, payload))
+            elif operation == COMPRESS:
+                async for data in self.compress_large(payload):
+                    await send(DATA, request_id, data)
+            else:
+                async for data in self.decompress_large(payload):
+                    await send(DATA, request_id, data)
+
+            await send(END, request_id, b"")
+        except Exception as error:
+            self.metrics.count("errors")
+
+            try:
+                await send(ERROR, request_id, str(error).encode())
+            except ConnectionError:
+                pass
+        finally:
+            pending.release()
+            latency = time.perf_counter() - started
+            self.metrics.add_time("latency", latency)
+            self.metrics.observe("latency", Counter({round(latency * LATENCY_RESOLUTION): 1}))
+
+    def submit_small(self, operation: int, payload: bytes) -> asyncio.Future:
+        """Agrega una solicitud pequeña al grupo en curso, que se envía al pool cuando se llena o cuando pasan BATCH_DELAY segundos.
+
+        Args:
+            operation (int): COMPRESS o DECOMPRESS.
+            payload (bytes): Los datos de la solicitud.
+
+        Returns:
+            asyncio.Future: El resultado de la solicitud.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.batch.append((operation, payload, future))
+        self.batch_size += len(payload)
+
+        if self.batch_size >= BATCH_BYTES or len(self.batch) >= BATCH_COUNT:
+            self.flush_batch()
+        elif self.batch_timer is None:
+            self.batch_timer = loop.call_later(BATCH_DELAY, self.flush_batch)
+
+        return future
+
+    def flush_batch(self) -> None:
+        """Envía el grupo de solicitudes pequeñas en curso al pool."""
+        if self.batch_timer:
+            self.batch_timer.cancel()
+            self.batch_timer = None
+
+        batch, self.batch, self.batch_size = self.batch, [], 0
+
+        if not batch:
+            return
+
+        self.metrics.count("batches")
+        self.metrics.observe("batch_requests", Counter({len(batch): 1}))
+        futures = [future for _, _, future in batch]
+        task = asyncio.get_running_loop().run_in_executor(self.executor, process_batch, [(operation, payload) for operation, payload, _ in batch])
+        task.add_done_callback(lambda done: self.finish_batch(futures, done))
+
+    @staticmethod
+    def finish_batch(futures: list[asyncio.Future], done: asyncio.Future) -> None:
+        """Entrega a cada solicitud de un grupo su resultado.
+
+        Args:
+            futures (list[asyncio.Future]): Los resultados pendientes de las solicitudes del grupo, en orden.
+            done (asyncio.Future): La tarea del pool que procesó el grupo.
+        """
+        error = done.exception()
+
+        for position, future in enumerate(futures):
+            if future.done():
+                continue
+
+            if error:
+                future.set_exception(error)
+                continue
+
+            ok, result = done.result()[position]
+
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(ValueError(result.decode()))
+
+    async def map_ordered(self, function: Callable[..., Any], arguments: list[tuple]) -> AsyncIterator[Any]:
+        """Ejecuta una función en el pool para cada tupla de argumentos y entrega los resultados en orden.
+        Solo se envían tareas a medida que se consumen los resultados y mientras haya lugar en el pool.
+
+        Args:
+            function ((...) -> T): La función. Debe poder serializarse con pickle.
+            arguments (list[tuple]): Los argumentos de cada tarea.
+
+        Returns:
+            AsyncIterator[T]: Los resultados, en orden.
+        """
+        loop = asyncio.get_running_loop()
+        pending = []
+
+        try:
+            for task_arguments in arguments:
+                while self.slots.locked() and pending:
+                    yield await pending.pop(0)
+
+                await self.slots.acquire()
+                future = loop.run_in_executor(self.executor, function, *task_arguments)
+                future.add_done_callback(lambda _: self.slots.release())
+                pending.append(future)
+
+            while pending:
+                yield await pending.pop(0)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def compress_large(self, payload: bytes) -> AsyncIterator[bytes]:
+        """Comprime una solicitud grande por bloques en paralelo, con el mismo formato que compresor.compress.
+
+        Args:
+            payload (bytes): Los datos sin comprimir.
+
+        Returns:
+            AsyncIterator[bytes]: El encabezado, cada bloque comprimido en orden y el índice de bloques.
+        """
+        config = self.config
+        sizes = []
+        checksums = []
+        blocks = [(payload[start:start + CHUNK_SIZE],) for start in range(0, len(payload), CHUNK_SIZE)]
+
+        yield pack_header(CHUNK_SIZE, config.token_format, dictionary_id(config.dictionary) if config.dictionary else 0)
+
+        async for output, checksum in self.map_ordered(compress_task, blocks):
+            sizes.append((len(output), len(blocks[len(sizes)][0])))
+            checksums.append(checksum)
+            yield output
+
+        index = io.BytesIO()
+        write_index(index, build_index(sizes, checksums))
+
+        yield index.getvalue()
+
+    async def decompress_large(self, payload: bytes) -> AsyncIterator[bytes]:
+        """Descomprime una solicitud grande. Los bloques de un contenedor se descomprimen y comprueban en paralelo,
+        y el formato original, cuyas partes dependen de las anteriores, en una sola tarea.
+
+        Args:
+            payload (bytes): Los datos comprimidos.
+
+        Returns:
+            AsyncIterator[bytes]: Cada bloque descomprimido, en orden.
+
+        Raises:
+            ValueError: Si los datos usan un diccionario distinto al del servidor o si algún bloque está dañado.
+        """
+        container = read_container(io.BytesIO(payload))
+
+        if container is None:
+            async for output in self.map_ordered(raw_task, [(payload,)]):
+                yield output
+
+            return
+
+        use_dictionary = bool(container.dictionary_id)
+        check_dictionary(container.dictionary_id, self.config.dictionary if use_dictionary else b"")
+        tasks = [
+            (payload[block.compressed_offset:block.compressed_offset + block.compressed_size], container.token_format, block, block_number, use_dictionary)
+            for block_number, block in enumerate(container.blocks)
+        ]
+
+        async for output in self.map_ordered(decompress_task, tasks):
+            yield output
+
+    def report(self) -> dict[str, Any]:
+        """Resume las métricas del servidor: contadores, latencia promedio, máxima y por percentil, y rendimiento desde el inicio."""
+        snapshot = self.metrics.snapshot()
+        elapsed = time.perf_counter() - self.started
+        counters = snapshot["counters"]
+
+        return {
+            **summarize(snapshot),
+            "uptime": elapsed,
+            "latency_ms": percentiles(Counter(snapshot["histograms"].get("latency", {}))),
+            "requests_per_second": counters.get("requests", 0) / elapsed,
+            "input_bytes_per_second": counters.get("bytes_in", 0) / elapsed,
+            "output_bytes_per_second": counters.get("bytes_out", 0) / elapsed
+        }
+
+    def close(self) -> None:
+        """Termina los procesos del pool."""
+        self.executor.shutdown(cancel_futures=True)
+
+def read_exactly(file: BinaryIO, size: int) -> bytes:
+    """Lee exactamente size bytes de la respuesta del servidor.
+
+    Args:
+        file (BinaryIO): El socket, abierto como archivo.
+        size (int): Número de bytes a leer.
+
+    Raises:
+        ConnectionError: Si el servidor cerró la conexión antes de enviarlos.
+    """
+    data = file.read(size)
+
+    if len(data) != size:
+        raise ConnectionError(f"El servidor cerró la conexión después de {len(data)} de {size} bytes")
+
+    return data
+
+def request(address: str | tuple[str, int], operation: int, payload: bytes = b"") -> bytes:
+    """Cliente síncrono mínimo: envía una solicitud al servidor y espera su respuesta completa.
+
+    Args:
+        address (str | tuple[str, int]): Ruta del socket Unix, o servidor y puerto TCP.
+        operation (int): COMPRESS, DECOMPRESS o METRICS.
+        payload (bytes): Los datos de la solicitud.
+
+    Returns:
+        bytes: Los datos de la respuesta.
+
+    Raises:
+        ValueError: Si el servidor respondió con un error.
+        ConnectionError: Si el servidor cerró la conexión antes de terminar la respuesta.
+    """
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.connect(address)
+        connection.sendall(REQUEST.pack(operation, 0, len(payload)) + payload)
+        file = connection.makefile("rb")
+        parts = []
+
+        while True:
+            kind, _, length = RESPONSE.unpack(read_exactly(file, RESPONSE.size))
+            data = read_exactly(file, length)
+
+            if kind == DATA:
+                parts.append(data)
+            elif kind == END:
+                return b"".join(parts)
+            else:
+                raise ValueError(data.decode())
+
+async def serve(server: CompressionServer, unix: str | None, host: str, port: int) -> None:
+    """Atiende conexiones hasta recibir SIGINT o SIGTERM.
+
+    Args:
+        server (CompressionServer): El servidor.
+        unix (str | None): Ruta del socket Unix. Si no se especifica se usa TCP.
+        host (str): Dirección TCP.
+        port (int): Puerto TCP.
+    """
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stop.set)
+
+    if unix:
+        listener = await asyncio.start_unix_server(server.handle, unix)
+    else:
+        listener = await asyncio.start_server(server.handle, host, port)
+
+    print(f"Escuchando en {unix or f'{host}:{port}'} con {server.workers} procesos", flush=True)
+
+    async with listener:
+        await stop.wait()
+
+    if unix and os.path.exists(unix):
+        os.remove(unix)
+
+if __name__ == "__main__":
+    parser = ArgumentParser(
+        prog="Servidor LZ77",
+        description="Servicio de compresión y descompresión LZ77 de larga duración sobre un socket Unix o TCP"
+    )
+
+    parser.add_argument("-u", "--unix", help="Ruta del socket Unix. Si no se especifica se escucha por TCP")
+    parser.add_argument("--host", help="Dirección TCP", default="127.0.0.1")
+    parser.add_argument("-p", "--port", help="Puerto TCP", type=int, default=7707)
+    parser.add_argument("-w", "--workers", help="Número de procesos del pool. Por defecto es el número de núcleos", type=int)
+    parser.add_argument("-m", "--matcher", help="Motor de búsqueda de coincidencias", choices=MATCHERS.keys(), default="hash")
+    parser.add_argument("--max-chain", help=f"Número máximo de candidatos a revisar por posición. Por defecto lo determina el nivel, o es {MAX_CHAIN_DEPTH} si no se especifica un nivel", type=int)
+    parser.add_argument("-l", "--level", help="Nivel de compresión: de 1 a 3 análisis voraz, de 4 a 6 perezoso y de 7 a 9 óptimo. Por defecto se usa un análisis voraz", type=int, choices=range(1, 10))
+    parser.add_argument("--window-bits", help="Número de bits de la distancia de cada referencia. La ventana tiene 2**bits - 1 bytes", type=int, default=OFFSET_BITS)
+    parser.add_argument("--length-bits", help="Número de bits de la longitud de cada referencia", type=int, default=LENGTH_BITS)
+    parser.add_argument("--codec", help="Codificación de las referencias", choices=CODECS, default=CODECS[0])
+    parser.add_argument("-D", "--dictionary", help="Diccionario entrenado con dictionary.py que se usa como ventana inicial de cada bloque")
+
+    args = parser.parse_args()
+    matcher = build_matcher(args.matcher, MAX_CHAIN_DEPTH if args.max_chain is None else args.max_chain) if args.level is None else build_level(args.level, args.matcher, args.max_chain)
+
+    try:
+        token_format = TokenFormat(args.window_bits, args.length_bits, args.codec)
+    except ValueError as error:
+        parser.error(str(error))
+
+    config = ServerConfig(matcher, token_format, load_dictionary(args.dictionary) if args.dictionary else b"")
+    server = CompressionServer(config, args.workers)
+
+    try:
+        asyncio.run(serve(server, args.unix, args.host, args.port))
+    finally:
+        server.close()
@@ -0,0 +1,203 @@
+import json
+import time
+
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, ContextManager, Iterator
+
+@dataclass
+class Stats:
+    """Contadores, histogramas y tiempos de una ejecución, para saber en qué se gasta el tiempo de la compresión y la descompresión.
+    Está deshabilitado por defecto: sus métodos retornan sin hacer nada y el código que analiza cada parte revisa detailed antes de hacerlo,
+    de modo que el costo sin --stats es una comparación por parte.
+
+    Attributes:
+        enabled (bool): Si es verdadero se registran las estadísticas.
+        detailed (bool): Si es verdadero también se analizan las coincidencias de cada parte comprimida, que es lo más costoso de registrar.
+        counters (Counter): Contadores por nombre, como los bytes de entrada o los candidatos revisados por el motor de búsqueda.
+        histograms (dict[str, Counter]): Histogramas por nombre, como la longitud de las coincidencias.
+        timings (dict[str, list[float]]): Número de mediciones, tiempo total y tiempo máximo en segundos por nombre.
+        series (dict[str, list[tuple[float, float]]]): Valores muestreados en el tiempo, como segundos desde el inicio y valor.
+        started (float): Momento en el que se crearon o reiniciaron las estadísticas.
+    """
+    enabled: bool = False
+    detailed: bool = False
+    counters: Counter = field(default_factory=Counter)
+    histograms: dict[str, Counter] = field(default_factory=dict)
+    timings: dict[str, list[float]] = field(default_factory=dict)
+    series: dict[str, list[tuple[float, float]]] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+
+    def enable(self, detailed: bool = True) -> None:
+        """Habilita el registro de estadísticas y reinicia las que ya se hayan registrado.
+
+        Args:
+            detailed (bool): Si es falso solo se registran contadores y tiempos, sin analizar las coincidencias de cada parte.
+        """
+        self.enabled = True
+        self.detailed = detailed
+        self.reset()
+
+    def reset(self) -> None:
+        """Descarta todas las estadísticas registradas."""
+        self.counters = Counter()
+        self.histograms = {}
+        self.timings = {}
+        self.series = {}
+        self.started = time.perf_counter()
+
+    def count(self, name: str, value: int | float = 1) -> None:
+        """Suma un valor a un contador.
+
+        Args:
+            name (str): Nombre del contador.
+            value (int | float): Valor a sumar.
+        """
+        if self.enabled:
+            self.counters[name] += value
+
+    def observe(self, name: str, values: Counter) -> None:
+        """Suma las ocurrencias de cada valor a un histograma.
+
+        Args:
+            name (str): Nombre del histograma.
+            values (Counter): Número de ocurrencias de cada valor.
+        """
+        if self.enabled:
+            self.histograms.setdefault(name, Counter()).update(values)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """Registra una medición de tiempo.
+
+        Args:
+            name (str): Nombre de la medición.
+            seconds (float): Duración en segundos.
+        """
+        if self.enabled:
+            timing = self.timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+    def measure(self, name: str) -> ContextManager:
+        """Mide el tiempo que tarda un bloque with y lo registra con add_time.
+
+        Args:
+            name (str): Nombre de la medición.
+        """
+        return self.timed(name) if self.enabled else nullcontext()
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        """Mide el tiempo que tarda un bloque with aunque las estadísticas estén deshabilitadas.
+
+        Args:
+            name (str): Nombre de la medición.
+        """
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def sample(self, name: str, value: int | float) -> None:
+        """Registra el valor actual de una serie junto con los segundos transcurridos desde el inicio.
+
+        Args:
+            name (str): Nombre de la serie.
+            value (int | float): Valor actual.
+        """
+        if self.enabled:
+            self.series.setdefault(name, []).append((round(time.perf_counter() - self.started, 6), value))
+
+    def snapshot(self) -> dict[str, Any]:
+        """Retorna las estadísticas registradas en un diccionario que se puede serializar con pickle o JSON."""
+        return {
+            "counters": dict(self.counters),
+            "histograms": {name: dict(histogram) for name, histogram in self.histograms.items()},
+            "timings": {name: list(timing) for name, timing in self.timings.items()},
+            "series": {name: list(values) for name, values in self.series.items()}
+        }
+
+    def merge(self, snapshot: dict[str, Any]) -> None:
+        """Suma a estas estadísticas las de otro proceso.
+
+        Args:
+            snapshot (dict[str, Any]): Estadísticas del otro proceso, obtenidas con snapshot.
+        """
+        self.counters.update(snapshot["counters"])
+
+        for name, histogram in snapshot["histograms"].items():
+            self.histograms.setdefault(name, Counter()).update({int(value): count for value, count in histogram.items()})
+
+        for name, (count, total, longest) in snapshot["timings"].items():
+            timing = self.timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += count
+            timing[1] += total
+            timing[2] = max(timing[2], longest)
+
+        for name, values in snapshot["series"].items():
+            self.series.setdefault(name, []).extend(values)
+
+STATS = Stats()
+
+def collect(function: Callable[..., Any], *args: Any, detailed: bool = True) -> tuple[Any, dict[str, Any]]:
+    """Ejecuta una función en un proceso del pool local con las estadísticas habilitadas.
+    Retorna su resultado junto con las estadísticas que registró, para que el proceso principal las sume con Stats.merge.
+
+    Args:
+        function ((...) -> T): La función.
+        *args (Any): Argumentos de la función.
+        detailed (bool): Si es verdadero también se analizan las coincidencias de cada parte, como en el proceso principal.
+    """
+    STATS.enable(detailed)
+
+    with STATS.measure("chunk_compute"):
+        result = function(*args)
+
+    return result, STATS.snapshot()
+
+def summarize(snapshot: dict[str, Any]) -> dict[str, Any]:
+    """Agrega a unas estadísticas los valores derivados: candidatos revisados por byte, proporción de literales y tiempo promedio de cada medición.
+
+    Args:
+        snapshot (dict[str, Any]): Las estadísticas.
+    """
+    counters = snapshot["counters"]
+    derived = {}
+
+    if counters.get("probed_bytes"):
+        derived["probes_per_byte"] = counters["probes"] / counters["probed_bytes"]
+
+    if counters.get("input_bytes") and "literal_bytes" in counters:
+        derived["literal_ratio"] = counters["literal_bytes"] / counters["input_bytes"]
+
+    timings = {
+        name: {"count": count, "total": total, "max": longest, "mean": total / count if count else 0.0}
+        for name, (count, total, longest) in snapshot["timings"].items()
+    }
+
+    return {**snapshot, "timings": timings, "derived": derived, "series": {name: sorted(values) for name, values in snapshot["series"].items()}}
+
+def write_stats(filename: str, snapshots: list[dict[str, Any]]) -> None:
+    """Escribe en JSON las estadísticas de cada proceso y su total.
+
+    Args:
+        filename (str): Archivo de salida.
+        snapshots (list[dict[str, Any]]): Estadísticas de cada proceso, en orden de rango.
+    """
+    total = Stats()
+
+    for snapshot in snapshots:
+        total.merge(snapshot)
+
+    report = {
+        "processes": len(snapshots),
+        "total": summarize(total.snapshot()),
+        "per_process": [summarize(snapshot) for snapshot in snapshots]
+    }
+
+    with open(filename, "w") as file:
+        json.dump(report, file, indent=2)
@@ -0,0 +1,323 @@
+import io
+import shutil
+import tempfile
+import zlib
+
+from typing import BinaryIO, Callable, Iterator
+from compresor import compress_block, process_chunk
+from constants import CHUNK_SIZE, REF_BYTE_LENGTH
+from container import MAGIC, build_index, pack_header, read_container, write_index
+from descompresor import decode_stream, decompress_blocks
+from dictionary import check_dictionary, dictionary_id, resolve_dictionary
+from matcher import HashChainMatcher
+from reference import DEFAULT_FORMAT, TokenFormat
+
+SPOOL_SIZE = 2**24
+RAW_CHUNK_SIZE = CHUNK_SIZE - 1
+
+def read_tokens(file: BinaryIO, prefix: bytes = b"") -> Iterator[bytes]:
+    """Lee en partes de RAW_CHUNK_SIZE bytes un archivo en el formato original, que puede ser una tubería.
+    Una lectura puede retornar menos bytes de los pedidos, así que se junta lo leído hasta completar la parte, y cada parte contiene un número entero de referencias.
+
+    Args:
+        file (BinaryIO): Archivo comprimido de entrada.
+        prefix (bytes): Bytes ya leídos del inicio del archivo.
+
+    Returns:
+        Iterator[bytes]: Las partes comprimidas, en orden.
+
+    Raises:
+        ValueError: Si el archivo termina con bytes que no forman una referencia completa.
+    """
+    pending = bytearray(prefix)
+    finished = False
+
+    while not finished:
+        while len(pending) < RAW_CHUNK_SIZE:
+            data = file.read(RAW_CHUNK_SIZE - len(pending))
+
+            if not data:
+                finished = True
+                break
+
+            pending += data
+
+        if finished and len(pending) % REF_BYTE_LENGTH:
+            raise ValueError(f"El archivo comprimido termina con {len(pending) % REF_BYTE_LENGTH} bytes que no forman una referencia completa")
+
+        if pending:
+            yield bytes(pending)
+            pending = bytearray()
+
+class LZ77Writer(io.BufferedIOBase):
+    """Archivo de solo escritura que comprime con el algoritmo LZ77 lo que se escribe en él, parte por parte.
+    Solo guarda la parte en curso y, en el formato original, la ventana que la precede, por lo que la memoria usada no depende del tamaño de los datos.
+    La salida se escribe en orden y sin volver atrás, así que puede ser una tubería. El índice de bloques se escribe al cerrar el archivo.
+
+    Attributes:
+        file (BinaryIO): Archivo comprimido de salida.
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        headerless (bool): Si es verdadero se escribe el formato original sin encabezado, en el que cada parte usa como ventana el final de la anterior.
+        token_format (TokenFormat): Geometría y codificador de las referencias.
+        dictionary (bytes): Diccionario usado como ventana inicial de cada bloque, o bytes vacíos.
+        block_size (int): Tamaño sin comprimir de cada parte.
+    """
+
+    def __init__(self, file: str | BinaryIO, matcher: Callable = HashChainMatcher, raw: bool = False, token_format: TokenFormat = DEFAULT_FORMAT, dictionary: bytes = b"", block_size: int = CHUNK_SIZE):
+        """Abre la salida y escribe el encabezado del contenedor.
+
+        Args:
+            file (str | BinaryIO): Nombre del archivo comprimido, o un archivo binario ya abierto. Solo se cierra al cerrar el escritor si se especificó su nombre.
+            matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+            raw (bool): Si es verdadero se escribe el formato original sin encabezado ni índice de bloques.
+            token_format (TokenFormat): Geometría y codificador de las referencias.
+            dictionary (bytes): Diccionario usado como ventana inicial de cada bloque, o bytes vacíos.
+            block_size (int): Tamaño sin comprimir de cada parte. El formato original solo admite CHUNK_SIZE.
+
+        Raises:
+            ValueError: Si se pide el formato original con una geometría, un codificador, un diccionario o un tamaño de parte distintos a los de por defecto.
+        """
+        if raw and (token_format != DEFAULT_FORMAT or dictionary or block_size != CHUNK_SIZE):
+            raise ValueError("El formato original sin encabezado solo admite la geometría, el codificador y el tamaño de parte por defecto, sin diccionario")
+
+        super().__init__()
+        self.owns_file = isinstance(file, str)
+        self.file = open(file, "wb") if self.owns_file else file
+        self.matcher = matcher
+        self.headerless = raw
+        self.token_format = token_format
+        self.dictionary = dictionary
+        self.block_size = block_size
+        self.pending = bytearray()
+        self.window = b""
+        self.sizes = []
+        self.checksums = []
+
+        if not raw:
+            self.file.write(pack_header(block_size, token_format, dictionary_id(dictionary) if dictionary else 0))
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        """Agrega datos a la parte en curso y comprime todas las partes que se completen.
+
+        Args:
+            data (bytes): Los datos sin comprimir.
+
+        Returns:
+            int: El número de bytes recibidos, que siempre son todos.
+        """
+        if self.closed:
+            raise ValueError("Escritura en un archivo cerrado")
+
+        self.pending += data
+
+        while len(self.pending) >= self.block_size:
+            self.write_block(self.pending[:self.block_size])
+            del self.pending[:self.block_size]
+
+        return len(data)
+
+    def write_block(self, block: bytes | bytearray) -> None:
+        """Comprime una parte y la escribe en la salida.
+
+        Args:
+            block (bytes | bytearray): La parte sin comprimir.
+        """
+        if self.headerless:
+            buffer = self.window + block
+            output = process_chunk(buffer, len(self.window), self.matcher)
+            self.window = buffer[-self.token_format.window_size:]
+        else:
+            output = compress_block(bytes(block), self.matcher, self.token_format, self.dictionary)
+            self.sizes.append((len(output), len(block)))
+            self.checksums.append(zlib.crc32(block))
+
+        self.file.write(output)
+
+    def close(self) -> None:
+        """Comprime la última parte, escribe el índice de bloques y vacía la salida. Cierra la salida solo si el escritor la abrió."""
+        if self.closed:
+            return
+
+        try:
+            if self.pending:
+                self.write_block(self.pending)
+                self.pending = bytearray()
+
+            if not self.headerless:
+                write_index(self.file, build_index(self.sizes, self.checksums))
+
+            self.file.flush()
+        finally:
+            if self.owns_file:
+                self.file.close()
+
+            super().close()
+
+class LZ77Reader(io.BufferedIOBase):
+    """Archivo de solo lectura que entrega el contenido descomprimido de un archivo comprimido con el algoritmo LZ77, parte por parte.
+    Admite el contenedor por bloques y el formato original sin encabezado. Solo guarda la parte en curso y, en el formato original, la ventana que la precede.
+    Si la entrada es una tubería con contenedor se copia a un archivo temporal, que se mantiene en memoria hasta SPOOL_SIZE bytes,
+    porque el índice de bloques está al final. El formato original se descomprime a medida que se lee.
+
+    Attributes:
+        file (BinaryIO): Archivo comprimido de entrada.
+        container (Container | None): Encabezado e índice del archivo comprimido, o None si está en el formato original.
+    """
+
+    def __init__(self, file: str | BinaryIO, dictionary: bytes = b"", dictionaries: list[str] | None = None):
+        """Abre la entrada y lee su encabezado.
+
+        Args:
+            file (str | BinaryIO): Nombre del archivo comprimido, o un archivo binario ya abierto. Solo se cierra al cerrar el lector si se especificó su nombre.
+            dictionary (bytes): El diccionario con el que se comprimió el archivo, o bytes vacíos si no se usó ninguno.
+            dictionaries (list[str] | None): Archivos de diccionarios y directorios entre los que se busca el diccionario si no se especifica.
+
+        Raises:
+            ValueError: Si el diccionario no es el que requiere el archivo, o si el archivo tiene encabezado pero está dañado.
+        """
+        super().__init__()
+        self.owns_file = isinstance(file, str)
+        self.file = open(file, "rb") if self.owns_file else file
+        self.spool = None
+        self.buffer = b""
+        self.position = 0
+        source = self.file
+        prefix = b""
+
+        if not source.seekable():
+            prefix = source.read(len(MAGIC))
+
+            if prefix == MAGIC:
+                self.spool = source = tempfile.SpooledTemporaryFile(SPOOL_SIZE)
+                source.write(prefix)
+                shutil.copyfileobj(self.file, source)
+
+        self.container = read_container(source) if source.seekable() else None
+
+        if self.container and not dictionary and dictionaries:
+            dictionary = resolve_dictionary(dictionaries, self.container.dictionary_id)
+
+        check_dictionary(self.container.dictionary_id if self.container else 0, dictionary)
+
+        if source.seekable():
+            self.chunks = decompress_blocks(source, dictionary=dictionary)
+        else:
+            self.chunks = decode_stream(read_tokens(source, prefix))
+
+    def readable(self) -> bool:
+        return True
+
+    def next_chunk(self) -> bool:
+        """Descomprime la siguiente parte y la deja como la parte en curso.
+
+        Returns:
+            bool: Falso si ya no quedan partes.
+        """
+        for chunk in self.chunks:
+            if chunk:
+                self.buffer, self.position = chunk, 0
+                return True
+
+        return False
+
+    def read(self, size: int | None = -1) -> bytes:
+        """Lee bytes descomprimidos.
+
+        Args:
+            size (int | None): Número máximo de bytes a leer. Con un número negativo o None se lee hasta el final.
+
+        Returns:
+            bytes: Los bytes leídos. Menos de size solo si se llegó al final.
+        """
+        if self.closed:
+            raise ValueError("Lectura de un archivo cerrado")
+
+        parts = []
+        remaining = -1 if size is None or size < 0 else size
+
+        while remaining != 0 and (self.position < len(self.buffer) or self.next_chunk()):
+            end = len(self.buffer) if remaining < 0 else min(self.position + remaining, len(self.buffer))
+            parts.append(self.buffer[self.position:end])
+
+            if remaining > 0:
+                remaining -= end - self.position
+
+            self.position = end
+
+        return b"".join(parts)
+
+    def read1(self, size: int = -1) -> bytes:
+        """Lee bytes descomprimidos de la parte en curso, descomprimiendo a lo sumo una parte nueva.
+
+        Args:
+            size (int): Número máximo de bytes a leer. Con un número negativo se lee el resto de la parte.
+        """
+        if self.position >= len(self.buffer) and not self.next_chunk():
+            return b""
+
+        end = len(self.buffer) if size < 0 else min(self.position + size, len(self.buffer))
+        output = bytes(self.buffer[self.position:end])
+        self.position = end
+
+        return output
+
+    def close(self) -> None:
+        """Cierra el archivo temporal, si se creó, y la entrada solo si el lector la abrió."""
+        if self.closed:
+            return
+
+        try:
+            if self.spool:
+                self.spool.close()
+
+            if self.owns_file:
+                self.file.close()
+        finally:
+            super().close()
+
+def compress_bytes(data: bytes, matcher: Callable = HashChainMatcher, raw: bool = False, token_format: TokenFormat = DEFAULT_FORMAT, dictionary: bytes = b"") -> bytes:
+    """Comprime datos en memoria con el mismo formato que compresor.compress.
+
+    Args:
+        data (bytes): Los datos sin comprimir.
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        raw (bool): Si es verdadero se usa el formato original sin encabezado ni índice de bloques.
+        token_format (TokenFormat): Geometría y codificador de las referencias.
+        dictionary (bytes): Diccionario usado como ventana inicial de cada bloque, o bytes vacíos.
+    """
+    out = io.BytesIO()
+
+    with LZ77Writer(out, matcher, raw, token_format, dictionary) as writer:
+        writer.write(data)
+
+    return out.getvalue()
+
+def decompress_bytes(data: bytes, dictionary: bytes = b"") -> bytes:
+    """Descomprime datos en memoria comprimidos en cualquiera de los formatos.
+
+    Args:
+        data (bytes): Los datos comprimidos.
+        dictionary (bytes): El diccionario con el que se comprimieron, o bytes vacíos si no se usó ninguno.
+
+    Raises:
+        ValueError: Si el diccionario no es el que requieren los datos o si algún bloque está dañado.
+    """
+    with LZ77Reader(io.BytesIO(data), dictionary) as reader:
+        return reader.read()
+
+def compress_stream(source: BinaryIO, destination: str | BinaryIO, matcher: Callable = HashChainMatcher, raw: bool = False, token_format: TokenFormat = DEFAULT_FORMAT, dictionary: bytes = b"") -> None:
+    """Comprime todo el contenido de un archivo abierto, que puede ser la entrada estándar, parte por parte.
+
+    Args:
+        source (BinaryIO): Archivo de entrada.
+        destination (str | BinaryIO): Nombre del archivo comprimido, o un archivo binario ya abierto, como la salida estándar.
+        matcher ((bytes, int, int) -> HashChainMatcher | LinearMatcher): Fábrica del motor de búsqueda de coincidencias.
+        raw (bool): Si es verdadero se usa el formato original sin encabezado ni índice de bloques.
+        token_format (TokenFormat): Geometría y codificador de las referencias.
+        dictionary (bytes): Diccionario usado como ventana inicial de cada bloque, o bytes vacíos.
+    """
+    with LZ77Writer(destination, matcher, raw, token_format, dictionary) as writer:
+        shutil.copyfileobj(source, writer, CHUNK_SIZE)
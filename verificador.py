@@ -1,7 +1,15 @@
+import mmap
+import os
+
 from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from dictionary import check_dictionary, resolve_dictionary
+
+COMPARE_SIZE = 2**20
 
 def verify(filename1: str, filename2: str) -> bool:
     """Verifica que 2 archivos tengan el mismo contenido.
+    Primero compara los tamaños, de modo que un archivo truncado nunca se considera igual, y luego compara ambos archivos mapeados en memoria por bloques de COMPARE_SIZE bytes.
 
     Args:
         filename1 (str): Nombre del primer archivo.
@@ -11,17 +19,122 @@ def verify(filename1: str, filename2: str) -> bool:
         bool: Verdadero si los archivos tienen el mismo contenido y falso en el caso contrario.
     """
     with open(filename1, "rb") as file1, open(filename2, "rb") as file2:
-        return all(byte1 == byte2 for byte1, byte2 in zip(file1, file2))
+        size = os.fstat(file1.fileno()).st_size
+
+        if size != os.fstat(file2.fileno()).st_size:
+            return False
+
+        if size == 0:
+            return True
+
+        with mmap.mmap(file1.fileno(), 0, access=mmap.ACCESS_READ) as mapped1, mmap.mmap(file2.fileno(), 0, access=mmap.ACCESS_READ) as mapped2:
+            return all(mapped1[start:start + COMPARE_SIZE] == mapped2[start:start + COMPARE_SIZE] for start in range(0, size, COMPARE_SIZE))
+
+def check_block(zipfile: str, block_number: int, dictionary: bytes = b"") -> bool:
+    """Descomprime un bloque en memoria y comprueba su tamaño y su CRC32 contra el índice, sin escribir nada a disco.
+
+    Args:
+        zipfile (str): Nombre del archivo comprimido.
+        block_number (int): El número del bloque.
+        dictionary (bytes): El diccionario con el que se comprimió el archivo, o bytes vacíos si no se usó ninguno.
+
+    Returns:
+        bool: Verdadero si el bloque está íntegro. Cualquier error al descomprimirlo indica que está dañado.
+    """
+    from descompresorp import decompress_block
+
+    try:
+        decompress_block(zipfile, block_number, dictionary)
+    except Exception:
+        return False
+
+    return True
+
+def damaged_blocks(zipfile: str, block_numbers: range | list[int], workers: int | None = None, dictionary: bytes = b"") -> list[int]:
+    """Comprueba varios bloques de un archivo comprimido en paralelo con un pool de procesos locales.
+
+    Args:
+        zipfile (str): Nombre del archivo comprimido.
+        block_numbers (range | list[int]): Los bloques a comprobar.
+        workers (int | None): Número de procesos. Con 1 se comprueban en este proceso. Por defecto es el número de núcleos disponibles.
+        dictionary (bytes): El diccionario con el que se comprimió el archivo, o bytes vacíos si no se usó ninguno.
+
+    Returns:
+        list[int]: Los números de los bloques dañados, en orden.
+    """
+    if workers == 1:
+        return [block_number for block_number in block_numbers if not check_block(zipfile, block_number, dictionary)]
+
+    with ProcessPoolExecutor(workers) as executor:
+        results = executor.map(check_block, [zipfile] * len(block_numbers), block_numbers, [dictionary] * len(block_numbers))
+
+        return [block_number for block_number, ok in zip(block_numbers, results) if not ok]
+
+def verify_archive(zipfile: str, workers: int | None = None, dictionary: bytes = b"") -> list[int]:
+    """Verifica la integridad de un archivo comprimido sin el archivo original, comprobando todos sus bloques en paralelo.
+
+    Args:
+        zipfile (str): Nombre del archivo comprimido.
+        workers (int | None): Número de procesos. Por defecto es el número de núcleos disponibles.
+        dictionary (bytes): El diccionario con el que se comprimió el archivo, o bytes vacíos si no se usó ninguno.
+
+    Returns:
+        list[int]: Los números de los bloques dañados. Está vacía si el archivo está íntegro.
+
+    Raises:
+        ValueError: Si el archivo está en el formato original sin encabezado, que no tiene índice de bloques, si su índice está dañado o si el diccionario no es el que requiere.
+    """
+    from descompresorp import load_container
+
+    container = load_container(zipfile)
+
+    if container is None:
+        raise ValueError("El archivo está en el formato original sin índice de bloques y no se puede verificar sin el archivo original")
+
+    check_dictionary(container.dictionary_id, dictionary)
+
+    return damaged_blocks(zipfile, range(len(container.blocks)), workers, dictionary)
 
 if __name__ == "__main__":
     parser = ArgumentParser(
         prog="Verificador",
-        description="Verifica que dos archivos sean iguales. Destinado a verificar la integridad de archivos descomprimidos"
+        description="Verifica que dos archivos sean iguales, o que un archivo comprimido con índice de bloques esté íntegro usando el CRC32 de cada bloque"
     )
 
-    parser.add_argument("file1", help="Primer archivo a comparar")
-    parser.add_argument("file2", help="Segundo archivo a comparar")
+    parser.add_argument("file1", help="Primer archivo a comparar, o el archivo comprimido a verificar si no se especifica el segundo")
+    parser.add_argument("file2", help="Segundo archivo a comparar", nargs="?")
+    parser.add_argument("-b", "--backend", help="Entorno de paralelismo para verificar un archivo comprimido: MPI o un pool de procesos locales", choices=["mpi", "local"], default="local")
+    parser.add_argument("-w", "--workers", help="Número de procesos del pool local. Por defecto es el número de núcleos", type=int)
+    parser.add_argument("-D", "--dictionary", help="Diccionario, o directorio de diccionarios, entre los que se busca el que requiere el archivo comprimido. Se puede repetir", action="append")
 
     args = parser.parse_args()
 
-    print("ok" if verify(args.file1, args.file2) else "nok")
\ No newline at end of file
+    if args.file2:
+        print("ok" if verify(args.file1, args.file2) else "nok")
+    else:
+        from descompresorp import load_container
+
+        try:
+            container = load_container(args.file1)
+        except ValueError as error:
+            parser.error(str(error))
+
+        if container is None:
+            parser.error("el archivo está en el formato original sin índice de bloques. Compárelo con el original especificando el segundo archivo")
+
+        try:
+            dictionary = resolve_dictionary(args.dictionary, container.dictionary_id)
+        except ValueError as error:
+            parser.error(str(error))
+
+        if args.backend == "mpi":
+            from mpi_globals import CHANNEL, CLUSTER_SIZE, RANK
+
+            damaged = damaged_blocks(args.file1, range(RANK, len(container.blocks), CLUSTER_SIZE), 1, dictionary)
+            gathered = CHANNEL.gather(damaged, root=0)
+            damaged = sorted(block_number for rank_damaged in gathered for block_number in rank_damaged) if RANK == 0 else None
+        else:
+            damaged = verify_archive(args.file1, args.workers, dictionary)
+
+        if damaged is not None:
+            print(f"nok: bloques dañados {', '.join(map(str, damaged))}" if damaged else "ok")